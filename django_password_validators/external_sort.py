@@ -0,0 +1,125 @@
+"""
+Sorting of data sets that do not fit in memory.
+
+Used by the management commands that build the password files.
+"""
+from contextlib import contextmanager
+import heapq
+import os
+import struct
+import tempfile
+
+_LENGTH = struct.Struct('<H')
+
+MAX_ITEM_SIZE = 0xffff
+
+# The number of runs merged at once, every open run has its own buffer
+MAX_FAN_IN = 64
+
+
+def _write_run(items, tmp_dir, buffer_size):
+    run = tempfile.TemporaryFile(dir=tmp_dir, buffering=buffer_size)
+    for item in items:
+        run.write(_LENGTH.pack(len(item)))
+        run.write(item)
+    run.seek(0)
+    return run
+
+
+def _merge_unique(runs):
+    previous = None
+    for item in heapq.merge(*[_read_run(run) for run in runs]):
+        if item != previous:
+            yield item
+            previous = item
+
+
+def _read_run(run):
+    read = run.read
+    while True:
+        length = read(_LENGTH.size)
+        if not length:
+            return
+        yield read(_LENGTH.unpack(length)[0])
+
+
+def iter_sorted_unique(items, chunk_size=1000000, tmp_dir=None, buffer_size=1024 * 1024,
+                       max_fan_in=MAX_FAN_IN):
+    """
+    Yields the unique items (bytes, shorter than 64 KiB) in the sorted order.
+
+    At most chunk_size items are kept in memory, sorted chunks are
+    written to temporary files and merged, at most max_fan_in files at once.
+    The files are merged in several passes if there are more of them.
+
+    :param items: iterable of bytes
+    :param chunk_size: the number of items sorted in memory
+    :param tmp_dir: the directory for the temporary files
+    :param max_fan_in: the number of files open in one merge (at least 2)
+    """
+    if max_fan_in < 2:
+        raise ValueError('max_fan_in must be at least 2')
+    runs = []
+    try:
+        chunk = set()
+        for item in items:
+            if len(item) > MAX_ITEM_SIZE:
+                raise ValueError('The items must be shorter than 64 KiB.')
+            chunk.add(item)
+            if len(chunk) >= chunk_size:
+                runs.append(_write_run(sorted(chunk), tmp_dir, buffer_size))
+                chunk = set()
+
+        if not runs:
+            # Everything fits in memory
+            for item in sorted(chunk):
+                yield item
+            return
+
+        if chunk:
+            runs.append(_write_run(sorted(chunk), tmp_dir, buffer_size))
+        del chunk
+
+        while len(runs) > max_fan_in:
+            merged = runs[:max_fan_in]
+            run = _write_run(_merge_unique(merged), tmp_dir, buffer_size)
+            runs = runs[max_fan_in:] + [run]
+            for merged_run in merged:
+                merged_run.close()
+
+        for item in _merge_unique(runs):
+            yield item
+    finally:
+        for run in runs:
+            run.close()
+
+
+@contextmanager
+def atomic_output(path):
+    """
+    Opens a temporary file (w+b) next to path, it replaces path on success.
+
+    The readers that have the old file memory-mapped keep its data,
+    the file is never truncated or rewritten in place.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.%s.' % os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w+b') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o666 & ~_get_umask())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _get_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
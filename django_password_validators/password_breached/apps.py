@@ -0,0 +1,5 @@
+from django.apps import AppConfig
+
+
+class PasswordBreachedConfig(AppConfig):
+    name = 'django_password_validators.password_breached'
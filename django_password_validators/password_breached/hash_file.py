@@ -0,0 +1,152 @@
+"""
+Sorted file of the (truncated) SHA-1 hashes of breached passwords.
+
+Layout of the file (little endian):
+
+    header  - magic, digest size, flags, number of hashes
+    index   - optional, 65537 record numbers of the first hash
+              with the given 2-byte prefix
+    records - the sorted unique hashes, digest size bytes each
+
+The file is memory-mapped, so the pages are shared by all processes
+and nothing is loaded when the file is opened.
+"""
+from array import array
+import hashlib
+import mmap
+import struct
+import sys
+
+MAGIC = b'DPVBRH1\x00'
+HEADER = struct.Struct('<8sIIQ')
+FLAG_PREFIX_INDEX = 1
+PREFIX_INDEX_SIZE = 0x10000 + 1
+INDEX_ITEM = struct.Struct('<Q')
+
+SHA1_SIZE = hashlib.sha1().digest_size
+
+
+def password_digest(password):
+    return hashlib.sha1(password.encode('utf-8')).digest()
+
+
+class HashFile(object):
+    """
+    Read-only access to the file built by build_hash_file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.digest_size, self.flags, self.count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError('%s is not a breached passwords file' % path)
+        self.has_prefix_index = bool(self.flags & FLAG_PREFIX_INDEX)
+        self.records_offset = HEADER.size
+        if self.has_prefix_index:
+            self.records_offset += PREFIX_INDEX_SIZE * INDEX_ITEM.size
+
+    def _range(self, digest, use_prefix_index):
+        """
+        Returns the range of records that can contain the digest.
+        """
+        if use_prefix_index and self.has_prefix_index:
+            prefix = (digest[0] << 8) | digest[1]
+            offset = HEADER.size + prefix * INDEX_ITEM.size
+            return (
+                INDEX_ITEM.unpack_from(self._mmap, offset)[0],
+                INDEX_ITEM.unpack_from(self._mmap, offset + INDEX_ITEM.size)[0],
+            )
+        return 0, self.count
+
+    def __contains__(self, digest):
+        return self.contains(digest)
+
+    def contains(self, digest, use_prefix_index=True):
+        """
+        Binary search of the SHA-1 digest (it is truncated to the digest size of the file).
+        """
+        digest = digest[:self.digest_size]
+        size = self.digest_size
+        records_offset = self.records_offset
+        data = self._mmap
+        low, high = self._range(digest, use_prefix_index)
+        while low < high:
+            middle = (low + high) // 2
+            offset = records_offset + middle * size
+            record = data[offset:offset + size]
+            if record < digest:
+                low = middle + 1
+            elif record > digest:
+                high = middle
+            else:
+                return True
+        return False
+
+    def close(self):
+        self._mmap.close()
+
+
+def parse_plain_line(line):
+    """
+    The line is a password.
+    """
+    return password_digest(line.rstrip('\r\n'))
+
+
+def parse_sha1_line(line):
+    """
+    The line is a hex SHA-1 of the password, optionally followed by ":count".
+    """
+    return bytes.fromhex(line[:SHA1_SIZE * 2])
+
+
+def build_hash_file(lines, path, digest_size=SHA1_SIZE, parse_line=parse_plain_line,
+                    prefix_index=True, chunk_size=1000000, tmp_dir=None):
+    """
+    Builds the file from the lines of the dump, with bounded memory.
+
+    The file is written next to path and replaces it at the end,
+    the processes that have the old file open keep reading it.
+
+    :param lines: iterable of the text lines
+    :param path: the output file
+    :param digest_size: the hashes are truncated to digest_size bytes (2 - 20)
+    :param parse_line: the function returning the SHA-1 digest of the line
+    :param prefix_index: write the index of 2-byte prefixes
+    :param chunk_size: the number of hashes sorted in memory
+    :return: the number of unique hashes
+    """
+    from django_password_validators.external_sort import atomic_output, iter_sorted_unique
+
+    if not 2 <= digest_size <= SHA1_SIZE:
+        raise ValueError('digest_size must be between 2 and %d' % SHA1_SIZE)
+
+    def digests():
+        for line in lines:
+            if line.strip():
+                yield parse_line(line)[:digest_size]
+
+    prefix_counts = array('Q', bytes(8 * (PREFIX_INDEX_SIZE - 1)))
+    count = 0
+    with atomic_output(path) as f:
+        records_offset = HEADER.size
+        if prefix_index:
+            records_offset += PREFIX_INDEX_SIZE * INDEX_ITEM.size
+        f.seek(records_offset)
+        for digest in iter_sorted_unique(digests(), chunk_size=chunk_size, tmp_dir=tmp_dir):
+            f.write(digest)
+            prefix_counts[(digest[0] << 8) | digest[1]] += 1
+            count += 1
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, digest_size, FLAG_PREFIX_INDEX if prefix_index else 0, count))
+        if prefix_index:
+            index = array('Q', [0])
+            for prefix_count in prefix_counts:
+                index.append(index[-1] + prefix_count)
+            if sys.byteorder != 'little':
+                index.byteswap()
+            f.write(index.tobytes())
+    return count
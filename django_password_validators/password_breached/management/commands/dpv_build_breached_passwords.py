@@ -0,0 +1,86 @@
+import io
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_password_validators.password_breached.hash_file import (
+    SHA1_SIZE,
+    build_hash_file,
+    parse_plain_line,
+    parse_sha1_line,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Builds the file of breached passwords for BreachedPasswordValidator '
+        'from a text dump with one password (or SHA-1 hash) per line.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input',
+            help='The text dump, "-" reads from the standard input.',
+        )
+        parser.add_argument(
+            'output',
+            help='The file to build.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['plain', 'sha1'],
+            default='plain',
+            help='plain - one password per line, sha1 - one hex SHA-1 hash '
+                 '(optionally followed by ":count") per line.',
+        )
+        parser.add_argument(
+            '--digest-size',
+            type=int,
+            default=SHA1_SIZE,
+            help='The hashes are truncated to this number of bytes (2 - 20). Default: 20',
+        )
+        parser.add_argument(
+            '--no-prefix-index',
+            action='store_true',
+            help='Do not write the index of prefixes.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000000,
+            help='The number of hashes sorted in memory.',
+        )
+        parser.add_argument(
+            '--tmp-dir',
+            default=None,
+            help='The directory for the temporary files.',
+        )
+        parser.add_argument(
+            '--encoding',
+            default='utf-8',
+        )
+
+    def handle(self, *args, **options):
+        if options['input'] == '-':
+            lines = io.TextIOWrapper(sys.stdin.buffer, encoding=options['encoding'], errors='replace')
+        else:
+            try:
+                lines = open(options['input'], encoding=options['encoding'], errors='replace')
+            except OSError as e:
+                raise CommandError(str(e))
+        parse_line = parse_sha1_line if options['format'] == 'sha1' else parse_plain_line
+
+        try:
+            with lines:
+                count = build_hash_file(
+                    lines,
+                    options['output'],
+                    digest_size=options['digest_size'],
+                    parse_line=parse_line,
+                    prefix_index=not options['no_prefix_index'],
+                    chunk_size=options['chunk_size'],
+                    tmp_dir=options['tmp_dir'],
+                )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write('Written %d hashes to %s.' % (count, options['output']))
@@ -0,0 +1,68 @@
+import os
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+
+from django_password_validators.settings import get_setting
+from django_password_validators.translation import gettext as _
+from django_password_validators.password_breached.hash_file import (
+    HashFile,
+    password_digest,
+)
+
+
+_hash_files = {}
+
+
+def get_hash_file(path):
+    """
+    The file is opened once per process, the memory is shared by the page cache.
+
+    The file is opened again when it is replaced (e.g. rebuilt by the command),
+    the old mapping is closed when the last reader drops it.
+    """
+    stat = os.stat(path)
+    version = (stat.st_ino, stat.st_mtime_ns)
+    cached = _hash_files.get(path)
+    if cached is None or cached[0] != version:
+        cached = _hash_files[path] = (version, HashFile(path))
+    return cached[1]
+
+
+class BreachedPasswordValidator(object):
+    """
+    Validate whether the password is not known from data breaches.
+
+    The password is looked up in the file built by the
+    dpv_build_breached_passwords command.
+    """
+
+    # Estimated cost of the validation in milliseconds (see PipelineValidator)
+    cost = 0
+
+    def __init__(self, hash_file=None, use_prefix_index=True):
+        """
+
+        :param hash_file:
+            path to the file of the breached passwords,
+            default: settings.DPV_BREACHED_PASSWORDS_FILE
+        :param use_prefix_index:
+            use the index of prefixes stored in the file (if the file has it)
+        """
+        self.hash_file = hash_file or get_setting('DPV_BREACHED_PASSWORDS_FILE', None)
+        if not self.hash_file:
+            raise ImproperlyConfigured(
+                'BreachedPasswordValidator requires the hash_file option '
+                'or the DPV_BREACHED_PASSWORDS_FILE setting.'
+            )
+        self.use_prefix_index = use_prefix_index
+
+    def validate(self, password, user=None):
+        hash_file = get_hash_file(self.hash_file)
+        if hash_file.contains(password_digest(password), use_prefix_index=self.use_prefix_index):
+            raise ValidationError(
+                _("This password has appeared in a data breach and can not be used."),
+                code='password_breached'
+            )
+
+    def get_help_text(self):
+        return _('Your password can not be a password known from data breaches.')
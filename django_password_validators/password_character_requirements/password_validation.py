@@ -1,12 +1,60 @@
 from django.core.exceptions import ValidationError
-try:
-  from django.utils.translation import gettext as _, ngettext
-except ImportError:
-  from django.utils.translation import ugettext as _, ungettext as ngettext
+
+from django_password_validators.translation import gettext as _, ngettext
+
+# NumPy is imported by validate_many() on the first use, not with the validators
+_numpy = None
+
+
+def _get_numpy():
+    """
+    Returns the numpy module, None if it is not installed.
+    """
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy as _numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+# The failure bits of PasswordCharacterValidator.validate_many()
+FAILURE_DIGIT = 1
+FAILURE_ALPHA = 2
+FAILURE_UPPER = 4
+FAILURE_LOWER = 8
+FAILURE_SPECIAL = 16
+
+FAILURE_CODES = (
+    (FAILURE_DIGIT, 'min_length_digit'),
+    (FAILURE_ALPHA, 'min_length_alpha'),
+    (FAILURE_UPPER, 'min_length_upper_characters'),
+    (FAILURE_LOWER, 'min_length_lower_characters'),
+    (FAILURE_SPECIAL, 'min_length_special_characters'),
+)
+
+
+def _count_digits(password):
+    return sum(map(str.isdigit, password))
+
+
+def _count_alpha(password):
+    return sum(map(str.isalpha, password))
+
+
+def _count_upper(password):
+    return sum(map(str.isupper, password))
+
+
+def _count_lower(password):
+    return sum(map(str.islower, password))
 
 
 class PasswordCharacterValidator():
 
+    # Estimated cost of the validation in milliseconds (see PipelineValidator)
+    cost = 0
+
     def __init__(
             self,
             min_length_digit=1,
@@ -23,10 +71,119 @@ class PasswordCharacterValidator():
         self.min_length_upper = min_length_upper
         self.special_characters = special_characters
 
-    def validate(self, password, user=None):
-        validation_errors = []
-        if len([char for char in password if char.isdigit()]) < self.min_length_digit:
-            validation_errors.append(ValidationError(
+    def get_checks(self):
+        """
+        Returns the (failure bit, minimum count, counting function) of the checked classes.
+        """
+        specials = frozenset(self.special_characters)
+        return [
+            (bit, min_length, count)
+            for bit, min_length, count in (
+                (FAILURE_DIGIT, self.min_length_digit, _count_digits),
+                (FAILURE_ALPHA, self.min_length_alpha, _count_alpha),
+                (FAILURE_UPPER, self.min_length_upper, _count_upper),
+                (FAILURE_LOWER, self.min_length_lower, _count_lower),
+                (FAILURE_SPECIAL, self.min_length_special,
+                 lambda password: sum(map(specials.__contains__, password))),
+            )
+            if min_length > 0
+        ]
+
+    def get_failure_mask(self, password, checks=None):
+        """
+        Returns the failure bits (FAILURE_*) of the password, 0 - the password is valid.
+        """
+        mask = 0
+        for bit, min_length, count in checks or self.get_checks():
+            if count(password) < min_length:
+                mask |= bit
+        return mask
+
+    def validate_many(self, passwords, use_numpy=None, batch_size=10000):
+        """
+        Validates many passwords at once, e.g. for the bulk imports and audits.
+
+        No ValidationError is created, the failures are returned as the bit masks,
+        use get_failure_codes() or get_errors() to get the codes or the translated messages.
+
+        :param passwords: the sequence of the passwords
+        :param use_numpy: count the characters of the ASCII passwords with NumPy,
+            None - if NumPy is installed
+        :param batch_size: the number of the passwords counted by NumPy at once
+        :return: the list of the failure masks in the order of the passwords
+        """
+        if use_numpy is None:
+            use_numpy = _get_numpy() is not None
+        elif use_numpy and _get_numpy() is None:
+            raise ImportError('validate_many(use_numpy=True) requires NumPy.')
+        checks = self.get_checks()
+        if not checks:
+            return [0] * len(passwords)
+        if not use_numpy:
+            return [self.get_failure_mask(password, checks) for password in passwords]
+        masks = []
+        for start in range(0, len(passwords), batch_size):
+            masks.extend(self._validate_many_numpy(passwords[start:start + batch_size], checks))
+        return masks
+
+    def _get_ascii_classes(self):
+        """
+        Returns the table of the class bits (FAILURE_*) of the bytes,
+        the non-ASCII bytes have no class.
+        """
+        numpy = _get_numpy()
+        table = numpy.zeros(256, dtype=numpy.uint8)
+        for code in range(128):
+            char = chr(code)
+            table[code] = (
+                (FAILURE_DIGIT if char.isdigit() else 0) |
+                (FAILURE_ALPHA if char.isalpha() else 0) |
+                (FAILURE_UPPER if char.isupper() else 0) |
+                (FAILURE_LOWER if char.islower() else 0) |
+                (FAILURE_SPECIAL if char in self.special_characters else 0)
+            )
+        return table
+
+    def _validate_many_numpy(self, passwords, checks):
+        masks = [0] * len(passwords)
+        indexes = []
+        encoded = []
+        for index, password in enumerate(passwords):
+            # The classes of the other characters are counted by Python's str methods
+            if password and password.isascii():
+                indexes.append(index)
+                encoded.append(password.encode('ascii'))
+            else:
+                masks[index] = self.get_failure_mask(password, checks)
+        if not encoded:
+            return masks
+
+        numpy = _get_numpy()
+        lengths = numpy.fromiter(map(len, encoded), dtype=numpy.intp, count=len(encoded))
+        starts = numpy.zeros(len(encoded), dtype=numpy.intp)
+        numpy.cumsum(lengths[:-1], out=starts[1:])
+        classes = self._get_ascii_classes()[numpy.frombuffer(b''.join(encoded), dtype=numpy.uint8)]
+        batch_masks = numpy.zeros(len(encoded), dtype=numpy.intp)
+        for bit, min_length, _ in checks:
+            counts = numpy.add.reduceat(classes & bit, starts, dtype=numpy.intp) // bit
+            batch_masks |= numpy.where(counts < min_length, bit, 0)
+        for index, mask in zip(indexes, batch_masks.tolist()):
+            masks[index] = mask
+        return masks
+
+    def get_failure_codes(self, mask):
+        """
+        Returns the error codes of the failure mask.
+        """
+        return [code for bit, code in FAILURE_CODES if mask & bit]
+
+    def get_errors(self, mask):
+        """
+        Returns the ValidationErrors (with the translated messages) of the failure mask.
+        """
+        errors = []
+        if mask & FAILURE_DIGIT:
+            errors.append(ValidationError(
                 ngettext(
                     'This password must contain at least %(min_length)d digit.',
                     'This password must contain at least %(min_length)d digits.',
@@ -35,8 +192,8 @@ class PasswordCharacterValidator():
                 params={'min_length': self.min_length_digit},
                 code='min_length_digit',
             ))
-        if len([char for char in password if char.isalpha()]) < self.min_length_alpha:
-            validation_errors.append(ValidationError(
+        if mask & FAILURE_ALPHA:
+            errors.append(ValidationError(
                 ngettext(
                     'This password must contain at least %(min_length)d letter.',
                     'This password must contain at least %(min_length)d letters.',
@@ -45,8 +202,8 @@ class PasswordCharacterValidator():
                 params={'min_length': self.min_length_alpha},
                 code='min_length_alpha',
             ))
-        if len([char for char in password if char.isupper()]) < self.min_length_upper:
-            validation_errors.append(ValidationError(
+        if mask & FAILURE_UPPER:
+            errors.append(ValidationError(
                 ngettext(
                     'This password must contain at least %(min_length)d upper case letter.',
                     'This password must contain at least %(min_length)d upper case letters.',
@@ -55,8 +212,8 @@ class PasswordCharacterValidator():
                 params={'min_length': self.min_length_upper},
                 code='min_length_upper_characters',
             ))
-        if len([char for char in password if char.islower()]) < self.min_length_lower:
-            validation_errors.append(ValidationError(
+        if mask & FAILURE_LOWER:
+            errors.append(ValidationError(
                 ngettext(
                     'This password must contain at least %(min_length)d lower case letter.',
                     'This password must contain at least %(min_length)d lower case letters.',
@@ -65,8 +222,8 @@ class PasswordCharacterValidator():
                 params={'min_length': self.min_length_lower},
                 code='min_length_lower_characters',
             ))
-        if len([char for char in password if char in self.special_characters]) < self.min_length_special:
-            validation_errors.append(ValidationError(
+        if mask & FAILURE_SPECIAL:
+            errors.append(ValidationError(
                 ngettext(
                     'This password must contain at least %(min_length)d special character.',
                     'This password must contain at least %(min_length)d special characters.',
@@ -75,8 +232,40 @@ class PasswordCharacterValidator():
                 params={'min_length': self.min_length_special},
                 code='min_length_special_characters',
             ))
-        if validation_errors:
-            raise ValidationError(validation_errors)
+        return errors
+
+    def validate(self, password, user=None):
+        mask = self.get_failure_mask(password)
+        if mask:
+            raise ValidationError(self.get_errors(mask))
+
+    def get_rules(self):
+        """
+        Returns the rules for the client-side checks (see password_character_requirements.rules).
+
+        The character classes are those of Python's str methods:
+        digit - isdigit(), alpha - isalpha(), upper - isupper(), lower - islower(),
+        special - the characters of the rule.
+        """
+        rules = []
+        for code, character_class, min_length in (
+                ('min_length_digit', 'digit', self.min_length_digit),
+                ('min_length_alpha', 'alpha', self.min_length_alpha),
+                ('min_length_upper_characters', 'upper', self.min_length_upper),
+                ('min_length_lower_characters', 'lower', self.min_length_lower),
+                ('min_length_special_characters', 'special', self.min_length_special)):
+            if not min_length:
+                continue
+            rule = {
+                'type': 'min_count',
+                'code': code,
+                'character_class': character_class,
+                'min_length': min_length,
+            }
+            if character_class == 'special':
+                rule['characters'] = self.special_characters
+            rules.append(rule)
+        return rules
 
     def get_help_text(self):
         validation_req = []
@@ -121,3 +310,187 @@ class PasswordCharacterValidator():
                 ) % {'min_length_special': str(self.min_length_special), 'special_characters': self.special_characters}
             )
         return _("This password must contain at least") + ' ' + ', '.join(validation_req) + '.'
+
+
+class PasswordSequenceValidator():
+    """
+    The validator rejects long runs of the same character, alphabet and digit
+    sequences (abcd, 4321) and keyboard walks (qwer, lkjh).
+
+    The password is checked in a single pass, the steps of sequences
+    and keyboard walks are prepared when the validator is created.
+    """
+
+    # Estimated cost of the validation in milliseconds (see PipelineValidator)
+    cost = 0
+
+    def __init__(
+            self,
+            max_repeat=3,
+            max_sequence=3,
+            max_keyboard_walk=3,
+            sequences=('abcdefghijklmnopqrstuvwxyz', '0123456789'),
+            keyboard_rows=('qwertyuiop', 'asdfghjkl', 'zxcvbnm')
+    ):
+        """
+
+        :param max_repeat: the maximum number of the same consecutive characters, 0 - no limit
+        :param max_sequence: the maximum length of a sequence, 0 - no limit
+        :param max_keyboard_walk: the maximum length of a keyboard walk, 0 - no limit
+        :param sequences: the ordered sets of characters (lower case)
+        :param keyboard_rows: the rows of the keyboard (lower case)
+        """
+        self.max_repeat = max_repeat
+        self.max_sequence = max_sequence
+        self.max_keyboard_walk = max_keyboard_walk
+        self.sequences = sequences
+        self.keyboard_rows = keyboard_rows
+        self._sequence_steps = self._make_steps(sequences)
+        self._keyboard_steps = self._make_steps(keyboard_rows)
+
+    @staticmethod
+    def _make_steps(rows):
+        """
+        Maps pairs of neighbouring characters to the direction (1 forward, -1 backward).
+        """
+        steps = {}
+        for row in rows:
+            for char, next_char in zip(row, row[1:]):
+                steps[(char, next_char)] = 1
+                steps[(next_char, char)] = -1
+        return steps
+
+    def get_longest_runs(self, password):
+        """
+        Returns the length of the longest repetition, sequence and keyboard walk.
+        """
+        sequence_steps = self._sequence_steps
+        keyboard_steps = self._keyboard_steps
+        longest_repeat = longest_sequence = longest_walk = 0
+        repeat = sequence = walk = 0
+        sequence_direction = walk_direction = 0
+        previous = None
+        for char in password.lower():
+            if char == previous:
+                repeat += 1
+            else:
+                repeat = 1
+
+            direction = sequence_steps.get((previous, char))
+            if direction is None:
+                sequence, sequence_direction = 1, 0
+            elif direction == sequence_direction:
+                sequence += 1
+            else:
+                sequence, sequence_direction = 2, direction
+
+            direction = keyboard_steps.get((previous, char))
+            if direction is None:
+                walk, walk_direction = 1, 0
+            elif direction == walk_direction:
+                walk += 1
+            else:
+                walk, walk_direction = 2, direction
+
+            if repeat > longest_repeat:
+                longest_repeat = repeat
+            if sequence > longest_sequence:
+                longest_sequence = sequence
+            if walk > longest_walk:
+                longest_walk = walk
+            previous = char
+        return longest_repeat, longest_sequence, longest_walk
+
+    def validate(self, password, user=None):
+        longest_repeat, longest_sequence, longest_walk = self.get_longest_runs(password)
+        validation_errors = []
+        if self.max_repeat and longest_repeat > self.max_repeat:
+            validation_errors.append(ValidationError(
+                ngettext(
+                    'This password must not contain a character repeated more than %(max_length)d time in a row.',
+                    'This password must not contain a character repeated more than %(max_length)d times in a row.',
+                    self.max_repeat
+                ),
+                params={'max_length': self.max_repeat},
+                code='max_repeat',
+            ))
+        if self.max_sequence and longest_sequence > self.max_sequence:
+            validation_errors.append(ValidationError(
+                ngettext(
+                    'This password must not contain a sequence longer than %(max_length)d character.',
+                    'This password must not contain a sequence longer than %(max_length)d characters.',
+                    self.max_sequence
+                ),
+                params={'max_length': self.max_sequence},
+                code='max_sequence',
+            ))
+        if self.max_keyboard_walk and longest_walk > self.max_keyboard_walk:
+            validation_errors.append(ValidationError(
+                ngettext(
+                    'This password must not contain a keyboard pattern longer than %(max_length)d character.',
+                    'This password must not contain a keyboard pattern longer than %(max_length)d characters.',
+                    self.max_keyboard_walk
+                ),
+                params={'max_length': self.max_keyboard_walk},
+                code='max_keyboard_walk',
+            ))
+        if validation_errors:
+            raise ValidationError(validation_errors)
+
+    def get_rules(self):
+        """
+        Returns the rules for the client-side checks (see password_character_requirements.rules),
+        the password is compared in lower case.
+        """
+        rules = []
+        if self.max_repeat:
+            rules.append({
+                'type': 'max_repeat',
+                'code': 'max_repeat',
+                'max_length': self.max_repeat,
+            })
+        if self.max_sequence:
+            rules.append({
+                'type': 'max_sequence',
+                'code': 'max_sequence',
+                'max_length': self.max_sequence,
+                'sequences': list(self.sequences),
+            })
+        if self.max_keyboard_walk:
+            rules.append({
+                'type': 'max_sequence',
+                'code': 'max_keyboard_walk',
+                'max_length': self.max_keyboard_walk,
+                'sequences': list(self.keyboard_rows),
+            })
+        return rules
+
+    def get_help_text(self):
+        validation_req = []
+        if self.max_repeat:
+            validation_req.append(
+                ngettext(
+                    "a character repeated more than %(max_length)s time in a row",
+                    "a character repeated more than %(max_length)s times in a row",
+                    self.max_repeat
+                ) % {'max_length': self.max_repeat}
+            )
+        if self.max_sequence:
+            validation_req.append(
+                ngettext(
+                    "a sequence (like abcd or 4321) longer than %(max_length)s character",
+                    "a sequence (like abcd or 4321) longer than %(max_length)s characters",
+                    self.max_sequence
+                ) % {'max_length': self.max_sequence}
+            )
+        if self.max_keyboard_walk:
+            validation_req.append(
+                ngettext(
+                    "a keyboard pattern (like qwer) longer than %(max_length)s character",
+                    "a keyboard pattern (like qwer) longer than %(max_length)s characters",
+                    self.max_keyboard_walk
+                ) % {'max_length': self.max_keyboard_walk}
+            )
+        if not validation_req:
+            return ''
+        return _("This password must not contain") + ' ' + ', '.join(validation_req) + '.'
@@ -0,0 +1,94 @@
+"""
+The rules of the configured password validators for the client-side checks.
+
+The document (``version`` changes only with incompatible changes)::
+
+    {
+        "version": 1,
+        "validators": [
+            {
+                "name": "PasswordCharacterValidator",
+                "help_text": "...",
+                "rules": [
+                    {"type": "min_length", "code": ..., "min_length": 8},
+                    {"type": "min_count", "code": ..., "character_class": "digit|alpha|upper|lower|special",
+                     "min_length": 1, "characters": "only for the special class"},
+                    {"type": "max_repeat", "code": ..., "max_length": 3},
+                    {"type": "max_sequence", "code": ..., "max_length": 3, "sequences": ["abc...", ...]}
+                ]
+            }
+        ]
+    }
+
+Validators export their rules with get_rules(), the validators without it
+are checked only by the server.
+"""
+from functools import lru_cache
+import json
+
+from django.contrib.auth.password_validation import (
+    MinimumLengthValidator,
+    get_password_validators,
+)
+from django.utils import translation
+
+RULES_VERSION = 1
+
+
+def get_validator_rules(validator):
+    """
+    Returns the list of rules of the validator, None if it has no rules for the client.
+    """
+    if hasattr(validator, 'get_rules'):
+        return validator.get_rules()
+    if isinstance(validator, MinimumLengthValidator):
+        return [{
+            'type': 'min_length',
+            'code': 'password_too_short',
+            'min_length': validator.min_length,
+        }]
+    return None
+
+
+def get_password_rules(validators):
+    """
+    Returns the rules document of the validators.
+    """
+    entries = []
+    for validator in validators:
+        # Validators wrapped by the PipelineValidator are also taken into account
+        for wrapped_validator in getattr(validator, 'validators', [validator]):
+            rules = get_validator_rules(wrapped_validator)
+            if rules is None:
+                continue
+            entries.append({
+                'name': type(wrapped_validator).__name__,
+                'help_text': str(wrapped_validator.get_help_text()),
+                'rules': rules,
+            })
+    return {
+        'version': RULES_VERSION,
+        'validators': entries,
+    }
+
+
+def dumps_password_rules(validators):
+    return json.dumps(get_password_rules(validators), sort_keys=True, separators=(',', ':'))
+
+
+@lru_cache(maxsize=32)
+def _get_password_rules_json(validators_config, language):
+    return dumps_password_rules(get_password_validators(json.loads(validators_config)))
+
+
+def get_password_rules_json(validators_config):
+    """
+    Returns the rules document of the validators configuration (AUTH_PASSWORD_VALIDATORS)
+    as JSON, cached by the configuration and the active language (of the help texts).
+    """
+    try:
+        key = json.dumps(validators_config, sort_keys=True)
+    except TypeError:
+        # The options are not JSON serializable, the rules are not cached
+        return dumps_password_rules(get_password_validators(validators_config))
+    return _get_password_rules_json(key, translation.get_language())
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from django_password_validators.password_character_requirements import views
+
+urlpatterns = [
+    path('password-rules.json', views.password_rules, name='dpv_password_rules'),
+]
@@ -0,0 +1,46 @@
+from functools import wraps
+import hashlib
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition, require_GET
+
+from django_password_validators.password_character_requirements.rules import get_password_rules_json
+from django_password_validators.settings import get_password_rules_max_age
+
+
+def _get_rules_json():
+    return get_password_rules_json(settings.AUTH_PASSWORD_VALIDATORS)
+
+
+def _get_rules_etag(request):
+    return hashlib.sha256(_get_rules_json().encode('utf-8')).hexdigest()
+
+
+def _cache_rules(view):
+    """
+    Adds the caching headers to the responses of the view, including
+    the 304 responses of condition(), which does not call the view.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        patch_cache_control(response, public=True, max_age=get_password_rules_max_age())
+        # The help texts are translated, the shared caches must keep a copy per language
+        patch_vary_headers(response, ['Accept-Language'])
+        return response
+    return wrapper
+
+
+@require_GET
+@_cache_rules
+@condition(etag_func=_get_rules_etag)
+def password_rules(request):
+    """
+    The rules of AUTH_PASSWORD_VALIDATORS for the client-side checks (JSON).
+
+    The response changes only with the settings (and the language of the help texts),
+    the clients can cache it and revalidate it with the ETag.
+    """
+    return HttpResponse(_get_rules_json(), content_type='application/json')
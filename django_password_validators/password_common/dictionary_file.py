@@ -0,0 +1,211 @@
+"""
+Sorted, deduplicated and prefix-compressed dictionary of common passwords.
+
+Layout of the file (little endian):
+
+    header  - magic, flags, words per block, number of words, number of blocks
+    offsets - the offset of each block (from the start of the file)
+    blocks  - the first word of the block is stored as: length, bytes,
+              the next ones as: length of the prefix shared with the previous word,
+              length of the suffix, suffix bytes (lengths are varints)
+
+The file is memory-mapped, so the pages are shared by all processes
+and only the header is kept in the memory of the process.
+"""
+from array import array
+import mmap
+import struct
+import sys
+
+MAGIC = b'DPVDIC1\x00'
+HEADER = struct.Struct('<8sIIQQ')
+OFFSET = struct.Struct('<Q')
+
+# Normalization of the words
+FLAG_CASE_INSENSITIVE = 1
+FLAG_LEETSPEAK = 2
+
+LEETSPEAK_TABLE = str.maketrans({
+    '0': 'o',
+    '1': 'i',
+    '!': 'i',
+    '3': 'e',
+    '4': 'a',
+    '@': 'a',
+    '5': 's',
+    '$': 's',
+    '7': 't',
+    '8': 'b',
+    '9': 'g',
+})
+
+
+def normalize(word, flags):
+    if flags & FLAG_CASE_INSENSITIVE:
+        word = word.lower()
+    if flags & FLAG_LEETSPEAK:
+        word = word.translate(LEETSPEAK_TABLE)
+    return word
+
+
+def _encode_varint(value):
+    data = bytearray()
+    while value >= 0x80:
+        data.append((value & 0x7f) | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+
+def _decode_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class DictionaryFile(object):
+    """
+    Read-only access to the file built by build_dictionary_file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.flags, self.block_size, self.count, self.block_count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError('%s is not a common passwords dictionary' % path)
+
+    def _block_offset(self, block):
+        return OFFSET.unpack_from(self._mmap, HEADER.size + block * OFFSET.size)[0]
+
+    def _first_word(self, block):
+        length, offset = _decode_varint(self._mmap, self._block_offset(block))
+        return self._mmap[offset:offset + length]
+
+    def _iter_block(self, block):
+        data = self._mmap
+        length, offset = _decode_varint(data, self._block_offset(block))
+        word = data[offset:offset + length]
+        offset += length
+        yield word
+        for _ in range(min(self.block_size, self.count - block * self.block_size) - 1):
+            shared, offset = _decode_varint(data, offset)
+            length, offset = _decode_varint(data, offset)
+            word = word[:shared] + data[offset:offset + length]
+            offset += length
+            yield word
+
+    def normalize(self, word):
+        return normalize(word, self.flags)
+
+    def __contains__(self, word):
+        return self.contains(word)
+
+    def contains(self, word):
+        """
+        Checks the word, normalized the same way as the words of the dictionary.
+        """
+        word = self.normalize(word).encode('utf-8')
+        # The last block with the first word <= word
+        low, high = 0, self.block_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._first_word(middle) <= word:
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return False
+        for dictionary_word in self._iter_block(low - 1):
+            if dictionary_word >= word:
+                return dictionary_word == word
+        return False
+
+    def close(self):
+        self._mmap.close()
+
+
+def build_dictionary_file(words, path, flags=0, block_size=16, chunk_size=1000000, tmp_dir=None):
+    """
+    Builds the dictionary from the words, with bounded memory.
+
+    The file is written next to path and replaces it at the end.
+    The words longer than 64 KiB (encoded) are skipped.
+
+    :param words: iterable of the words (text lines)
+    :param path: the output file
+    :param flags: normalization of the words (FLAG_CASE_INSENSITIVE, FLAG_LEETSPEAK)
+    :param block_size: the number of words in a block
+    :param chunk_size: the number of words sorted in memory
+    :return: the number of unique words
+    """
+    from django_password_validators.external_sort import (
+        MAX_ITEM_SIZE,
+        atomic_output,
+        iter_sorted_unique,
+    )
+
+    if block_size < 1:
+        raise ValueError('block_size must be greater than 0')
+
+    def encoded_words():
+        for word in words:
+            word = word.strip()
+            if word:
+                word = normalize(word, flags).encode('utf-8')
+                # Longer words can not be sorted, no password is that long
+                if len(word) <= MAX_ITEM_SIZE:
+                    yield word
+
+    count = 0
+    previous = b''
+    # The offsets are known only after the blocks are written,
+    # the blocks are then moved behind the offsets.
+    offsets = array('Q')
+    with atomic_output(path) as f:
+        f.write(HEADER.pack(MAGIC, flags, block_size, 0, 0))
+        blocks_start = f.tell()
+        for word in iter_sorted_unique(encoded_words(), chunk_size=chunk_size, tmp_dir=tmp_dir):
+            if count % block_size == 0:
+                offsets.append(f.tell() - blocks_start)
+                f.write(_encode_varint(len(word)))
+                f.write(word)
+            else:
+                shared = 0
+                max_shared = min(len(word), len(previous))
+                while shared < max_shared and word[shared] == previous[shared]:
+                    shared += 1
+                f.write(_encode_varint(shared))
+                f.write(_encode_varint(len(word) - shared))
+                f.write(word[shared:])
+            previous = word
+            count += 1
+        blocks_end = f.tell()
+
+        # Move the blocks behind the offsets
+        offsets_size = len(offsets) * OFFSET.size
+        position = blocks_end
+        buffer_size = 1024 * 1024
+        f.truncate(blocks_end + offsets_size)
+        while position > blocks_start:
+            read_size = min(buffer_size, position - blocks_start)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size)
+            f.seek(position + offsets_size)
+            f.write(data)
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, flags, block_size, count, len(offsets)))
+        offsets = array('Q', (HEADER.size + offsets_size + offset for offset in offsets))
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        f.write(offsets.tobytes())
+    return count
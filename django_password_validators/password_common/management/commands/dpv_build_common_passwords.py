@@ -0,0 +1,89 @@
+import gzip
+import os
+
+from django.contrib.auth import password_validation
+from django.core.management.base import BaseCommand, CommandError
+
+from django_password_validators.password_common.dictionary_file import (
+    FLAG_CASE_INSENSITIVE,
+    FLAG_LEETSPEAK,
+    build_dictionary_file,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Builds the dictionary for CommonPasswordDictionaryValidator from a text '
+        'file (optionally gzipped) with one password per line.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output',
+            help='The file to build.',
+        )
+        parser.add_argument(
+            '--input',
+            default=None,
+            help='The list of passwords. Default: the list of CommonPasswordValidator.',
+        )
+        parser.add_argument(
+            '--case-insensitive',
+            action='store_true',
+            help='Passwords are compared in lower case.',
+        )
+        parser.add_argument(
+            '--leetspeak',
+            action='store_true',
+            help='Passwords are compared after the leetspeak normalization (p4ssw0rd = password).',
+        )
+        parser.add_argument(
+            '--block-size',
+            type=int,
+            default=16,
+            help='The number of words in a compressed block.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000000,
+            help='The number of words sorted in memory.',
+        )
+        parser.add_argument(
+            '--tmp-dir',
+            default=None,
+            help='The directory for the temporary files.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['input'] or os.path.join(
+            os.path.dirname(os.path.realpath(password_validation.__file__)),
+            'common-passwords.txt.gz'
+        )
+        flags = 0
+        if options['case_insensitive']:
+            flags |= FLAG_CASE_INSENSITIVE
+        if options['leetspeak']:
+            flags |= FLAG_LEETSPEAK
+
+        try:
+            if str(path).endswith('.gz'):
+                words = gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+            else:
+                words = open(path, encoding='utf-8', errors='replace')
+        except OSError as e:
+            raise CommandError(str(e))
+
+        try:
+            with words:
+                count = build_dictionary_file(
+                    words,
+                    options['output'],
+                    flags=flags,
+                    block_size=options['block_size'],
+                    chunk_size=options['chunk_size'],
+                    tmp_dir=options['tmp_dir'],
+                )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write('Written %d passwords to %s.' % (count, options['output']))
@@ -0,0 +1,61 @@
+import os
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+
+from django_password_validators.settings import get_setting
+from django_password_validators.translation import gettext as _
+from django_password_validators.password_common.dictionary_file import DictionaryFile
+
+
+_dictionary_files = {}
+
+
+def get_dictionary_file(path):
+    """
+    The file is opened once per process, the memory is shared by the page cache.
+
+    The file is opened again when it is replaced (e.g. rebuilt by the command),
+    the old mapping is closed when the last reader drops it.
+    """
+    stat = os.stat(path)
+    version = (stat.st_ino, stat.st_mtime_ns)
+    cached = _dictionary_files.get(path)
+    if cached is None or cached[0] != version:
+        cached = _dictionary_files[path] = (version, DictionaryFile(path))
+    return cached[1]
+
+
+class CommonPasswordDictionaryValidator(object):
+    """
+    Validate whether the password is not a common password.
+
+    The password is looked up in the dictionary built by the
+    dpv_build_common_passwords command. The password is normalized
+    (case, leetspeak) the same way as the words of the dictionary.
+    """
+
+    # Estimated cost of the validation in milliseconds (see PipelineValidator)
+    cost = 0
+
+    def __init__(self, dictionary_file=None):
+        """
+
+        :param dictionary_file:
+            path to the dictionary, default: settings.DPV_COMMON_PASSWORDS_FILE
+        """
+        self.dictionary_file = dictionary_file or get_setting('DPV_COMMON_PASSWORDS_FILE', None)
+        if not self.dictionary_file:
+            raise ImproperlyConfigured(
+                'CommonPasswordDictionaryValidator requires the dictionary_file option '
+                'or the DPV_COMMON_PASSWORDS_FILE setting.'
+            )
+
+    def validate(self, password, user=None):
+        if password.strip() in get_dictionary_file(self.dictionary_file):
+            raise ValidationError(
+                _("This password is too common."),
+                code='password_too_common'
+            )
+
+    def get_help_text(self):
+        return _("Your password can't be a commonly used password.")
@@ -5,7 +5,7 @@ from .models import PasswordHistory, UserPasswordHistoryConfig
 
 class UserPasswordHistoryConfigAdmin(admin.ModelAdmin):
 
-    list_display = ('user', 'date', 'iterations')
+    list_display = ('user', 'date', 'hasher', 'algorithm', 'iterations', 'key_id')
     list_filter = ('date', )
     ordering = ('date', )
 
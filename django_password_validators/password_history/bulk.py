@@ -0,0 +1,190 @@
+"""
+Validation of the passwords of many users at once (``manage.py dpv_validate_bulk``),
+for example before importing the users from a legacy system.
+
+The input is read as a stream and validated in chunks, optionally in a pool
+of worker processes. Each chunk is validated with AUTH_PASSWORD_VALIDATORS,
+the results are reported in the order of the input.
+"""
+from collections import deque
+import csv
+import json
+import warnings
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+
+# The error code of the rows without the username or the password
+INVALID_ROW = 'invalid_row'
+
+
+def read_csv_records(lines):
+    """
+    Yields (line number, record) of the CSV file with the header.
+    """
+    reader = csv.DictReader(lines)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def read_jsonl_records(lines):
+    """
+    Yields (line number, record) of the file with one JSON object per line,
+    the record is None if the line is not a JSON object.
+    """
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_number, record if isinstance(record, dict) else None
+
+
+def iter_chunks(items, chunk_size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def make_user(record, username_field):
+    """
+    Returns an unsaved user with the fields of the record,
+    used by the validators comparing the password with the user's attributes.
+    """
+    UserModel = get_user_model()
+    fields = {UserModel.USERNAME_FIELD: record[username_field]}
+    for name, value in record.items():
+        if name == username_field or name in fields:
+            continue
+        try:
+            field = UserModel._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.concrete and not field.is_relation and not field.primary_key:
+            fields[field.attname] = value
+    return UserModel(**fields)
+
+
+def prepare_rows(records, username_field='username', password_field='password'):
+    """
+    Converts a chunk of records to the rows (line number, username, password, user).
+
+    The existing users are looked up with a single query, the other users are unsaved.
+    The user is None for the invalid records.
+    """
+    UserModel = get_user_model()
+    usernames = [
+        str(record[username_field]) for _, record in records
+        if record and record.get(username_field)
+    ]
+    users = UserModel._default_manager.in_bulk(usernames, field_name=UserModel.USERNAME_FIELD)
+    rows = []
+    for line_number, record in records:
+        password = record and record.get(password_field)
+        if not record or not record.get(username_field) or not isinstance(password, str) or not password:
+            rows.append((line_number, record and record.get(username_field), None, None))
+            continue
+        username = str(record[username_field])
+        user = users.get(username)
+        if user is None:
+            user = make_user(dict(record, **{username_field: username}), username_field)
+        rows.append((line_number, username, password, user))
+    return rows
+
+
+def seed_password_history(users_passwords):
+    """
+    Stores the passwords in the history of the (saved) users,
+    the database storage does it with a single insert.
+
+    :return: the number of stored passwords
+    """
+    from django_password_validators.password_history.password_validation import (
+        get_default_unique_passwords_validator,
+    )
+
+    storage = get_default_unique_passwords_validator().get_storage()
+    history = []
+    for user, password in users_passwords:
+        user_config = storage.get_current_user_config(user)
+        history.append((user, user_config, user_config.make_password_hash(password)))
+    storage.store_passwords(history)
+    return len(history)
+
+
+def validate_rows(rows, seed_history=False):
+    """
+    Validates a chunk of rows prepared by prepare_rows.
+
+    :return: the list of (line number, username, [(code, message), ...])
+        and the number of passwords stored in the history
+    """
+    from django.contrib.auth.password_validation import validate_password
+
+    results = []
+    valid = []
+    with warnings.catch_warnings():
+        # The users which are not imported yet have no password history
+        warnings.filterwarnings('ignore', message='An unsaved user model')
+        for line_number, username, password, user in rows:
+            if user is None:
+                results.append((line_number, username, [(INVALID_ROW, 'The username or the password is missing.')]))
+                continue
+            errors = []
+            try:
+                validate_password(password, user)
+            except ValidationError as e:
+                errors = [(error.code or 'invalid', ' '.join(error.messages)) for error in e.error_list]
+            else:
+                if user.pk is not None:
+                    valid.append((user, password))
+            results.append((line_number, username, errors))
+    seeded = seed_password_history(valid) if seed_history and valid else 0
+    return results, seeded
+
+
+# The database connections inherited by the forked workers, they stay referenced
+# and are never closed: closing them would end the sessions of the parent process.
+_inherited_connections = []
+
+
+def init_worker():
+    from django.apps import apps
+    from django.db import connections
+
+    if not apps.ready:
+        # Django is not set up in the spawned processes
+        django.setup()
+        return
+    # The parent may have queried the database before the workers were forked
+    for alias in connections:
+        _inherited_connections.append(connections[alias])
+        connections[alias] = connections.create_connection(alias)
+
+
+def map_chunks(function, chunks, executor=None, max_pending=4):
+    """
+    Yields function(chunk) for each chunk in the order of the chunks.
+
+    With the executor, at most max_pending chunks are submitted at once,
+    so that the input is not read faster than it is validated.
+    """
+    if executor is None:
+        for chunk in chunks:
+            yield function(chunk)
+        return
+    pending = deque()
+    for chunk in chunks:
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+        pending.append(executor.submit(function, chunk))
+    while pending:
+        yield pending.popleft().result()
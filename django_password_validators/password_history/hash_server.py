@@ -0,0 +1,218 @@
+"""
+Out-of-process hashing of the password history.
+
+The server (``manage.py dpv_hash_server``) listens on a Unix socket and
+hashes passwords in a fixed-size pool of worker processes, so that the
+expensive history hashers do not occupy the processes serving requests.
+
+Protocol: the client sends one JSON line with a batch of jobs
+``{"jobs": [[hasher, password, salt, iterations], ...]}`` and receives one
+JSON line ``{"hashes": [...]}`` or ``{"error": "..."}``.
+Only the hashers of get_hash_server_hashers() are accepted.
+"""
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+
+from django.contrib.auth.hashers import BasePasswordHasher
+from django.utils.module_loading import import_string
+
+from django_password_validators.settings import (
+    get_hash_server_connect_timeout,
+    get_hash_server_hashers,
+    get_hash_server_socket,
+    get_hash_server_timeout,
+)
+
+logger = logging.getLogger(__name__)
+
+# Maximum size of a single request, protects the server against clients
+# sending garbage.
+MAX_REQUEST_SIZE = 1024 * 1024
+
+
+class HashServerError(Exception):
+    pass
+
+
+class HashServerBusy(HashServerError):
+    pass
+
+
+def hash_password(hasher, password, salt, iterations):
+    return import_string(hasher)().encode(password, salt, iterations)
+
+
+def _hash_job(job):
+    return hash_password(*job)
+
+
+class HashRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        server = self.server
+        self.request.settimeout(server.request_timeout)
+        try:
+            request = json.loads(self.rfile.readline(MAX_REQUEST_SIZE))
+            jobs = [tuple(job) for job in request['jobs']]
+        except (ValueError, KeyError, TypeError, socket.timeout):
+            self._reply({'error': 'bad request'})
+            return
+        if not all(len(job) == 4 and server.is_hasher_allowed(job[0]) for job in jobs):
+            self._reply({'error': 'hasher not allowed'})
+            return
+
+        if not server.reserve(len(jobs)):
+            self._reply({'error': 'busy'})
+            return
+        futures = []
+        for job in jobs:
+            future = server.executor.submit(_hash_job, job)
+            # The slot is taken until the job is done, also after the timeout
+            future.add_done_callback(server.release_one)
+            futures.append(future)
+        deadline = time.monotonic() + server.request_timeout
+        try:
+            hashes = [future.result(max(deadline - time.monotonic(), 0)) for future in futures]
+        except TimeoutError:
+            for future in futures:
+                future.cancel()
+            self._reply({'error': 'timeout'})
+            return
+        except Exception as e:
+            logger.exception('Password hashing failed')
+            self._reply({'error': str(e) or e.__class__.__name__})
+            return
+        self._reply({'hashes': hashes})
+
+    def _reply(self, response):
+        try:
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+        except OSError:
+            # The client has gone away (e.g. timeout), nothing to do.
+            pass
+
+
+class HashServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Hashes passwords sent to the Unix socket in a pool of worker processes.
+
+    Requests exceeding max_pending queued jobs are rejected with
+    the "busy" error, the clients then hash the password themselves.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, socket_path, workers=None, max_pending=64, timeout=30, hashers=None):
+        """
+        :param hashers: the paths of the accepted hashers, default: get_hash_server_hashers()
+        """
+        self.socket_path = socket_path
+        self.max_pending = max_pending
+        self.request_timeout = timeout
+        self.hashers = set(get_hash_server_hashers() if hashers is None else hashers)
+        self._hasher_classes = {}
+        self.pending = 0
+        self._pending_lock = threading.Lock()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        socketserver.UnixStreamServer.__init__(self, socket_path, HashRequestHandler)
+
+    def server_bind(self):
+        # Only the user running the server (and the web processes) may connect
+        umask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.server_bind(self)
+        finally:
+            os.umask(umask)
+
+    def is_hasher_allowed(self, hasher):
+        if not isinstance(hasher, str) or hasher not in self.hashers:
+            return False
+        if hasher not in self._hasher_classes:
+            try:
+                hasher_class = import_string(hasher)
+            except ImportError:
+                hasher_class = None
+            self._hasher_classes[hasher] = (
+                isinstance(hasher_class, type) and issubclass(hasher_class, BasePasswordHasher)
+            )
+        return self._hasher_classes[hasher]
+
+    def reserve(self, jobs_count):
+        with self._pending_lock:
+            if self.pending + jobs_count > self.max_pending:
+                return False
+            self.pending += jobs_count
+            return True
+
+    def release(self, jobs_count):
+        with self._pending_lock:
+            self.pending -= jobs_count
+
+    def release_one(self, future=None):
+        self.release(1)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        self.executor.shutdown(wait=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def request_hashes(socket_path, jobs, timeout, connect_timeout=None):
+    """
+    Sends the batch of jobs to the server, returns the list of hashes.
+
+    :param connect_timeout: the timeout of the connection, default: timeout
+    :raises HashServerError: the server could not hash the passwords
+    :raises OSError: the server is not available
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout if connect_timeout is None else connect_timeout)
+    try:
+        client.connect(socket_path)
+        client.settimeout(timeout)
+        client.sendall(json.dumps({'jobs': jobs}).encode('utf-8') + b'\n')
+        response = client.makefile('rb').readline()
+    finally:
+        client.close()
+    if not response:
+        raise HashServerError('no response')
+    response = json.loads(response)
+    if response.get('error') == 'busy':
+        raise HashServerBusy('busy')
+    if 'error' in response:
+        raise HashServerError(response['error'])
+    return response['hashes']
+
+
+def make_password_hashes(jobs):
+    """
+    Hashes the batch of jobs (hasher, password, salt, iterations).
+
+    The jobs are sent to the hashing server if it is configured
+    (DPV_HASH_SERVER_SOCKET), if it is not available the passwords
+    are hashed in the process.
+    """
+    socket_path = get_hash_server_socket()
+    if socket_path:
+        try:
+            return request_hashes(
+                socket_path,
+                [list(job) for job in jobs],
+                get_hash_server_timeout(),
+                get_hash_server_connect_timeout()
+            )
+        except (OSError, ValueError, HashServerError) as e:
+            logger.warning(
+                'The password history hashing server is not available (%s), '
+                'hashing in the process.', e
+            )
+    return [hash_password(*job) for job in jobs]
@@ -1,4 +1,12 @@
-from django.contrib.auth.hashers import PBKDF2PasswordHasher
+import base64
+import hashlib
+import hmac
+
+from django.contrib.auth.hashers import BasePasswordHasher, PBKDF2PasswordHasher
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.crypto import constant_time_compare
+
+from django_password_validators.settings import get_history_hmac_keys
 
 
 class HistoryHasher(PBKDF2PasswordHasher):
@@ -22,4 +30,145 @@ class HistoryVeryStrongHasher(PBKDF2PasswordHasher):
     """
     # Experimental value of the of iterations so that the calculation on the
     # average server configuration lasted around 10 second.
-    iterations = 20000 * 101
\ No newline at end of file
+    iterations = 20000 * 101
+
+
+class HistoryHMACHasher(BasePasswordHasher):
+    """
+    HMAC-SHA256 of the password with a server-side secret key.
+
+    The history hashes are never verified by anyone else, so instead of
+    the slow key derivation they are protected by the key, which is not
+    stored in the database (DPV_HISTORY_HMAC_KEYS, DPV_HISTORY_HMAC_KEY_FILE).
+    The id of the key is recorded in the configuration of the user.
+    """
+    algorithm = 'dpv_hmac_sha256'
+    # The configurations of the keyed hashers record the key id.
+    keyed = True
+    # HMAC has no iterations, the value keeps the configurations unique.
+    iterations = 1
+
+    def get_key(self, key_id):
+        try:
+            return get_history_hmac_keys()[key_id]
+        except KeyError:
+            raise ImproperlyConfigured(
+                'The key %r of the HMAC history hasher is not configured, '
+                'retire it with the dpv_retire_history_keys command.' % key_id
+            )
+
+    def encode(self, password, salt, key_id=None):
+        assert password is not None
+        assert salt and '$' not in salt
+        assert key_id and '$' not in key_id
+        digest = hmac.new(
+            self.get_key(key_id).encode('utf-8'),
+            ('%s$%s' % (salt, password)).encode('utf-8'),
+            hashlib.sha256
+        ).digest()
+        return '%s$%s$%s$%s' % (
+            self.algorithm, key_id, salt, base64.b64encode(digest).decode('ascii')
+        )
+
+    def decode(self, encoded):
+        algorithm, key_id, salt, hash = encoded.split('$', 3)
+        assert algorithm == self.algorithm
+        return {
+            'algorithm': algorithm,
+            'key_id': key_id,
+            'salt': salt,
+            'hash': hash,
+        }
+
+    def verify(self, password, encoded):
+        decoded = self.decode(encoded)
+        return constant_time_compare(
+            encoded,
+            self.encode(password, decoded['salt'], decoded['key_id'])
+        )
+
+    def safe_summary(self, encoded):
+        decoded = self.decode(encoded)
+        return {
+            'algorithm': decoded['algorithm'],
+            'key_id': decoded['key_id'],
+        }
+
+
+class HistoryScryptHasher(BasePasswordHasher):
+    """
+    Memory-hard history hasher (hashlib.scrypt).
+
+    The work factor (N) is stored as the iterations of the configuration.
+    To change the block size (r) or the parallelism (p), create a subclass,
+    the configurations record the hasher they were created with.
+    """
+    algorithm = 'dpv_scrypt'
+    # N, a power of 2. The memory used is 128 * N * r bytes (16 MiB).
+    iterations = 2 ** 14
+    block_size = 8
+    parallelism = 1
+    # The memory cap of hashlib.scrypt, it must exceed the memory used
+    maxmem = 64 * 1024 * 1024
+    dklen = 64
+
+    def encode(self, password, salt, iterations=None):
+        assert password is not None
+        assert salt and '$' not in salt
+        n = iterations or self.iterations
+        digest = hashlib.scrypt(
+            password.encode('utf-8'),
+            salt=salt.encode('utf-8'),
+            n=n,
+            r=self.block_size,
+            p=self.parallelism,
+            maxmem=self.maxmem,
+            dklen=self.dklen,
+        )
+        return '%s$%d$%d$%d$%s$%s' % (
+            self.algorithm, n, self.block_size, self.parallelism, salt,
+            base64.b64encode(digest).decode('ascii')
+        )
+
+    def decode(self, encoded):
+        algorithm, n, block_size, parallelism, salt, hash = encoded.split('$', 5)
+        assert algorithm == self.algorithm
+        return {
+            'algorithm': algorithm,
+            'iterations': int(n),
+            'block_size': int(block_size),
+            'parallelism': int(parallelism),
+            'salt': salt,
+            'hash': hash,
+        }
+
+    def verify(self, password, encoded):
+        decoded = self.decode(encoded)
+        return constant_time_compare(encoded, self.encode(password, decoded['salt'], decoded['iterations']))
+
+    def safe_summary(self, encoded):
+        decoded = self.decode(encoded)
+        return {
+            'algorithm': decoded['algorithm'],
+            'iterations': decoded['iterations'],
+            'block_size': decoded['block_size'],
+            'parallelism': decoded['parallelism'],
+        }
+
+
+# The hashers of the configurations which recorded only the algorithm
+HISTORY_HASHERS = {
+    HistoryHasher.algorithm: 'django_password_validators.password_history.hashers.HistoryHasher',
+    HistoryHMACHasher.algorithm: 'django_password_validators.password_history.hashers.HistoryHMACHasher',
+    HistoryScryptHasher.algorithm: 'django_password_validators.password_history.hashers.HistoryScryptHasher',
+}
+
+
+class HistoryTestHasher(HistoryHasher):
+    """
+    Hasher for tests only, never use it in production!
+
+    It has the same API and storage format as HistoryHasher,
+    but the minimal number of iterations.
+    """
+    iterations = 1
@@ -0,0 +1,182 @@
+"""
+Concurrency load test of the password history (``manage.py dpv_load_testing``).
+
+Threads call validate() and password_changed() of UniquePasswordsValidator
+at the same time, on users shared by all threads and on users of each thread,
+so that the contention of the history writes (lock waits, conflicting inserts,
+pruning) can be measured. Use a database shared by the threads, e.g. a file-backed
+SQLite database, the in-memory SQLite database is private to each connection.
+"""
+from collections import Counter
+import random
+import threading
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, connection, connections
+
+from django_password_validators.password_history.stats import get_percentiles
+from django_password_validators.password_history.storage import HistoryStorageLockError
+
+OPERATIONS = ('validate', 'password_changed')
+
+LATENCY_PERCENTILES = (50, 95, 99)
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def is_lock_error(error):
+    if isinstance(error, HistoryStorageLockError):
+        return True
+    return isinstance(error, OperationalError) and 'locked' in str(error).lower()
+
+
+class OperationStats(object):
+
+    def __init__(self):
+        self.latencies = []
+        self.rejected = 0
+        self.retries = 0
+        self.errors = Counter()
+
+    def merge(self, other):
+        self.latencies.extend(other.latencies)
+        self.rejected += other.rejected
+        self.retries += other.retries
+        self.errors.update(other.errors)
+
+    def as_dict(self, elapsed):
+        latencies = get_percentiles(Counter(self.latencies), LATENCY_PERCENTILES)
+        return {
+            'calls': len(self.latencies),
+            'per_second': len(self.latencies) / elapsed if elapsed else 0,
+            'latency_ms': {
+                name: value * 1000 for name, value in latencies.items() if name != 'count'
+            },
+            'rejected': self.rejected,
+            'retries': self.retries,
+            'errors': dict(self.errors),
+        }
+
+
+class Worker(object):
+    """
+    Runs the operations of one thread and collects the statistics.
+    """
+
+    def __init__(self, validator, users, passwords, operations, changed_ratio,
+                 max_retries, rng):
+        self.validator = validator
+        self.users = users
+        self.passwords = passwords
+        self.operations = operations
+        self.changed_ratio = changed_ratio
+        self.max_retries = max_retries
+        self.rng = rng
+        self.stats = {operation: OperationStats() for operation in OPERATIONS}
+        self.lock_wait = 0.0
+        self.write_time = 0.0
+
+    def measure_writes(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(WRITE_STATEMENTS):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.write_time += time.perf_counter() - start
+
+    def call(self, operation, user, password):
+        stats = self.stats[operation]
+        function = getattr(self.validator, operation)
+        for attempt in range(self.max_retries + 1):
+            attempt_start = time.perf_counter()
+            try:
+                function(password, user)
+            except ValidationError:
+                stats.rejected += 1
+                return
+            except (IntegrityError, OperationalError, HistoryStorageLockError) as e:
+                lock_error = is_lock_error(e)
+                if lock_error:
+                    self.lock_wait += time.perf_counter() - attempt_start
+                if attempt == self.max_retries:
+                    stats.errors[e.__class__.__name__] += 1
+                    return
+                stats.retries += 1
+                # Exponential backoff with jitter
+                backoff = self.rng.uniform(0, 0.001 * 2 ** attempt)
+                time.sleep(backoff)
+                if lock_error:
+                    self.lock_wait += backoff
+            else:
+                return
+
+    def run(self, barrier):
+        try:
+            with connection.execute_wrapper(self.measure_writes):
+                barrier.wait()
+                for _ in range(self.operations):
+                    operation = 'password_changed' if self.rng.random() < self.changed_ratio else 'validate'
+                    user = self.rng.choice(self.users)
+                    password = self.rng.choice(self.passwords)
+                    start = time.perf_counter()
+                    self.call(operation, user, password)
+                    self.stats[operation].latencies.append(time.perf_counter() - start)
+        finally:
+            # The connections of the thread
+            connections.close_all()
+
+
+def run_load_test(validator, shared_users, thread_users, operations=50, changed_ratio=0.5,
+                  passwords=5, max_retries=3, seed=None):
+    """
+    Runs the load test, one thread per item of thread_users.
+
+    :param shared_users: the users of all threads
+    :param thread_users: the list of the users of each thread (e.g. [[user], [user], ...])
+    :param operations: the number of operations of each thread
+    :param changed_ratio: the part of the operations calling password_changed,
+        the others call validate
+    :param passwords: the number of distinct passwords, a small number makes
+        validate reject the passwords in the history
+    :param max_retries: the retries of the operations failing on a lock or a conflicting insert
+    :return: the statistics per operation and in total
+    """
+    rng = random.Random(seed)
+    password_pool = ['Load-test-password-%d' % i for i in range(passwords)]
+    workers = [
+        Worker(
+            validator,
+            list(shared_users) + list(users),
+            password_pool,
+            operations,
+            changed_ratio,
+            max_retries,
+            random.Random(rng.random())
+        )
+        for users in thread_users
+    ]
+    barrier = threading.Barrier(len(workers) + 1)
+    threads = [threading.Thread(target=worker.run, args=(barrier,)) for worker in workers]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    result = {}
+    total = OperationStats()
+    for operation in OPERATIONS:
+        stats = OperationStats()
+        for worker in workers:
+            stats.merge(worker.stats[operation])
+        total.merge(stats)
+        result[operation] = stats.as_dict(elapsed)
+    result['total'] = total.as_dict(elapsed)
+    result['elapsed_s'] = elapsed
+    result['lock_wait_ms'] = sum(worker.lock_wait for worker in workers) * 1000
+    result['write_ms'] = sum(worker.write_time for worker in workers) * 1000
+    return result
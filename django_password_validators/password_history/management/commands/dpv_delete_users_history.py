@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from django_password_validators.password_history.models import UserPasswordHistoryConfig
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes the password history of the given users with set-based statements, '
+        'optionally followed by the users themselves.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'user_ids',
+            nargs='*',
+            help='The primary keys of the users.',
+        )
+        parser.add_argument(
+            '--inactive',
+            action='store_true',
+            help='All inactive users (is_active = False).',
+        )
+        parser.add_argument(
+            '--delete-users',
+            action='store_true',
+            help='Delete the users after their password history.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='The number of configurations deleted in one statement.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size must be greater than 0.')
+        if not options['user_ids'] and not options['inactive']:
+            raise CommandError('Give the user ids or the --inactive option.')
+
+        users = get_user_model()._default_manager.all()
+        if options['user_ids']:
+            users = users.filter(pk__in=options['user_ids'])
+        if options['inactive']:
+            users = users.filter(is_active=False)
+
+        deleted_configs, deleted_passwords = UserPasswordHistoryConfig.objects.delete_for_users(
+            users.values('pk'),
+            batch_size=options['batch_size']
+        )
+        self.stdout.write('Deleted %d configurations and %d passwords.' % (deleted_configs, deleted_passwords))
+        if options['delete_users']:
+            deleted_users = users.delete()[1].get(users.model._meta.label, 0)
+            self.stdout.write('Deleted %d users.' % deleted_users)
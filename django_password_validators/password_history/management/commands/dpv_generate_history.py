@@ -0,0 +1,95 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_password_validators.password_history.synthetic import (
+    HistoryGenerator,
+    parse_distribution,
+)
+from django_password_validators.settings import get_history_layout
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates users with the synthetic password history (placeholder hashes) '
+        'straight in the database, for checking the indexes, the pruning and the query plans at scale. '
+        'An interrupted run with the same options continues where it stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=1000,
+            help='The total number of the generated users (with the prefix).',
+        )
+        parser.add_argument(
+            '--prefix',
+            default='dpv_gen_',
+            help='The prefix of the usernames.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='The same seed generates the same data. Default: random, it is printed.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='The number of users generated in one transaction.',
+        )
+        parser.add_argument(
+            '--depth',
+            default='geometric:8',
+            help='The distribution of the number of passwords of the user, e.g. constant:10, '
+                 'uniform:1:20, geometric:8, poisson:8.',
+        )
+        parser.add_argument(
+            '--configs',
+            default='choice:1=0.85,2=0.12,3=0.03',
+            help='The distribution of the number of configurations (hashers) of the user.',
+        )
+        parser.add_argument(
+            '--interval',
+            default='exponential:90',
+            help='The distribution of the days between the password changes.',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 0:
+            raise CommandError('--users must not be negative.')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be greater than 0.')
+        try:
+            depth, configs, interval = (
+                parse_distribution(options[name]) for name in ('depth', 'configs', 'interval')
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        seed = options['seed']
+        if seed is None:
+            seed = random.SystemRandom().randrange(2 ** 32)
+            self.stdout.write('Seed: %d' % seed)
+
+        generator = HistoryGenerator(
+            options['prefix'],
+            seed,
+            depth=depth,
+            configs=configs,
+            interval=interval,
+            layout=get_history_layout()
+        )
+        existing = generator.count_existing()
+        if existing:
+            self.stdout.write('Resuming after %d existing users.' % existing)
+        users = passwords = 0
+        start = time.perf_counter()
+        for chunk_users, chunk_passwords in generator.generate(options['users'], options['chunk_size']):
+            users += chunk_users
+            passwords += chunk_passwords
+            self.stdout.write('%d/%d users, %d passwords' % (existing + users, options['users'], passwords))
+        elapsed = time.perf_counter() - start
+        self.stdout.write('Generated %d users and %d passwords in %.1f s.' % (users, passwords, elapsed))
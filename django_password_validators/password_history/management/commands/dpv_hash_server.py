@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from django_password_validators.password_history.hash_server import HashServer
+from django_password_validators.settings import (
+    get_hash_server_socket,
+    get_hash_server_timeout,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs the password history hashing server on a Unix socket. '
+        'Passwords are hashed in a fixed-size pool of worker processes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--socket',
+            default=None,
+            help='Path to the Unix socket. Default: DPV_HASH_SERVER_SOCKET.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='The number of worker processes. Default: the number of CPUs.',
+        )
+        parser.add_argument(
+            '--max-pending',
+            type=int,
+            default=64,
+            help='The maximum number of queued passwords, above it requests are rejected.',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=None,
+            help='Timeout of a single request in seconds. Default: DPV_HASH_SERVER_TIMEOUT.',
+        )
+
+    def handle(self, *args, **options):
+        socket_path = options['socket'] or get_hash_server_socket()
+        if not socket_path:
+            raise CommandError(
+                'The socket is not configured, set DPV_HASH_SERVER_SOCKET '
+                'or use the --socket option.'
+            )
+        timeout = options['timeout']
+        if timeout is None:
+            timeout = get_hash_server_timeout()
+
+        server = HashServer(
+            socket_path,
+            workers=options['workers'],
+            max_pending=options['max_pending'],
+            timeout=timeout,
+        )
+        self.stdout.write('Listening on %s' % socket_path)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,87 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from django_password_validators.password_history.password_validation import (
+    UniquePasswordsValidator,
+    get_default_unique_passwords_validator,
+)
+from django_password_validators.password_history.stats import get_history_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Reports the size of the password history tables for capacity planning, '
+        'computed with aggregate queries (the packed histories are read in batches).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--last-passwords',
+            type=int,
+            default=None,
+            help='Default: last_passwords of the configured UniquePasswordsValidator.',
+        )
+        parser.add_argument(
+            '--max-age',
+            type=int,
+            default=None,
+            help='Default: max_age of the configured UniquePasswordsValidator.',
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='The number of users with the most configurations.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['text', 'json'],
+            default='text',
+        )
+
+    def write_section(self, title, values):
+        self.stdout.write('%s:' % title)
+        for name, value in values.items():
+            if isinstance(value, float):
+                value = '%.2f' % value
+            self.stdout.write('  %-28s %s' % (name, value))
+
+    def handle(self, *args, **options):
+        validator = get_default_unique_passwords_validator() or UniquePasswordsValidator()
+        last_passwords = validator.last_passwords if options['last_passwords'] is None else options['last_passwords']
+        max_age = validator.max_age if options['max_age'] is None else options['max_age']
+        stats = get_history_stats(last_passwords=last_passwords, max_age=max_age, top=options['top'])
+
+        if options['format'] == 'json':
+            self.stdout.write(json.dumps(stats, indent=2))
+            return
+
+        for name, table in stats['tables'].items():
+            self.write_section('Table %s (%s)' % (table['table'], name), {
+                'rows': table['rows'],
+                'estimated bytes per row': table['row_bytes'],
+                'estimated bytes': table['estimated_bytes'],
+            })
+            self.write_section('  Estimated bytes per index entry', table['index_entry_bytes'])
+            if 'total_relation_bytes' in table:
+                self.stdout.write('  %-28s %s' % ('total relation bytes', table['total_relation_bytes']))
+        if stats['packed_history']['configs']:
+            self.write_section('Packed history', stats['packed_history'])
+        self.write_section('History length per user', stats['history_length_per_user'])
+        self.write_section('Configurations per user', stats['configs_per_user'])
+        self.stdout.write('Configurations per hasher:')
+        for row in stats['configs_per_hasher']:
+            self.stdout.write('  %s [%s]: %d configurations, %d passwords' % (
+                row['hasher'] or 'default', row['iterations'], row['configs'], row['passwords']
+            ))
+        self.stdout.write('Users with the most configurations:')
+        for row in stats['top_users_by_configs']:
+            self.stdout.write('  user %s: %d configurations, %d passwords' % (
+                row['user'], row['configs'], row['passwords']
+            ))
+        self.write_section('Age of the passwords', stats['history_age'])
+        self.write_section(
+            'Passwords outside the window (last_passwords=%d, max_age=%d)' % (last_passwords, max_age),
+            stats['outside_window']
+        )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from django_password_validators.password_history.models import UserPasswordHistoryConfig
+from django_password_validators.password_history.packed import pack_config_history
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves the password history rows to the packed layout (DPV_HISTORY_LAYOUT = "packed"). '
+        'Run it after switching the layout.'
+    )
+
+    def handle(self, *args, **options):
+        config_ids = list(
+            UserPasswordHistoryConfig.objects.
+            filter(passwordhistory__isnull=False).
+            order_by('pk').
+            values_list('pk', flat=True).
+            distinct()
+        )
+        configs = passwords = skipped = 0
+        for config_id in config_ids:
+            try:
+                passwords += pack_config_history(config_id)
+            except ValueError as e:
+                # e.g. the hashes of a custom hasher without the base64 digest
+                self.stderr.write('Configuration %d: %s' % (config_id, e))
+                skipped += 1
+                continue
+            configs += 1
+        self.stdout.write(
+            'Packed %d passwords of %d configurations, %d configurations skipped.' % (passwords, configs, skipped)
+        )
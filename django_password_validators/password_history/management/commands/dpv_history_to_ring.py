@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from django_password_validators.password_history.models import UserPasswordHistoryConfig
+from django_password_validators.password_history.password_validation import (
+    UniquePasswordsValidator,
+    get_default_unique_passwords_validator,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Converts the password history to the ring layout (DPV_HISTORY_LAYOUT = "ring"). '
+        'Run it after switching the layout or changing last_passwords.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--last-passwords',
+            type=int,
+            default=None,
+            help='The number of slots. Default: last_passwords of the configured UniquePasswordsValidator.',
+        )
+
+    def handle(self, *args, **options):
+        if options['last_passwords'] is not None:
+            validator = UniquePasswordsValidator(last_passwords=options['last_passwords'])
+        else:
+            validator = get_default_unique_passwords_validator()
+        if validator is None or validator.last_passwords <= 0:
+            raise CommandError(
+                'The ring layout requires last_passwords, use the --last-passwords option.'
+            )
+
+        user_ids = UserPasswordHistoryConfig.objects. \
+            order_by('user'). \
+            values_list('user', flat=True). \
+            distinct()
+        converted = 0
+        for user_id in user_ids.iterator():
+            validator.build_ring(user_id)
+            converted += 1
+        self.stdout.write('Converted the password history of %d users.' % converted)
@@ -0,0 +1,154 @@
+import json
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from django_password_validators.password_history.load_testing import (
+    OPERATIONS,
+    run_load_test,
+)
+from django_password_validators.password_history.password_validation import (
+    UniquePasswordsValidator,
+    get_default_unique_passwords_validator,
+)
+from django_password_validators.password_history.synthetic import create_synthetic_user
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs validate() and password_changed() of UniquePasswordsValidator '
+        'in concurrent threads against the configured database and reports '
+        'the throughput, latencies, retries and lock waits. '
+        'Temporary users are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+        )
+        parser.add_argument(
+            '--operations',
+            type=int,
+            default=50,
+            help='The number of operations of each thread.',
+        )
+        parser.add_argument(
+            '--shared-users',
+            type=int,
+            default=2,
+            help='The number of temporary users used by all threads.',
+        )
+        parser.add_argument(
+            '--thread-users',
+            type=int,
+            default=1,
+            help='The number of temporary users used only by one thread.',
+        )
+        parser.add_argument(
+            '--changed-ratio',
+            type=float,
+            default=0.5,
+            help='The part of the operations calling password_changed, the others call validate.',
+        )
+        parser.add_argument(
+            '--passwords',
+            type=int,
+            default=5,
+            help='The number of distinct passwords.',
+        )
+        parser.add_argument(
+            '--retries',
+            type=int,
+            default=3,
+            help='The retries of the operations failing on a lock or a conflicting insert.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+        )
+        parser.add_argument(
+            '--format',
+            choices=['text', 'json'],
+            default='text',
+        )
+
+    def get_validator(self):
+        validator = get_default_unique_passwords_validator() or UniquePasswordsValidator()
+        # The rate limit would reject most of the operations
+        return UniquePasswordsValidator(
+            last_passwords=validator.last_passwords,
+            max_age=validator.max_age,
+            max_configs=validator.max_configs,
+        )
+
+    def handle(self, *args, **options):
+        for name in ('threads', 'operations', 'passwords'):
+            if options[name] < 1:
+                raise CommandError('--%s must be greater than 0.' % name.replace('_', '-'))
+        for name in ('shared_users', 'thread_users', 'retries'):
+            if options[name] < 0:
+                raise CommandError('--%s must not be negative.' % name.replace('_', '-'))
+        if not options['shared_users'] and not options['thread_users']:
+            raise CommandError('--shared-users or --thread-users must be greater than 0.')
+        if not 0 <= options['changed_ratio'] <= 1:
+            raise CommandError('--changed-ratio must be between 0 and 1.')
+        if connection.vendor == 'sqlite' and connection.settings_dict['NAME'] in ('', ':memory:'):
+            raise CommandError('The in-memory SQLite database is not shared by the threads, use a database file.')
+
+        prefix = 'dpv_load_%s_' % uuid.uuid4().hex[:8]
+        users = []
+        try:
+            for i in range(options['shared_users']):
+                users.append(create_synthetic_user('%sshared_%d' % (prefix, i)))
+            shared_users = list(users)
+            thread_users = []
+            for thread in range(options['threads']):
+                thread_users.append([
+                    create_synthetic_user('%st%d_%d' % (prefix, thread, i))
+                    for i in range(options['thread_users'])
+                ])
+                users.extend(thread_users[-1])
+
+            result = run_load_test(
+                self.get_validator(),
+                shared_users,
+                thread_users,
+                operations=options['operations'],
+                changed_ratio=options['changed_ratio'],
+                passwords=options['passwords'],
+                max_retries=options['retries'],
+                seed=options['seed'],
+            )
+        finally:
+            get_user_model().objects.filter(pk__in=[user.pk for user in users]).delete()
+
+        if options['format'] == 'json':
+            self.stdout.write(json.dumps(result, indent=2, sort_keys=True))
+            return
+
+        self.stdout.write(
+            'threads=%d operations=%d shared users=%d thread users=%d, %.2f s' % (
+                options['threads'], options['operations'], options['shared_users'],
+                options['thread_users'], result['elapsed_s']
+            )
+        )
+        self.stdout.write('%-18s %8s %8s %9s %9s %9s %8s %8s %7s' % (
+            'operation', 'calls', 'ops/s', 'p50 ms', 'p95 ms', 'p99 ms', 'rejected', 'retries', 'errors'
+        ))
+        for operation in OPERATIONS + ('total',):
+            stats = result[operation]
+            latency = stats['latency_ms']
+            self.stdout.write('%-18s %8d %8.1f %9.2f %9.2f %9.2f %8d %8d %7d' % (
+                operation, stats['calls'], stats['per_second'], latency.get('p50', 0),
+                latency.get('p95', 0), latency.get('p99', 0), stats['rejected'],
+                stats['retries'], sum(stats['errors'].values())
+            ))
+        for name, count in sorted(result['total']['errors'].items()):
+            self.stdout.write('%s: %d' % (name, count))
+        self.stdout.write('Lock wait (failed attempts and backoff): %.1f ms' % result['lock_wait_ms'])
+        self.stdout.write('Write statements: %.1f ms' % result['write_ms'])
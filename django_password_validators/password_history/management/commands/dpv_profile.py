@@ -0,0 +1,195 @@
+from collections import OrderedDict
+import cProfile
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from django_password_validators.password_history.packed import pack_config_history
+from django_password_validators.password_history.password_validation import (
+    UniquePasswordsValidator,
+    get_default_unique_passwords_validator,
+)
+from django_password_validators.password_history.synthetic import (
+    create_synthetic_configs,
+    create_synthetic_history,
+    create_synthetic_user,
+)
+
+PHASES = (
+    'config lookup',
+    'hashing',
+    'membership query',
+    'pruning',
+    'insert',
+    'validate',
+    'password_changed',
+)
+
+
+class PhaseStats(object):
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.queries = 0
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'total_ms': self.seconds * 1000,
+            'mean_ms': self.seconds * 1000 / self.calls if self.calls else 0,
+            'queries': self.queries,
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        'Profiles the password history with a synthetic workload against '
+        'the configured database and hasher. Temporary users are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=5,
+            help='The number of temporary users.',
+        )
+        parser.add_argument(
+            '--history-depth',
+            type=int,
+            default=10,
+            help='The number of passwords in the history of each configuration.',
+        )
+        parser.add_argument(
+            '--configs',
+            type=int,
+            default=1,
+            help='The number of configurations (hashers) of each user.',
+        )
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=2,
+            help='The number of password changes of each user.',
+        )
+        parser.add_argument(
+            '--last-passwords',
+            type=int,
+            default=None,
+            help='Default: last_passwords of the configured UniquePasswordsValidator.',
+        )
+        parser.add_argument(
+            '--max-age',
+            type=int,
+            default=None,
+            help='Default: max_age of the configured UniquePasswordsValidator.',
+        )
+        parser.add_argument(
+            '--profile-output',
+            default=None,
+            help='Write the cProfile statistics to this file.',
+        )
+
+    def get_validator(self, options):
+        validator = get_default_unique_passwords_validator() or UniquePasswordsValidator()
+        return UniquePasswordsValidator(
+            last_passwords=(
+                validator.last_passwords if options['last_passwords'] is None else options['last_passwords']
+            ),
+            max_age=validator.max_age if options['max_age'] is None else options['max_age'],
+            max_configs=validator.max_configs,
+        )
+
+    def create_history(self, validator, user, options):
+        configs = create_synthetic_configs(user, options['configs'])
+        for user_config in configs:
+            create_synthetic_history(user_config, options['history_depth'])
+        # The synthetic rows are converted to the layout of the validator
+        if validator.use_ring_layout():
+            validator.build_ring(user)
+        elif validator.use_packed_layout():
+            for user_config in configs:
+                pack_config_history(user_config.pk)
+
+    def measure(self, phase, function, *args):
+        stats = self.stats[phase]
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                stats.seconds += time.perf_counter() - start
+                stats.calls += 1
+                stats.queries += len(queries)
+
+    def run_round(self, validator, user, password):
+        # The steps of validate() and password_changed(), measured separately
+        self.measure('pruning', validator.prune_passwords, user)
+        configs = self.measure('config lookup', lambda: list(validator.get_user_configs(user)))
+        for user_config in configs:
+            password_hash = self.measure('hashing', user_config.make_password_hash, password)
+            self.measure('membership query', validator.password_in_history, user_config, password_hash)
+        user_config = self.measure('config lookup', validator.get_current_user_config, user)
+        password_hash = self.measure('hashing', user_config.make_password_hash, password)
+        self.measure('insert', validator.store_password, user, user_config, password_hash)
+
+        # The whole path, the password is already used
+        try:
+            self.measure('validate', validator.validate, password, user)
+        except ValidationError:
+            pass
+        self.measure('password_changed', validator.password_changed, password, user)
+
+    def handle(self, *args, **options):
+        for name in ('users', 'configs', 'rounds'):
+            if options[name] < 1:
+                raise CommandError('--%s must be greater than 0.' % name)
+        validator = self.get_validator(options)
+        self.stats = OrderedDict((phase, PhaseStats()) for phase in PHASES)
+
+        prefix = 'dpv_profile_%s_' % uuid.uuid4().hex[:8]
+        users = []
+        profiler = cProfile.Profile() if options['profile_output'] else None
+        try:
+            self.stdout.write('Creating %d temporary users...' % options['users'])
+            for i in range(options['users']):
+                user = create_synthetic_user('%s%d' % (prefix, i))
+                users.append(user)
+                try:
+                    self.create_history(validator, user, options)
+                except ValueError as e:
+                    # No valid work factor for so many configurations
+                    raise CommandError(str(e))
+
+            if profiler:
+                profiler.enable()
+            start = time.perf_counter()
+            for round_number in range(options['rounds']):
+                for user in users:
+                    self.run_round(validator, user, uuid.uuid4().hex)
+            elapsed = time.perf_counter() - start
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(options['profile_output'])
+        finally:
+            get_user_model().objects.filter(pk__in=[user.pk for user in users]).delete()
+
+        self.stdout.write(
+            'last_passwords=%d max_age=%d users=%d configs=%d history depth=%d rounds=%d, total %.1f ms'
+            % (validator.last_passwords, validator.max_age, options['users'], options['configs'],
+               options['history_depth'], options['rounds'], elapsed * 1000)
+        )
+        self.stdout.write('%-18s %8s %12s %10s %8s' % ('phase', 'calls', 'total ms', 'mean ms', 'queries'))
+        for phase, stats in self.stats.items():
+            stats = stats.as_dict()
+            self.stdout.write('%-18s %8d %12.2f %10.3f %8d' % (
+                phase, stats['calls'], stats['total_ms'], stats['mean_ms'], stats['queries']
+            ))
+        if profiler:
+            self.stdout.write('cProfile statistics written to %s' % options['profile_output'])
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from django_password_validators.password_history.password_validation import (
+    UniquePasswordsValidator,
+    get_default_unique_passwords_validator,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes password history entries older than max_age days. '
+        'By default max_age is taken from the UniquePasswordsValidator '
+        'configured in AUTH_PASSWORD_VALIDATORS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age',
+            type=int,
+            default=None,
+            help='The age of the passwords to delete, in days.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='The number of rows deleted in one statement '
+                 '(the number of packed histories read by one query).',
+        )
+
+    def handle(self, *args, **options):
+        if options['max_age'] is not None:
+            validator = UniquePasswordsValidator(max_age=options['max_age'])
+        else:
+            validator = get_default_unique_passwords_validator()
+        if validator is None or validator.max_age <= 0:
+            raise CommandError(
+                'max_age is not configured, use the --max-age option.'
+            )
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size must be greater than 0.')
+
+        deleted = validator.purge_expired_passwords(
+            batch_size=options['batch_size']
+        )
+        self.stdout.write('Deleted %d passwords.' % deleted)
@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand, CommandError
+from collections import Counter
+
+from django.db.models import Count
+
+from django_password_validators.password_history import packed
+from django_password_validators.password_history.models import UserPasswordHistoryConfig
+from django_password_validators.settings import (
+    get_history_hmac_key_id,
+    get_history_hmac_keys,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes the password history hashed with the given keys of the HMAC history hasher, '
+        'after that the keys can be removed from the settings. '
+        'Without the key ids, lists the keys in use.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'key_ids',
+            nargs='*',
+            help='The ids of the retired keys.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be deleted.',
+        )
+
+    def count_packed_passwords(self, configs):
+        """
+        Returns {key id: the number of passwords in the packed history}.
+        """
+        key_ids = set(configs.values_list('key_id', flat=True).distinct())
+        passwords = Counter()
+        for _, key_id, data in packed.iter_packed_histories(fields=('key_id',)):
+            if key_id in key_ids:
+                passwords[key_id] += len(packed.unpack(data))
+        return passwords
+
+    def list_keys(self):
+        keys = get_history_hmac_keys()
+        configs = UserPasswordHistoryConfig.objects.exclude(key_id='')
+        packed_passwords = self.count_packed_passwords(configs)
+        rows = configs. \
+            values('key_id'). \
+            annotate(
+                users=Count('user', distinct=True),
+                configs=Count('pk', distinct=True),
+                passwords=Count('passwordhistory')
+            ). \
+            order_by('key_id')
+        for row in rows:
+            self.stdout.write('%s: %d users, %d configurations, %d passwords%s' % (
+                row['key_id'], row['users'], row['configs'],
+                row['passwords'] + packed_passwords[row['key_id']],
+                '' if row['key_id'] in keys else ' (the key is not configured)'
+            ))
+
+    def handle(self, *args, **options):
+        key_ids = options['key_ids']
+        if not key_ids:
+            self.list_keys()
+            return
+        if get_history_hmac_keys() and get_history_hmac_key_id() in key_ids:
+            raise CommandError(
+                'The key %s is used for new passwords, change DPV_HISTORY_HMAC_KEY_ID first.'
+                % get_history_hmac_key_id()
+            )
+
+        configs = UserPasswordHistoryConfig.objects.filter(key_id__in=key_ids)
+        if options['dry_run']:
+            self.stdout.write('Would delete the password history of %d configurations.' % configs.count())
+            return
+        packed_passwords = sum(self.count_packed_passwords(configs).values())
+        # The passwords are deleted with their configurations (CASCADE)
+        deleted = configs.delete()[1]
+        self.stdout.write('Deleted %d configurations and %d passwords.' % (
+            deleted.get(UserPasswordHistoryConfig._meta.label, 0),
+            packed_passwords + sum(
+                count for label, count in deleted.items() if label != UserPasswordHistoryConfig._meta.label
+            )
+        ))
@@ -0,0 +1,152 @@
+from concurrent.futures import ProcessPoolExecutor
+import csv
+from functools import partial
+import io
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from django_password_validators.password_history.bulk import (
+    init_worker,
+    iter_chunks,
+    map_chunks,
+    prepare_rows,
+    read_csv_records,
+    read_jsonl_records,
+    validate_rows,
+)
+from django_password_validators.password_history.password_validation import (
+    get_default_unique_passwords_validator,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Validates the passwords of a CSV (with the header) or JSONL file with '
+        'AUTH_PASSWORD_VALIDATORS and reports the invalid rows. '
+        'The throughput depends mostly on the history hasher of UniquePasswordsValidator.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input',
+            help='The CSV or JSONL file, "-" reads from the standard input.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            default=None,
+            help='Default: by the extension of the input file.',
+        )
+        parser.add_argument(
+            '--username-field',
+            default='username',
+        )
+        parser.add_argument(
+            '--password-field',
+            default='password',
+        )
+        parser.add_argument(
+            '--report',
+            default='-',
+            help='The CSV report of the invalid rows (line, username, code, message), '
+                 '"-" writes to the standard output.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=0,
+            help='The number of worker processes, 0 validates in this process.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='The number of rows validated by a worker at once.',
+        )
+        parser.add_argument(
+            '--seed-history',
+            action='store_true',
+            help='Store the valid passwords of the existing users in the password history.',
+        )
+        parser.add_argument(
+            '--encoding',
+            default='utf-8',
+        )
+
+    def get_records(self, lines, options):
+        input_format = options['format']
+        if input_format is None:
+            input_format = 'jsonl' if options['input'].endswith(('.jsonl', '.json')) else 'csv'
+        if input_format == 'jsonl':
+            return read_jsonl_records(lines)
+        return read_csv_records(lines)
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be greater than 0.')
+        if options['workers'] < 0:
+            raise CommandError('--workers must not be negative.')
+        if options['seed_history'] and get_default_unique_passwords_validator() is None:
+            raise CommandError('--seed-history requires UniquePasswordsValidator in AUTH_PASSWORD_VALIDATORS.')
+
+        if options['input'] == '-':
+            lines = io.TextIOWrapper(sys.stdin.buffer, encoding=options['encoding'], newline='')
+        else:
+            try:
+                lines = open(options['input'], encoding=options['encoding'], newline='')
+            except OSError as e:
+                raise CommandError(str(e))
+        if options['report'] == '-':
+            report = self.stdout
+            close_report = False
+        else:
+            report = open(options['report'], 'w', newline='')
+            close_report = True
+        writer = csv.writer(report, lineterminator='\n')
+        writer.writerow(['line', 'username', 'code', 'message'])
+
+        chunks = (
+            prepare_rows(records, options['username_field'], options['password_field'])
+            for records in iter_chunks(self.get_records(lines, options), options['chunk_size'])
+        )
+        executor = None
+        if options['workers']:
+            # The database connections must not be shared with the workers,
+            # the ones opened before the workers are forked are dropped by init_worker
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=options['workers'], initializer=init_worker)
+
+        total = invalid = seeded = 0
+        start = time.perf_counter()
+        try:
+            with lines:
+                results = map_chunks(
+                    partial(validate_rows, seed_history=options['seed_history']),
+                    chunks,
+                    executor=executor,
+                    max_pending=options['workers'] * 2
+                )
+                for chunk_results, chunk_seeded in results:
+                    seeded += chunk_seeded
+                    for line_number, username, errors in chunk_results:
+                        total += 1
+                        if errors:
+                            invalid += 1
+                        for code, message in errors:
+                            writer.writerow([line_number, username, code, message])
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if close_report:
+                report.close()
+
+        elapsed = time.perf_counter() - start
+        self.stderr.write(
+            'Validated %d rows, %d invalid, %d passwords stored in the history, '
+            '%.1f s (%d rows per minute).' % (
+                total, invalid, seeded, elapsed, total * 60 / elapsed if elapsed else 0
+            )
+        )
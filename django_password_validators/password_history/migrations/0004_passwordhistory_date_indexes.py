@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('password_history', '0003_auto_20201206_1357'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='passwordhistory',
+            name='date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Date'),
+        ),
+        migrations.AddIndex(
+            model_name='passwordhistory',
+            index=models.Index(fields=['user_config', 'date'], name='password_hi_user_co_bf8288_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('password_history', '0004_passwordhistory_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='passwordhistory',
+            name='slot',
+            field=models.PositiveIntegerField(blank=True, default=None, editable=False, null=True, verbose_name='Slot'),
+        ),
+        migrations.AddField(
+            model_name='userpasswordhistoryconfig',
+            name='next_slot',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Counter of the password slots'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='passwordhistory',
+            unique_together={('user_config', 'password'), ('user_config', 'slot')},
+        ),
+    ]
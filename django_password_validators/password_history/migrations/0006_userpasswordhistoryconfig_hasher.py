@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('password_history', '0005_password_history_slots'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='userpasswordhistoryconfig',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='userpasswordhistoryconfig',
+            name='hasher',
+            field=models.CharField(blank=True, default=None, editable=False, max_length=255, null=True, verbose_name='Hasher'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='userpasswordhistoryconfig',
+            unique_together={('user', 'hasher', 'iterations')},
+        ),
+    ]
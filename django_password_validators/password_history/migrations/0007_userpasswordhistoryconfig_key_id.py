@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('password_history', '0006_userpasswordhistoryconfig_hasher'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='userpasswordhistoryconfig',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='userpasswordhistoryconfig',
+            name='key_id',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64, verbose_name='Key id'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='userpasswordhistoryconfig',
+            unique_together={('user', 'hasher', 'iterations', 'key_id')},
+        ),
+    ]
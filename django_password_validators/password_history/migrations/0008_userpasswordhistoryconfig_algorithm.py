@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:36
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Left, StrIndex
+from django.utils.module_loading import import_string
+
+
+def backfill_algorithm(apps, schema_editor):
+    UserPasswordHistoryConfig = apps.get_model('password_history', 'UserPasswordHistoryConfig')
+    PasswordHistory = apps.get_model('password_history', 'PasswordHistory')
+    configs = UserPasswordHistoryConfig.objects.using(schema_editor.connection.alias)
+
+    # The configurations with the recorded hasher
+    for hasher_path in configs.filter(hasher__isnull=False).values_list('hasher', flat=True).distinct():
+        try:
+            algorithm = import_string(hasher_path).algorithm
+        except ImportError:
+            continue
+        configs.filter(hasher=hasher_path).update(algorithm=algorithm)
+
+    # The others: the prefix of a stored hash ("algorithm$..."),
+    # the configurations without passwords keep using the default hasher.
+    configs.filter(hasher__isnull=True, algorithm__isnull=True).update(
+        algorithm=Subquery(
+            PasswordHistory.objects.
+            filter(user_config=OuterRef('pk')).
+            annotate(algorithm=Left('password', StrIndex('password', Value('$')) - 1)).
+            values('algorithm')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('password_history', '0007_userpasswordhistoryconfig_key_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userpasswordhistoryconfig',
+            name='algorithm',
+            field=models.CharField(blank=True, default=None, editable=False, max_length=64, null=True, verbose_name='Algorithm'),
+        ),
+        migrations.RunPython(backfill_algorithm, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('password_history', '0008_userpasswordhistoryconfig_algorithm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userpasswordhistoryconfig',
+            name='packed_history',
+            field=models.BinaryField(blank=True, default=None, null=True, verbose_name='Packed password hashes'),
+        ),
+    ]
@@ -2,12 +2,47 @@
 from django.conf import settings
 from django.db import models
 from django.utils.crypto import get_random_string
+from django.utils.module_loading import import_string
 try:
   from django.utils.translation import gettext_lazy as _
 except ImportError:
   from django.utils.translation import ugettext_lazy as _
 
-from django_password_validators.settings import get_password_hasher
+from django_password_validators.settings import (
+    get_history_hmac_key_id,
+    get_password_hasher_path,
+    get_user_password_hasher_path,
+)
+
+
+class UserPasswordHistoryConfigManager(models.Manager):
+
+    def delete_for_users(self, users, batch_size=1000):
+        """
+        Deletes the password history of the users with set-based statements,
+        call it before deleting many users.
+
+        The cascade of the deleted users loads the configurations and
+        the passwords and deletes them in batches for each configuration.
+        Here each batch of configurations costs three statements,
+        regardless of the number of passwords.
+
+        :param users: queryset of the users (or their primary keys)
+        :param batch_size: the number of configurations deleted in one statement
+        :return: the number of deleted configurations and passwords
+        """
+        configs = self.filter(user__in=users).order_by('pk')
+        deleted_configs = deleted_passwords = 0
+        while True:
+            config_ids = list(configs.values_list('pk', flat=True)[:batch_size])
+            if not config_ids:
+                return deleted_configs, deleted_passwords
+            # PasswordHistory has no dependent objects, the collector deletes
+            # the passwords of the batch with a single statement without loading them.
+            # Only the primary keys of the configurations are loaded (not the packed history).
+            deleted = self.filter(pk__in=config_ids).only('pk').delete()[1]
+            deleted_configs += deleted.get(self.model._meta.label, 0)
+            deleted_passwords += deleted.get(PasswordHistory._meta.label, 0)
 
 
 class UserPasswordHistoryConfig(models.Model):
@@ -33,11 +68,58 @@ class UserPasswordHistoryConfig(models.Model):
         blank=True,
         null=True
     )
+    next_slot = models.PositiveIntegerField(
+        _('Counter of the password slots'),
+        default=0,
+        editable=False
+    )
+    # Empty for the configurations created before the hasher was recorded,
+    # they use the default hasher (DPV_DEFAULT_HISTORY_HASHER).
+    hasher = models.CharField(
+        _('Hasher'),
+        max_length=255,
+        default=None,
+        editable=False,
+        blank=True,
+        null=True
+    )
+    # The algorithm of the hasher, the configurations without the recorded
+    # hasher use the hasher of their algorithm.
+    algorithm = models.CharField(
+        _('Algorithm'),
+        max_length=64,
+        default=None,
+        editable=False,
+        blank=True,
+        null=True
+    )
+    # The id of the secret key of the keyed hashers (HistoryHMACHasher),
+    # empty for the other hashers. It is not nullable, NULLs would not
+    # be equal in unique_together.
+    key_id = models.CharField(
+        _('Key id'),
+        max_length=64,
+        default='',
+        editable=False,
+        blank=True
+    )
+
+    # The passwords of the packed layout (DPV_HISTORY_LAYOUT = "packed"),
+    # see password_history.packed
+    packed_history = models.BinaryField(
+        _('Packed password hashes'),
+        default=None,
+        editable=False,
+        blank=True,
+        null=True
+    )
+
+    objects = UserPasswordHistoryConfigManager()
 
     class Meta:
         verbose_name = _('Configuration')
         verbose_name_plural = _('Configurations')
-        unique_together = (("user", "iterations",),)
+        unique_together = (("user", "hasher", "iterations", "key_id",),)
         ordering = ['-user', 'iterations', ]
 
     def make_password_hash(self, password):
@@ -47,27 +129,83 @@ class UserPasswordHistoryConfig(models.Model):
         Args:
             passaword - the password is not encrypted form
         """
-        hasher = get_password_hasher()()
-        return hasher.encode(password, self.salt, self.iterations)
+        if self.key_id:
+            # Keyed hashers are fast, there is no point in the hashing server.
+            return self.get_hasher()().encode(password, self.salt, key_id=self.key_id)
+
+        return make_password_hashes([self], password)[0]
+
+    def get_hash_job(self, password):
+        return (self.get_hasher_path(), password, self.salt, self.iterations)
+
+    def get_hasher_path(self):
+        if self.hasher:
+            return self.hasher
+        hasher_path = get_password_hasher_path()
+        if self.algorithm and self.algorithm != import_string(hasher_path).algorithm:
+            # The default hasher was changed to another algorithm
+            from django_password_validators.password_history.hashers import HISTORY_HASHERS
+
+            return HISTORY_HASHERS.get(self.algorithm, hasher_path)
+        return hasher_path
+
+    def get_hasher(self):
+        return import_string(self.get_hasher_path())
 
     def _gen_password_history_salt(self):
         salt_max_length = self._meta.get_field('salt').max_length
         self.salt = get_random_string(length=salt_max_length)
 
-    def save(self, *args, **kwargs):
+    def set_defaults(self):
         # When there is no salt as defined for a given user,
         # then we create the salt.
         if not self.salt:
             self._gen_password_history_salt()
-        # We take iterations from the default Hasher
+        # We take the hasher chosen for the user (by default the default hasher)
+        if not self.hasher:
+            self.hasher = get_user_password_hasher_path(self.user)
+        # We take iterations from the Hasher
         if not self.iterations:
-            self.iterations = get_password_hasher().iterations
+            self.iterations = self.get_hasher().iterations
+        if not self.algorithm:
+            self.algorithm = self.get_hasher().algorithm
+        # New configurations of the keyed hashers use the current key
+        if not self.key_id and getattr(self.get_hasher(), 'keyed', False):
+            self.key_id = get_history_hmac_key_id()
+
+    def save(self, *args, **kwargs):
+        self.set_defaults()
         return super(UserPasswordHistoryConfig, self).save(*args, **kwargs)
 
     def __str__(self):
         return '%s [%d]' % (self.user, self.iterations)
 
 
+def make_password_hashes(user_configs, password):
+    """
+    Hashes the password with each of the configurations.
+
+    The jobs of the configurations without the key are sent to the hashing server
+    in a single request (the server is optional, without it we hash in the process).
+    """
+    from django_password_validators.password_history.hash_server import (
+        make_password_hashes as hash_jobs,
+    )
+
+    # Keyed hashers are fast, there is no point in the hashing server.
+    password_hashes = [
+        user_config.get_hasher()().encode(password, user_config.salt, key_id=user_config.key_id)
+        if user_config.key_id else None
+        for user_config in user_configs
+    ]
+    unkeyed = [index for index, password_hash in enumerate(password_hashes) if password_hash is None]
+    if unkeyed:
+        hashes = hash_jobs([user_configs[index].get_hash_job(password) for index in unkeyed])
+        for index, password_hash in zip(unkeyed, hashes):
+            password_hashes[index] = password_hash
+    return password_hashes
+
+
 class PasswordHistory(models.Model):
     user_config = models.ForeignKey(
         UserPasswordHistoryConfig,
@@ -82,14 +220,26 @@ class PasswordHistory(models.Model):
     date = models.DateTimeField(
         _('Date'),
         auto_now_add=True,
-        editable=False
+        editable=False,
+        db_index=True
+    )
+    slot = models.PositiveIntegerField(
+        _('Slot'),
+        default=None,
+        editable=False,
+        blank=True,
+        null=True
     )
 
     class Meta:
         verbose_name = 'Old password'
         verbose_name_plural = 'Password history'
-        unique_together = (("user_config", "password",),)
+        unique_together = (("user_config", "password",), ("user_config", "slot",),)
         ordering = ['-user_config', 'password', ]
+        indexes = [
+            # Date range lookups for a single configuration (max_age)
+            models.Index(fields=['user_config', 'date']),
+        ]
 
     def __str__(self):
         return '%s [%s]' % (self.user_config.user, self.date)
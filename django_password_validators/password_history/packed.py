@@ -0,0 +1,207 @@
+"""
+The packed layout of the password history (DPV_HISTORY_LAYOUT = "packed").
+
+The passwords of a configuration are stored in its packed_history column
+instead of the PasswordHistory rows, a header followed by the fixed width
+entries in the order they were added::
+
+    header: format version (1 byte), digest size (2 bytes)
+    entry:  date in microseconds since the epoch (8 bytes), digest (digest size bytes)
+
+The hashes of a configuration share the prefix (algorithm, iterations or key id,
+salt), only the digests (the base64 part of the hash) are stored.
+The validation reads the configurations of the user and compares the digest
+with all entries, without stopping at the first match.
+"""
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone as dt_timezone
+import hmac
+import struct
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from django_password_validators.password_history.models import (
+    PasswordHistory,
+    UserPasswordHistoryConfig,
+)
+
+VERSION = 1
+HEADER = struct.Struct('>BH')
+DATE = struct.Struct('>q')
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def get_digest(password_hash):
+    """
+    Returns the digest of the hash "algorithm$...$salt$base64 digest".
+    """
+    try:
+        return base64.b64decode(password_hash.rsplit('$', 1)[1], validate=True)
+    except (IndexError, binascii.Error):
+        raise ValueError('The password hash has no base64 digest.')
+
+
+def to_microseconds(date):
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return (date - EPOCH) // timedelta(microseconds=1)
+
+
+def from_microseconds(microseconds):
+    date = EPOCH + timedelta(microseconds=microseconds)
+    return date if settings.USE_TZ else timezone.make_naive(date)
+
+
+def get_digest_size(data):
+    version, digest_size = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError('Unknown version %d of the packed password history.' % version)
+    return digest_size
+
+
+def unpack(data):
+    """
+    Returns the list of (date in microseconds, digest), the oldest first.
+    """
+    if not data:
+        return []
+    data = bytes(data)
+    entry_size = DATE.size + get_digest_size(data)
+    return [
+        (DATE.unpack_from(data, offset)[0], data[offset + DATE.size:offset + entry_size])
+        for offset in range(HEADER.size, len(data), entry_size)
+    ]
+
+
+def pack(entries):
+    """
+    Packs the list of (date in microseconds, digest), None if it is empty.
+    """
+    if not entries:
+        return None
+    digest_size = len(entries[0][1])
+    if any(len(digest) != digest_size for _, digest in entries):
+        raise ValueError('The digests of a configuration must have the same size.')
+    return HEADER.pack(VERSION, digest_size) + b''.join(
+        DATE.pack(date) + digest for date, digest in entries
+    )
+
+
+def append(data, date, digest):
+    """
+    Returns the data with the new entry at the end.
+    """
+    if not data:
+        return pack([(date, digest)])
+    data = bytes(data)
+    if get_digest_size(data) != len(digest):
+        raise ValueError('The digests of a configuration must have the same size.')
+    return data + DATE.pack(date) + digest
+
+
+def get_last_date(data):
+    """
+    Returns the date (in microseconds) of the newest entry, None if there are no entries.
+    """
+    if not data:
+        return None
+    data = bytes(data)
+    entry_size = DATE.size + get_digest_size(data)
+    if len(data) < HEADER.size + entry_size:
+        return None
+    return DATE.unpack_from(data, len(data) - entry_size)[0]
+
+
+def contains(data, digest, cutoff=None):
+    """
+    Returns True if the digest is in the entries not older than cutoff (in microseconds).
+
+    All entries are compared, the time does not depend on the position of the match.
+    """
+    return contains_entries(unpack(data), digest, cutoff)
+
+
+def contains_entries(entries, digest, cutoff=None):
+    """
+    contains() of the already unpacked entries.
+    """
+    found = False
+    for date, entry_digest in entries:
+        found |= hmac.compare_digest(entry_digest, digest) & (cutoff is None or date >= cutoff)
+    return found
+
+
+def iter_packed_histories(fields=(), batch_size=1000):
+    """
+    Yields (primary key, *fields, packed history) of all configurations with
+    the packed history, batch_size configurations are read by one query.
+    """
+    configs = UserPasswordHistoryConfig.objects.filter(packed_history__isnull=False).order_by('pk')
+    last_pk = None
+    while True:
+        batch = configs if last_pk is None else configs.filter(pk__gt=last_pk)
+        rows = list(batch.values_list('pk', *fields, 'packed_history')[:batch_size])
+        for row in rows:
+            yield row
+        if len(rows) < batch_size:
+            return
+        last_pk = rows[-1][0]
+
+
+def delete_expired(cutoff, batch_size=1000):
+    """
+    Deletes the passwords older than cutoff (datetime) from the packed history
+    of all configurations, each configuration is rewritten in its own transaction.
+
+    :return: the number of deleted passwords
+    """
+    cutoff = to_microseconds(cutoff)
+    deleted = 0
+    for pk, data in iter_packed_histories(batch_size=batch_size):
+        if all(date >= cutoff for date, _ in unpack(data)):
+            continue
+        with transaction.atomic():
+            data = UserPasswordHistoryConfig.objects. \
+                select_for_update(). \
+                filter(pk=pk). \
+                values_list('packed_history', flat=True). \
+                first()
+            entries = unpack(data)
+            kept = [entry for entry in entries if entry[0] >= cutoff]
+            if len(kept) != len(entries):
+                UserPasswordHistoryConfig.objects. \
+                    filter(pk=pk). \
+                    update(packed_history=pack(kept))
+                deleted += len(entries) - len(kept)
+    return deleted
+
+
+def pack_config_history(config_id):
+    """
+    Moves the PasswordHistory rows of the configuration to its packed_history.
+
+    :return: the number of moved passwords
+    """
+    with transaction.atomic():
+        user_config = UserPasswordHistoryConfig.objects.select_for_update().get(pk=config_id)
+        history = PasswordHistory.objects.filter(user_config=user_config)
+        rows = list(history.order_by('date', 'pk').values_list('date', 'password'))
+        if not rows:
+            return 0
+        entries = unpack(user_config.packed_history)
+        digests = {digest for _, digest in entries}
+        for date, password_hash in rows:
+            digest = get_digest(password_hash)
+            if digest not in digests:
+                digests.add(digest)
+                entries.append((to_microseconds(date), digest))
+        entries.sort(key=lambda entry: entry[0])
+        UserPasswordHistoryConfig.objects. \
+            filter(pk=user_config.pk). \
+            update(packed_history=pack(entries))
+        history.delete()
+    return len(rows)
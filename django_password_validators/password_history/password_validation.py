@@ -1,17 +1,20 @@
 from __future__ import unicode_literals
+from datetime import timedelta
 import warnings
 
 from django.core.exceptions import ValidationError
 
-try:
-    from django.utils.translation import gettext as _, ngettext
-except ImportError:
-    from django.utils.translation import ugettext as _, ngettext
-from django_password_validators.settings import get_password_hasher
-from django_password_validators.password_history.models import (
-    PasswordHistory,
-    UserPasswordHistoryConfig,
+from django_password_validators.settings import (
+    HISTORY_LAYOUT_PACKED,
+    HISTORY_LAYOUT_RING,
+    get_hash_server_socket,
+    get_history_layout,
+    get_history_storage_path,
 )
+from django_password_validators.translation import gettext as _, ngettext
+
+# Validators are imported by Django at startup,
+# the models are imported only when the validator is used.
 
 
 class UniquePasswordsValidator(object):
@@ -21,14 +24,57 @@ class UniquePasswordsValidator(object):
     The password is only checked for an existing user.
     """
 
-    def __init__(self, last_passwords=0):
+    # Estimated cost of the validation in milliseconds (see PipelineValidator),
+    # one password hash for each configuration of the user.
+    cost = 1000
+
+    # PipelineValidator runs it in the calling thread (see max_workers)
+    uses_database = True
+
+    def __init__(self, last_passwords=0, max_age=0, max_configs=0,
+                 rate_limit=0, rate_limit_period=60, rate_limit_cache='default',
+                 client_rate_limit=0, client_rate_limit_period=60):
         """
 
         :param last_passwords:
             * lookup_range > 0 - We check only the XXX latest passwords
             * lookup_range <= 0 - Check all passwords that have been used so far
+        :param max_age:
+            * max_age > 0 - We check only passwords used in the last XXX days
+            * max_age <= 0 - The age of the password does not matter
+        :param max_configs:
+            * max_configs > 0 - We check only the XXX most recently used configurations
+              (hashers) of the user, each of them costs one password hash
+            * max_configs <= 0 - Check all configurations
+        :param rate_limit:
+            * rate_limit > 0 - At most XXX checks of the user per rate_limit_period seconds
+            * rate_limit <= 0 - No limit
+        :param rate_limit_period: the period of rate_limit in seconds
+        :param rate_limit_cache: the cache alias of the rate limiter
+        :param client_rate_limit:
+            * client_rate_limit > 0 - At most XXX checks of the client (see rate_limit.rate_limit_client)
+              per client_rate_limit_period seconds
+            * client_rate_limit <= 0 - No limit
+        :param client_rate_limit_period: the period of client_rate_limit in seconds
         """
         self.last_passwords = int(last_passwords)
+        self.max_age = int(max_age)
+        self.max_configs = int(max_configs)
+        self.rate_limit = int(rate_limit)
+        self.rate_limit_period = rate_limit_period
+        self.rate_limit_cache = rate_limit_cache
+        self.client_rate_limit = int(client_rate_limit)
+        self.client_rate_limit_period = client_rate_limit_period
+
+    def get_history_cutoff(self):
+        """
+        Returns the date before which passwords are out of range,
+        or None if the age of the password does not matter.
+        """
+        if self.max_age > 0:
+            from django.utils import timezone
+
+            return timezone.now() - timedelta(days=self.max_age)
 
     def _user_ok(self, user):
         if not user:
@@ -51,73 +97,232 @@ class UniquePasswordsValidator(object):
 
         return True
 
+    def use_ring_layout(self):
+        """
+        The ring layout is used only for the limited number of passwords.
+        """
+        return self.last_passwords > 0 and get_history_layout() == HISTORY_LAYOUT_RING
+
+    def use_packed_layout(self):
+        return get_history_layout() == HISTORY_LAYOUT_PACKED
+
+    def get_rate_limiter(self):
+        """
+        Returns the rate limiter of the checks, or None without the limit.
+        """
+        if self.rate_limit <= 0 and self.client_rate_limit <= 0:
+            return None
+        from django.core.cache import caches
+        from django_password_validators.password_history.rate_limit import RateLimiter
+
+        return RateLimiter(
+            caches[self.rate_limit_cache],
+            self.rate_limit,
+            self.rate_limit_period,
+            client_capacity=self.client_rate_limit,
+            client_period=self.client_rate_limit_period
+        )
+
+    def get_storage(self):
+        """
+        Returns the storage backend of the history (DPV_HISTORY_STORAGE).
+        """
+        from django.utils.module_loading import import_string
+
+        return import_string(get_history_storage_path())(self)
+
     def delete_old_passwords(self, user):
-        if self.last_passwords > 0:
-            # Delete old passwords that are outside the lookup_range
+        self.get_storage().delete_old_passwords(user)
+
+    def purge_expired_passwords(self, batch_size=1000):
+        """
+        Deletes the passwords of all users that are older than max_age.
+
+        Rows are deleted in batches, so that a large table is not locked
+        by a single statement. The packed histories (also those left from
+        the previous layout) are rewritten one configuration at a time.
+
+        :param batch_size: the number of rows deleted in one statement
+            (the number of packed histories read by one query)
+        :return: the number of deleted passwords
+        """
+        from django_password_validators.password_history.models import PasswordHistory
+        from django_password_validators.password_history.packed import delete_expired
+
+        cutoff = self.get_history_cutoff()
+        if cutoff is None:
+            return 0
+        deleted = delete_expired(cutoff, batch_size=batch_size)
+        while True:
             password_ids = list(
                 PasswordHistory.objects. \
-                    filter(user_config__user=user). \
-                    order_by('-date')[self.last_passwords:]. \
+                    filter(date__lt=cutoff). \
+                    order_by('date')[:batch_size]. \
                     values_list('pk', flat=True)
             )
-            if password_ids:
-                PasswordHistory.objects.filter(pk__in=password_ids).delete()
+            if not password_ids:
+                return deleted
+            deleted += PasswordHistory.objects.filter(pk__in=password_ids).delete()[0]
+
+    def prune_passwords(self, user):
+        """
+        We make sure there are no old passwords in the database.
+        """
+        self.get_storage().prune_passwords(user)
+
+    def get_user_configs(self, user):
+        """
+        Returns the configurations of the user, for each of them the password is hashed.
+
+        The configurations are ordered by the most recently stored password,
+        so that the scan stops early for recently used passwords.
+        """
+        return self.get_storage().get_user_configs(user)
+
+    def get_current_user_config(self, user):
+        """
+        Returns the configuration of the current hasher of the user,
+        new passwords are stored with it.
+        """
+        return self.get_storage().get_current_user_config(user)
+
+    def password_in_history(self, user_config, password_hash):
+        return self.get_storage().password_in_history(user_config, password_hash)
+
+    def store_password(self, user, user_config, password_hash):
+        """
+        Stores the password hash, without deleting passwords out of range
+        (except for the ring layout, which takes care of it itself).
+        """
+        self.get_storage().store_password(user, user_config, password_hash)
+
+    def make_password_hash(self, user_config, password):
+        """
+        Returns the hash of the password, hashed in advance by the prehash view if possible.
+        """
+        from django_password_validators.password_history.prehash import get_prehashed_password
+
+        password_hash = get_prehashed_password(user_config, password)
+        if password_hash is None:
+            password_hash = user_config.make_password_hash(password)
+        return password_hash
+
+    def iter_password_hashes(self, user_configs, password):
+        """
+        Yields (configuration, hash of the password).
+
+        Without the hashing server, the password is hashed for one configuration
+        at a time, so that the scan can stop at the first match. With the server,
+        the hashes not computed in advance are requested in a single batch.
+        """
+        from django_password_validators.password_history.models import make_password_hashes
+        from django_password_validators.password_history.prehash import get_prehashed_password
+
+        if not get_hash_server_socket():
+            for user_config in user_configs:
+                yield user_config, self.make_password_hash(user_config, password)
+            return
+        user_configs = list(user_configs)
+        password_hashes = [get_prehashed_password(user_config, password) for user_config in user_configs]
+        missing = [index for index, password_hash in enumerate(password_hashes) if password_hash is None]
+        if missing:
+            hashes = make_password_hashes([user_configs[index] for index in missing], password)
+            for index, password_hash in zip(missing, hashes):
+                password_hashes[index] = password_hash
+        for user_config, password_hash in zip(user_configs, password_hashes):
+            yield user_config, password_hash
 
     def validate(self, password, user=None):
 
         if not self._user_ok(user):
             return
 
-        # We make sure there are no old passwords in the database.
-        self.delete_old_passwords(user)
+        # The limit is checked before the password is hashed
+        rate_limiter = self.get_rate_limiter()
+        if rate_limiter is not None and not rate_limiter.allow(user):
+            raise ValidationError(
+                _("Too many attempts to change the password, try again later."),
+                code='password_history_rate_limited'
+            )
 
-        for user_config in UserPasswordHistoryConfig.objects.filter(user=user):
-            password_hash = user_config.make_password_hash(password)
-            try:
-                PasswordHistory.objects.get(
-                    user_config=user_config,
-                    password=password_hash
-                )
+        storage = self.get_storage()
+        storage.prune_passwords(user)
+
+        for user_config, password_hash in self.iter_password_hashes(storage.get_user_configs(user), password):
+            if storage.password_in_history(user_config, password_hash):
                 raise ValidationError(
                     _("You can not use a password that was already used in this application in the past."),
                     code='password_used'
                 )
-            except PasswordHistory.DoesNotExist:
-                pass
 
     def password_changed(self, password, user=None):
 
         if not self._user_ok(user):
             return
 
-        user_config = UserPasswordHistoryConfig.objects.filter(
-            user=user,
-            iterations=get_password_hasher().iterations
-        ).first()
+        storage = self.get_storage()
+        user_config = storage.get_current_user_config(user)
+        password_hash = self.make_password_hash(user_config, password)
+        storage.store_password(user, user_config, password_hash)
 
-        if not user_config:
-            user_config = UserPasswordHistoryConfig()
-            user_config.user = user
-            user_config.save()
+        if not self.use_ring_layout():
+            # We make sure there are no old passwords in the database.
+            storage.delete_old_passwords(user)
 
-        password_hash = user_config.make_password_hash(password)
+    def build_ring(self, user):
+        """
+        Converts the password history of the user to the ring layout.
 
-        # We are looking hash password in the database
-        old_password, old_password__created = PasswordHistory.objects.get_or_create(
-            user_config=user_config,
-            password=password_hash
+        Passwords out of range are deleted, the remaining ones get
+        the slots from the oldest one.
+        """
+        from django.db import transaction
+        from django_password_validators.password_history.models import (
+            PasswordHistory,
+            UserPasswordHistoryConfig,
         )
 
-        # We make sure there are no old passwords in the database.
         self.delete_old_passwords(user)
+        for user_config in UserPasswordHistoryConfig.objects.filter(user=user):
+            with transaction.atomic():
+                history = PasswordHistory.objects.filter(user_config=user_config)
+                password_ids = list(history.order_by('date', 'pk').values_list('pk', flat=True))
+                history.update(slot=None)
+                for slot, password_id in enumerate(password_ids):
+                    PasswordHistory.objects.filter(pk=password_id).update(slot=slot)
+                UserPasswordHistoryConfig.objects. \
+                    filter(pk=user_config.pk). \
+                    update(next_slot=len(password_ids))
 
     def get_help_text(self):
         if self.last_passwords > 0:
-            return ngettext(
+            help_text = ngettext(
                 'Your new password can not be identical to any of the %(old_pass)d previously entered passwords.',
                 'Your new password can not be identical to any of the %(old_pass)d previously entered passwords.',
                 self.last_passwords
             ) % {'old_pass': self.last_passwords}
 
         else:
-            return _('Your new password can not be identical to any of the previously entered.')
+            help_text = _('Your new password can not be identical to any of the previously entered.')
+
+        if self.max_age > 0:
+            help_text += ' ' + ngettext(
+                'Passwords used more than %(max_age)d day ago are not taken into account.',
+                'Passwords used more than %(max_age)d days ago are not taken into account.',
+                self.max_age
+            ) % {'max_age': self.max_age}
+        return help_text
+
+
+def get_default_unique_passwords_validator():
+    """
+    Returns the UniquePasswordsValidator configured in
+    AUTH_PASSWORD_VALIDATORS, or None if it is not configured.
+    """
+    from django.contrib.auth.password_validation import get_default_password_validators
+
+    for validator in get_default_password_validators():
+        # Validators wrapped by the PipelineValidator are also taken into account
+        for wrapped_validator in getattr(validator, 'validators', [validator]):
+            if isinstance(wrapped_validator, UniquePasswordsValidator):
+                return wrapped_validator
@@ -0,0 +1,15 @@
+"""
+Examples of DPV_HISTORY_HASHER_POLICY, the callable gets the user
+and returns the path of the history hasher or None for the default hasher.
+"""
+
+STRONG_HASHER = 'django_password_validators.password_history.hashers.HistoryVeryStrongHasher'
+
+
+def staff_strong_hasher_policy(user):
+    """
+    Staff members and superusers use the very strong hasher.
+    """
+    if getattr(user, 'is_staff', False) or getattr(user, 'is_superuser', False):
+        return STRONG_HASHER
+    return None
@@ -0,0 +1,115 @@
+"""
+Hashing of the new password before the password change form is submitted.
+
+The front end posts the new password to the prehash view (password_history.urls)
+when the field loses focus. The view hashes it with the configurations of the user
+and keeps the hashes in Django's cache for a few seconds, under the keys made
+from the session and a keyed digest of the password. When the form is submitted,
+UniquePasswordsValidator takes the finished hashes instead of computing them.
+
+The validators do not get the request, PreHashMiddleware makes the session
+of the request available to them.
+"""
+import contextvars
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.core.cache import caches
+
+from django_password_validators.password_history.models import make_password_hashes
+from django_password_validators.settings import (
+    get_prehash_cache_alias,
+    get_prehash_timeout,
+)
+
+_session = contextvars.ContextVar('dpv_prehash_session', default=None)
+
+KEY_PREFIX = 'dpv:prehash:'
+
+# Longer passwords are not hashed in advance
+MAX_PASSWORD_LENGTH = 4096
+
+
+class PreHashMiddleware(object):
+    """
+    Makes the session of the request available to UniquePasswordsValidator,
+    put it after SessionMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _session.set(getattr(request, 'session', None))
+        try:
+            return self.get_response(request)
+        finally:
+            _session.reset(token)
+
+
+def get_cache_key(session_key, user_config, password):
+    """
+    The key is the digest of the session, the configuration and the password
+    keyed with SECRET_KEY, so that the password can not be recovered from it.
+    """
+    key = hashlib.sha256(b'django_password_validators.prehash' + settings.SECRET_KEY.encode('utf-8')).digest()
+    message = '\0'.join([
+        session_key,
+        user_config.get_hasher_path(),
+        str(user_config.iterations),
+        user_config.salt,
+        user_config.key_id or '',
+        password,
+    ])
+    return KEY_PREFIX + hmac.new(key, message.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def get_user_configs(storage, user):
+    """
+    Returns the configurations checked and used by the password change of the user.
+
+    Only the existing configurations are returned, the configuration of the current
+    hasher is created by the password change itself.
+    """
+    user_configs = list(storage.get_user_configs(user))
+    current_user_config = storage.find_current_user_config(user)
+    if current_user_config is not None and not any(
+            (user_config.get_hasher_path(), user_config.iterations, user_config.salt, user_config.key_id) ==
+            (current_user_config.get_hasher_path(), current_user_config.iterations,
+             current_user_config.salt, current_user_config.key_id)
+            for user_config in user_configs):
+        user_configs.append(current_user_config)
+    return user_configs
+
+
+def prehash_password(validator, user, password, session_key):
+    """
+    Hashes the password with the configurations of the user and caches the hashes.
+
+    :return: the number of cached hashes
+    """
+    cache = caches[get_prehash_cache_alias()]
+    user_configs = get_user_configs(validator.get_storage(), user)
+    if not user_configs:
+        return 0
+    password_hashes = make_password_hashes(user_configs, password)
+    cache.set_many(
+        {
+            get_cache_key(session_key, user_config, password): password_hash
+            for user_config, password_hash in zip(user_configs, password_hashes)
+        },
+        get_prehash_timeout()
+    )
+    return len(user_configs)
+
+
+def get_prehashed_password(user_config, password):
+    """
+    Returns the cached hash of the password, None if it was not hashed in advance
+    in the session of the current request.
+    """
+    session = _session.get()
+    if session is None or not session.session_key:
+        return None
+    return caches[get_prehash_cache_alias()].get(get_cache_key(session.session_key, user_config, password))
@@ -0,0 +1,29 @@
+"""
+Fixtures for projects tested with pytest-django.
+
+Enable them in conftest.py::
+
+    pytest_plugins = ['django_password_validators.password_history.pytest_plugin']
+"""
+import pytest
+
+
+@pytest.fixture
+def fast_password_history(settings):
+    """
+    The password history is hashed with HistoryTestHasher.
+    """
+    from django_password_validators.password_history.testing import FAST_PASSWORD_HISTORY_SETTINGS
+
+    for name, value in FAST_PASSWORD_HISTORY_SETTINGS.items():
+        setattr(settings, name, value)
+
+
+@pytest.fixture
+def password_history_factory(fast_password_history, db):
+    """
+    Returns create_password_history(user, passwords, dates=None).
+    """
+    from django_password_validators.password_history.testing import create_password_history
+
+    return create_password_history
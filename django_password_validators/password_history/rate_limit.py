@@ -0,0 +1,115 @@
+"""
+Token bucket rate limiting of the password history checks.
+
+Each check hashes the password with the slow history hasher, the limiter
+stops the clients that send many attempts before the hashing is done.
+The buckets are stored in Django's cache, the key of the user and optionally
+the key of the client (set by the caller, e.g. the IP address).
+"""
+from contextlib import contextmanager
+import contextvars
+import hashlib
+import time
+
+_client_key = contextvars.ContextVar('dpv_rate_limit_client_key', default=None)
+
+
+def get_client_key():
+    return _client_key.get()
+
+
+@contextmanager
+def rate_limit_client(client_key):
+    """
+    The checks in the block are also counted in the bucket of the client::
+
+        with rate_limit_client(request.META['REMOTE_ADDR']):
+            form.is_valid()
+    """
+    token = _client_key.set(client_key)
+    try:
+        yield
+    finally:
+        _client_key.reset(token)
+
+
+class RateLimitClientMiddleware(object):
+    """
+    Uses the IP address of the request (REMOTE_ADDR) as the client key.
+
+    REMOTE_ADDR must be the address of the client, behind a reverse proxy
+    set it from the forwarded header first, otherwise all users share one bucket.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with rate_limit_client(request.META.get('REMOTE_ADDR')):
+            return self.get_response(request)
+
+
+def take_token(cache, key, capacity, period, now=None):
+    """
+    Takes a token from the bucket, returns False if the bucket is empty.
+
+    The bucket holds up to capacity tokens and it is refilled
+    with capacity tokens per period (seconds).
+
+    The cache has no atomic read-modify-write, concurrent requests
+    of the same key can take a few tokens more than the capacity.
+    """
+    now = time.time() if now is None else now
+    state = cache.get(key)
+    if state is None:
+        tokens = capacity
+    else:
+        tokens, updated = state
+        tokens = min(capacity, tokens + (now - updated) * capacity / period)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    # A full bucket is the same as no bucket
+    cache.set(key, (tokens, now), int(period) + 1)
+    return allowed
+
+
+class RateLimiter(object):
+    """
+    The bucket of the user holds capacity tokens per period, the bucket
+    of the client client_capacity tokens per client_period, 0 - no bucket.
+    """
+
+    key_prefix = 'dpv:rate:'
+
+    def __init__(self, cache, capacity, period, client_capacity=0, client_period=60):
+        self.cache = cache
+        self.capacity = capacity
+        self.period = period
+        self.client_capacity = client_capacity
+        self.client_period = client_period
+
+    def get_buckets(self, user):
+        """
+        Returns the list of (key, capacity, period) of the buckets of the check.
+        """
+        buckets = []
+        if self.capacity > 0:
+            buckets.append(('%suser:%s' % (self.key_prefix, user.pk), self.capacity, self.period))
+        client_key = get_client_key()
+        if client_key and self.client_capacity > 0:
+            buckets.append((
+                '%sclient:%s' % (self.key_prefix, hashlib.sha256(str(client_key).encode('utf-8')).hexdigest()),
+                self.client_capacity,
+                self.client_period
+            ))
+        return buckets
+
+    def allow(self, user):
+        """
+        Takes a token from the buckets of the user and the client.
+        """
+        for key, capacity, period in self.get_buckets(user):
+            if not take_token(self.cache, key, capacity, period):
+                return False
+        return True
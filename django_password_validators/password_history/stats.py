@@ -0,0 +1,283 @@
+"""
+Capacity planning statistics of the password history (``manage.py dpv_history_stats``).
+
+Everything is computed with aggregate queries, no history rows are loaded.
+Only the packed histories (DPV_HISTORY_LAYOUT = "packed") are read in batches,
+the database can not look into them.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Avg, Count, Q
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from django_password_validators.password_history import packed
+from django_password_validators.password_history.models import (
+    PasswordHistory,
+    UserPasswordHistoryConfig,
+)
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Upper bounds of the age buckets, in days
+AGE_BUCKETS = (30, 90, 365, 730)
+
+# Rough per-row and per-index-entry overheads of the databases
+# (e.g. the PostgreSQL tuple header and item pointer).
+ROW_OVERHEAD = 28
+INDEX_ENTRY_OVERHEAD = 16
+
+# Sizes of the fixed size columns in bytes
+FIELD_SIZES = {
+    'AutoField': 4,
+    'BigAutoField': 8,
+    'SmallAutoField': 2,
+    'IntegerField': 4,
+    'PositiveIntegerField': 4,
+    'BigIntegerField': 8,
+    'SmallIntegerField': 2,
+    'PositiveSmallIntegerField': 2,
+    'DateTimeField': 8,
+    'DateField': 4,
+    'BooleanField': 1,
+}
+
+
+def get_histogram(queryset, field):
+    """
+    Returns {value: count} of the annotated value of the grouped queryset,
+    the grouping is done by the database.
+    """
+    sql, params = queryset.order_by().values(field).query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT grouped.%(field)s, COUNT(*) FROM (%(sql)s) grouped GROUP BY grouped.%(field)s' % {
+                'field': connection.ops.quote_name(field),
+                'sql': sql,
+            },
+            params
+        )
+        return dict(cursor.fetchall())
+
+
+def get_percentiles(histogram, percentiles=PERCENTILES):
+    """
+    Returns the percentiles (nearest rank) of the values of the histogram {value: count}.
+    """
+    total = sum(histogram.values())
+    result = {'count': total}
+    if not total:
+        return result
+    values = sorted(histogram.items())
+    for percentile in percentiles:
+        rank = max(1, -(-percentile * total // 100))
+        seen = 0
+        for value, count in values:
+            seen += count
+            if seen >= rank:
+                result['p%d' % percentile] = value
+                break
+    result['max'] = values[-1][0]
+    result['mean'] = sum(value * count for value, count in values) / total
+    return result
+
+
+def get_field_size(model, field, average_lengths):
+    internal_type = field.get_internal_type()
+    if field.is_relation:
+        return get_field_size(field.related_model, field.target_field, average_lengths)
+    if field.attname in average_lengths:
+        # The length byte(s) of the variable length columns
+        return (average_lengths[field.attname] or 0) + 1
+    return FIELD_SIZES.get(internal_type, 8)
+
+
+def get_indexes(model):
+    """
+    Returns {index name: column names} of the indexes the model creates.
+    """
+    opts = model._meta
+    indexes = {'pk': [opts.pk.attname]}
+    for field in opts.local_concrete_fields:
+        if field.primary_key:
+            continue
+        if field.unique or field.db_index:
+            indexes[field.attname] = [field.attname]
+    for fields in opts.unique_together:
+        indexes['unique %s' % ','.join(fields)] = [opts.get_field(name).attname for name in fields]
+    for index in opts.indexes:
+        indexes[index.name or ','.join(index.fields)] = [
+            opts.get_field(name.lstrip('-')).attname for name in index.fields
+        ]
+    return indexes
+
+
+def estimate_sizes(model):
+    """
+    Estimates the bytes per row and per index entry from the column types
+    and the average length of the text columns.
+    """
+    fields = model._meta.local_concrete_fields
+    text_fields = [
+        field.attname for field in fields
+        if not field.is_relation and field.get_internal_type() in ('CharField', 'TextField')
+    ]
+    average_lengths = model._default_manager.aggregate(**{
+        name: Avg(Length(name)) for name in text_fields
+    }) if text_fields else {}
+    sizes = {field.attname: get_field_size(model, field, average_lengths) for field in fields}
+    return {
+        'row_bytes': ROW_OVERHEAD + sum(sizes.values()),
+        'index_entry_bytes': {
+            name: INDEX_ENTRY_OVERHEAD + sum(sizes[column] for column in columns)
+            for name, columns in get_indexes(model).items()
+        },
+    }
+
+
+def get_table_stats(model):
+    count = model._default_manager.count()
+    stats = {
+        'table': model._meta.db_table,
+        'rows': count,
+    }
+    stats.update(estimate_sizes(model))
+    stats['estimated_bytes'] = count * (stats['row_bytes'] + sum(stats['index_entry_bytes'].values()))
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_total_relation_size(%s)', [model._meta.db_table])
+            stats['total_relation_bytes'] = cursor.fetchone()[0]
+    return stats
+
+
+def get_age_buckets(now):
+    aggregates = {
+        'days_%d' % days: Count('pk', filter=Q(date__gte=now - timedelta(days=days)))
+        for days in AGE_BUCKETS
+    }
+    aggregates['total'] = Count('pk')
+    counts = PasswordHistory.objects.aggregate(**aggregates)
+    # The aggregates are cumulative
+    buckets = {}
+    previous = 0
+    for days in AGE_BUCKETS:
+        buckets['up to %d days' % days] = counts['days_%d' % days] - previous
+        previous = counts['days_%d' % days]
+    buckets['older'] = counts['total'] - previous
+    return buckets
+
+
+def get_packed_stats(now, max_age=0):
+    """
+    Returns the counts of the packed histories, in total, per user,
+    per hasher and per age bucket.
+    """
+    bucket_cutoffs = [
+        ('up to %d days' % days, packed.to_microseconds(now - timedelta(days=days)))
+        for days in AGE_BUCKETS
+    ]
+    max_age_cutoff = packed.to_microseconds(now - timedelta(days=max_age)) if max_age > 0 else None
+    stats = {
+        'configs': 0,
+        'passwords': 0,
+        'bytes': 0,
+        'expired': 0,
+        'user_passwords': Counter(),
+        'hasher_passwords': Counter(),
+        'age': Counter(),
+    }
+    for _, user_id, hasher, iterations, data in packed.iter_packed_histories(('user', 'hasher', 'iterations')):
+        entries = packed.unpack(data)
+        stats['configs'] += 1
+        stats['passwords'] += len(entries)
+        stats['bytes'] += len(data)
+        stats['user_passwords'][user_id] += len(entries)
+        stats['hasher_passwords'][(hasher, iterations)] += len(entries)
+        for date, _ in entries:
+            stats['age'][next((name for name, cutoff in bucket_cutoffs if date >= cutoff), 'older')] += 1
+            if max_age_cutoff is not None and date < max_age_cutoff:
+                stats['expired'] += 1
+    return stats
+
+
+def get_history_stats(last_passwords=0, max_age=0, top=10, now=None):
+    """
+    Returns the statistics of the password history tables.
+
+    :param last_passwords: the window of the validator, rows beyond it are counted
+    :param max_age: the window of the validator in days, older rows are counted
+    :param top: the number of users with the most configurations
+    """
+    now = now or timezone.now()
+    packed_stats = get_packed_stats(now, max_age)
+    history_lengths = get_histogram(
+        PasswordHistory.objects.values('user_config__user').annotate(length=Count('pk')),
+        'length'
+    )
+    # The users with both the rows and the packed history
+    # (during dpv_history_to_packed) are counted in each of them.
+    for length in packed_stats['user_passwords'].values():
+        history_lengths[length] = history_lengths.get(length, 0) + 1
+    configs_per_user = get_histogram(
+        UserPasswordHistoryConfig.objects.values('user').annotate(configs=Count('pk')),
+        'configs'
+    )
+    configs_per_hasher = [
+        {
+            'hasher': row['hasher'],
+            'iterations': row['iterations'],
+            'configs': row['configs'],
+            'passwords': row['passwords'] + packed_stats['hasher_passwords'][(row['hasher'], row['iterations'])],
+        }
+        for row in UserPasswordHistoryConfig.objects.
+        order_by().
+        values('hasher', 'iterations').
+        annotate(configs=Count('pk', distinct=True), passwords=Count('passwordhistory')).
+        order_by('hasher', 'iterations')
+    ]
+    top_users = list(
+        UserPasswordHistoryConfig.objects.
+        order_by().
+        values('user').
+        annotate(configs=Count('pk', distinct=True), passwords=Count('passwordhistory')).
+        filter(configs__gt=1).
+        order_by('-configs', '-passwords', 'user')[:top]
+    )
+    for row in top_users:
+        row['passwords'] += packed_stats['user_passwords'][row['user']]
+
+    outside_window = {}
+    if last_passwords > 0:
+        outside_window['last_passwords'] = sum(
+            (length - last_passwords) * users
+            for length, users in history_lengths.items()
+            if length > last_passwords
+        )
+    if max_age > 0:
+        outside_window['max_age'] = PasswordHistory.objects.filter(
+            date__lt=now - timedelta(days=max_age)
+        ).count() + packed_stats['expired']
+
+    history_age = get_age_buckets(now)
+    for name, count in packed_stats['age'].items():
+        history_age[name] += count
+
+    return {
+        'tables': {
+            'configs': get_table_stats(UserPasswordHistoryConfig),
+            'history': get_table_stats(PasswordHistory),
+        },
+        'history_length_per_user': get_percentiles(history_lengths),
+        'configs_per_user': get_percentiles(configs_per_user),
+        'configs_per_hasher': configs_per_hasher,
+        'top_users_by_configs': top_users,
+        'packed_history': {
+            'configs': packed_stats['configs'],
+            'passwords': packed_stats['passwords'],
+            'bytes': packed_stats['bytes'],
+        },
+        'history_age': history_age,
+        'outside_window': outside_window,
+    }
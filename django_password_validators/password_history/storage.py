@@ -0,0 +1,577 @@
+"""
+Storage backends of the password history (DPV_HISTORY_STORAGE).
+
+The backend gets the UniquePasswordsValidator, whose options (last_passwords,
+max_age, max_configs) limit the history. The configurations returned by
+the backends are UserPasswordHistoryConfig objects, the backends other than
+ModelHistoryStorage do not save them to the database.
+"""
+import hmac
+import time
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F, Max, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from django_password_validators.password_history import packed
+from django_password_validators.password_history.models import (
+    PasswordHistory,
+    UserPasswordHistoryConfig,
+)
+from django_password_validators.settings import (
+    get_history_cache_alias,
+    get_history_hmac_key_id,
+    get_password_hasher_path,
+    get_user_password_hasher_path,
+)
+
+
+class HistoryStorageLockError(Exception):
+    pass
+
+
+class BaseHistoryStorage(object):
+    """
+    The interface of the storage backends.
+    """
+
+    def __init__(self, validator):
+        self.validator = validator
+
+    def get_current_hasher(self, user):
+        """
+        Returns the path, the class and the key id of the hasher
+        used for the new passwords of the user.
+        """
+        hasher_path = get_user_password_hasher_path(user)
+        hasher = import_string(hasher_path)
+        key_id = get_history_hmac_key_id() if getattr(hasher, 'keyed', False) else ''
+        return hasher_path, hasher, key_id
+
+    def get_user_configs(self, user):
+        """
+        Returns the configurations of the user to check, the most recently used first.
+        """
+        raise NotImplementedError
+
+    def find_current_user_config(self, user):
+        """
+        Returns the configuration of the current hasher of the user, None if it does not exist.
+        """
+        raise NotImplementedError
+
+    def get_current_user_config(self, user):
+        """
+        Returns the configuration of the current hasher of the user, creates it if needed.
+        """
+        raise NotImplementedError
+
+    def password_in_history(self, user_config, password_hash):
+        raise NotImplementedError
+
+    def store_password(self, user, user_config, password_hash):
+        raise NotImplementedError
+
+    def store_passwords(self, items):
+        """
+        Stores the batch of (user, user_config, password_hash).
+        """
+        for user, user_config, password_hash in items:
+            self.store_password(user, user_config, password_hash)
+
+    def prune_passwords(self, user):
+        """
+        Deletes the passwords out of range before the validation.
+        """
+        raise NotImplementedError
+
+    def delete_old_passwords(self, user):
+        """
+        Deletes the passwords out of range after the password change.
+        """
+        raise NotImplementedError
+
+
+class ModelHistoryStorage(BaseHistoryStorage):
+    """
+    The history in the PasswordHistory and UserPasswordHistoryConfig models (the default).
+
+    With the packed layout, the passwords are stored in the packed_history
+    column of the configurations (see password_history.packed).
+    """
+
+    def __init__(self, validator):
+        super(ModelHistoryStorage, self).__init__(validator)
+        # {user pk: configurations with the unpacked history (packed_entries)},
+        # the validator uses a new storage for each validation, so the histories
+        # are read and unpacked once per validation.
+        self._packed_user_configs = {}
+
+    def get_unpacked_user_configs(self, user):
+        """
+        Returns the configurations of the user with the packed history,
+        with the unpacked entries in packed_entries.
+        """
+        if user.pk not in self._packed_user_configs:
+            user_configs = list(UserPasswordHistoryConfig.objects.filter(user=user, packed_history__isnull=False))
+            for user_config in user_configs:
+                user_config.packed_entries = packed.unpack(user_config.packed_history)
+            self._packed_user_configs[user.pk] = user_configs
+        return self._packed_user_configs[user.pk]
+
+    def delete_old_passwords(self, user):
+        if self.validator.use_packed_layout():
+            self.delete_old_packed_passwords(user)
+            return
+        if self.validator.last_passwords > 0:
+            # Delete old passwords that are outside the lookup_range
+            password_ids = list(
+                PasswordHistory.objects. \
+                    filter(user_config__user=user). \
+                    order_by('-date')[self.validator.last_passwords:]. \
+                    values_list('pk', flat=True)
+            )
+            if password_ids:
+                PasswordHistory.objects.filter(pk__in=password_ids).delete()
+        self.delete_expired_passwords(user)
+
+    def delete_expired_passwords(self, user):
+        cutoff = self.validator.get_history_cutoff()
+        if cutoff is not None:
+            # Delete old passwords that are older than max_age
+            PasswordHistory.objects.filter(
+                user_config__user=user,
+                date__lt=cutoff
+            ).delete()
+
+    def delete_old_packed_passwords(self, user):
+        last_passwords = self.validator.last_passwords
+        cutoff = self.validator.get_history_cutoff()
+        if last_passwords <= 0 and cutoff is None:
+            return
+
+        def get_min_date(entries):
+            # The date of the oldest password to keep, None - keep all
+            min_dates = []
+            if cutoff is not None:
+                min_dates.append(packed.to_microseconds(cutoff))
+            dates = sorted(
+                (date for config_entries in entries.values() for date, _ in config_entries),
+                reverse=True
+            )
+            if 0 < last_passwords < len(dates):
+                min_dates.append(dates[last_passwords - 1])
+            return max(min_dates) if min_dates else None
+
+        # Most validations have nothing to delete, the lock is taken only for the deletion
+        entries = {
+            user_config.pk: user_config.packed_entries
+            for user_config in self.get_unpacked_user_configs(user)
+        }
+        min_date = get_min_date(entries)
+        if min_date is None or all(
+                date >= min_date for config_entries in entries.values() for date, _ in config_entries):
+            return
+        with transaction.atomic():
+            user_configs = list(
+                UserPasswordHistoryConfig.objects.
+                select_for_update().
+                filter(user=user, packed_history__isnull=False)
+            )
+            entries = {
+                user_config.pk: packed.unpack(user_config.packed_history)
+                for user_config in user_configs
+            }
+            min_date = get_min_date(entries)
+            for user_config in user_configs:
+                config_entries = entries[user_config.pk]
+                kept = [entry for entry in config_entries if entry[0] >= min_date]
+                if len(kept) != len(config_entries):
+                    user_config.packed_history = packed.pack(kept)
+                    UserPasswordHistoryConfig.objects. \
+                        filter(pk=user_config.pk). \
+                        update(packed_history=user_config.packed_history)
+                user_config.packed_entries = kept
+        self._packed_user_configs[user.pk] = user_configs
+
+    def prune_passwords(self, user):
+        if self.validator.use_ring_layout():
+            # The ring never holds more than last_passwords passwords
+            self.delete_expired_passwords(user)
+        else:
+            self.delete_old_passwords(user)
+
+    def get_user_configs(self, user):
+        """
+        The configurations are ordered by the most recently stored password,
+        so that the scan stops early for recently used passwords, the cheaper
+        configurations first. Configurations without passwords (in the max_age range)
+        can not match and are left out.
+        """
+        if self.validator.use_packed_layout():
+            return self.get_packed_user_configs(user)
+        user_configs = UserPasswordHistoryConfig.objects. \
+            filter(user=user). \
+            annotate(last_password_date=Max('passwordhistory__date')). \
+            filter(last_password_date__isnull=False). \
+            order_by(F('last_password_date').desc(), 'iterations', '-date')
+        cutoff = self.validator.get_history_cutoff()
+        if cutoff is not None:
+            user_configs = user_configs.filter(last_password_date__gte=cutoff)
+        if self.validator.max_configs > 0:
+            user_configs = user_configs[:self.validator.max_configs]
+        return user_configs
+
+    def get_packed_user_configs(self, user):
+        cutoff = self.validator.get_history_cutoff()
+        user_configs = []
+        for user_config in self.get_unpacked_user_configs(user):
+            if not user_config.packed_entries:
+                continue
+            # The entries are in the order they were added
+            user_config.last_password_date = packed.from_microseconds(user_config.packed_entries[-1][0])
+            if cutoff is None or user_config.last_password_date >= cutoff:
+                user_configs.append(user_config)
+        # The order of get_user_configs(), from the least significant key
+        user_configs.sort(key=lambda user_config: user_config.date, reverse=True)
+        user_configs.sort(key=lambda user_config: user_config.iterations)
+        user_configs.sort(key=lambda user_config: user_config.last_password_date, reverse=True)
+        if self.validator.max_configs > 0:
+            user_configs = user_configs[:self.validator.max_configs]
+        return user_configs
+
+    def find_current_user_config(self, user):
+        hasher_path, hasher, key_id = self.get_current_hasher(user)
+        hasher_lookup = Q(hasher=hasher_path)
+        if hasher_path == get_password_hasher_path():
+            # Configurations without the recorded hasher use the default one
+            # (unless it is a hasher of another algorithm)
+            hasher_lookup |= Q(hasher__isnull=True) & (
+                Q(algorithm__isnull=True) | Q(algorithm=hasher.algorithm)
+            )
+        # The configurations of the keyed hashers with the previous keys
+        # are only checked, new passwords use the current key.
+        return UserPasswordHistoryConfig.objects.filter(
+            hasher_lookup,
+            user=user,
+            iterations=hasher.iterations,
+            key_id=key_id
+        ).first()
+
+    def get_current_user_config(self, user):
+        user_config = self.find_current_user_config(user)
+        if not user_config:
+            user_config = UserPasswordHistoryConfig()
+            user_config.user = user
+            user_config.hasher = self.get_current_hasher(user)[0]
+            user_config.save()
+        return user_config
+
+    def password_in_history(self, user_config, password_hash):
+        if self.validator.use_packed_layout():
+            cutoff = self.validator.get_history_cutoff()
+            entries = getattr(user_config, 'packed_entries', None)
+            if entries is None:
+                entries = packed.unpack(user_config.packed_history)
+            return packed.contains_entries(
+                entries,
+                packed.get_digest(password_hash),
+                packed.to_microseconds(cutoff) if cutoff is not None else None
+            )
+        lookup = {
+            'user_config': user_config,
+            'password': password_hash,
+        }
+        cutoff = self.validator.get_history_cutoff()
+        if cutoff is not None:
+            lookup['date__gte'] = cutoff
+        return PasswordHistory.objects.filter(**lookup).exists()
+
+    def store_password(self, user, user_config, password_hash):
+        """
+        Stores the password hash, without deleting passwords out of range
+        (except for the ring layout, which takes care of it itself).
+        """
+        if self.validator.use_ring_layout():
+            self.store_ring_password(user, user_config, password_hash)
+            return
+        if self.validator.use_packed_layout():
+            self.store_packed_password(user_config, password_hash)
+            return
+
+        # We are looking hash password in the database
+        old_password, old_password__created = PasswordHistory.objects.get_or_create(
+            user_config=user_config,
+            password=password_hash
+        )
+        if not old_password__created:
+            # The password is used again, it must not expire with the old date
+            PasswordHistory.objects.filter(pk=old_password.pk).update(date=timezone.now())
+
+    def store_passwords(self, items):
+        """
+        Stores the batch with a single insert.
+
+        Passwords out of the last_passwords range are deleted by the validator
+        the next time the password of the user is validated. The ring and the packed
+        layouts store the passwords one by one, the ring is not pruned by the count.
+        """
+        if self.validator.use_ring_layout() or self.validator.use_packed_layout():
+            super(ModelHistoryStorage, self).store_passwords(items)
+            return
+        PasswordHistory.objects.bulk_create(
+            [
+                PasswordHistory(user_config=user_config, password=password_hash)
+                for user, user_config, password_hash in items
+            ],
+            ignore_conflicts=True
+        )
+
+    def store_packed_password(self, user_config, password_hash):
+        """
+        Appends the digest to the packed history of the configuration.
+        """
+        digest = packed.get_digest(password_hash)
+        self._packed_user_configs.pop(user_config.user_id, None)
+        with transaction.atomic():
+            data = UserPasswordHistoryConfig.objects. \
+                select_for_update(). \
+                filter(pk=user_config.pk). \
+                values_list('packed_history', flat=True). \
+                get()
+            entries = packed.unpack(data)
+            kept = [entry for entry in entries if not hmac.compare_digest(entry[1], digest)]
+            if len(kept) == len(entries):
+                data = packed.append(data, packed.to_microseconds(timezone.now()), digest)
+            else:
+                # The password is used again, it moves to the end with the new date
+                data = packed.pack(kept + [(packed.to_microseconds(timezone.now()), digest)])
+            UserPasswordHistoryConfig.objects. \
+                filter(pk=user_config.pk). \
+                update(packed_history=data)
+        user_config.packed_history = data
+
+    def store_ring_password(self, user, user_config, password_hash):
+        """
+        Stores the password hash in the ring of last_passwords slots.
+
+        The oldest slot of the configuration is overwritten,
+        the new row is inserted only until the ring is full.
+        """
+        with transaction.atomic():
+            # The concurrent changes of the same configuration wait for the lock,
+            # so that the same password is not stored twice.
+            next_slot = UserPasswordHistoryConfig.objects. \
+                select_for_update(). \
+                filter(pk=user_config.pk). \
+                values_list('next_slot', flat=True). \
+                get()
+            # The password used again keeps its slot with the new date
+            if PasswordHistory.objects. \
+                    filter(user_config=user_config, password=password_hash). \
+                    update(date=timezone.now()):
+                return
+            UserPasswordHistoryConfig.objects. \
+                filter(pk=user_config.pk). \
+                update(next_slot=next_slot + 1)
+            user_config.next_slot = next_slot + 1
+            slot = (user_config.next_slot - 1) % self.validator.last_passwords
+            updated = PasswordHistory.objects. \
+                filter(user_config=user_config, slot=slot). \
+                update(password=password_hash, date=timezone.now())
+            if not updated:
+                PasswordHistory.objects.create(
+                    user_config=user_config,
+                    slot=slot,
+                    password=password_hash
+                )
+                # The ring is not full yet, passwords of the other (older)
+                # configurations of the user may be out of range.
+                self.delete_old_passwords(user)
+
+
+class CacheHistoryStorage(BaseHistoryStorage):
+    """
+    The history in Django's cache (DPV_HISTORY_CACHE_ALIAS), for deployments
+    where the database is the bottleneck. Use a persistent cache backend!
+
+    The configurations and the passwords of the user are stored under one key::
+
+        {
+            'configs': [{'hasher': ..., 'iterations': ..., 'salt': ..., 'key_id': ...}, ...],
+            'passwords': [[config index, password hash, timestamp], ...],
+        }
+
+    The key is updated under a lock made with cache.add(), so that concurrent
+    password changes of the user do not lose passwords.
+    """
+    key_prefix = 'dpv:history:'
+    lock_timeout = 10
+    lock_wait = 5
+    lock_poll_interval = 0.01
+
+    @property
+    def cache(self):
+        return caches[get_history_cache_alias()]
+
+    def get_key(self, user):
+        return '%s%s' % (self.key_prefix, user.pk)
+
+    def get_data(self, user):
+        return self.cache.get(self.get_key(user)) or {'configs': [], 'passwords': []}
+
+    def lock(self, user):
+        """
+        Acquires the lock of the user's key, returns its token.
+        """
+        lock_key = self.get_key(user) + ':lock'
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_wait
+        while not self.cache.add(lock_key, token, self.lock_timeout):
+            if time.monotonic() > deadline:
+                raise HistoryStorageLockError('The password history of %r is locked.' % user)
+            time.sleep(self.lock_poll_interval)
+        return token
+
+    def unlock(self, user, token):
+        lock_key = self.get_key(user) + ':lock'
+        # The lock may have expired and been taken by another process
+        if self.cache.get(lock_key) == token:
+            self.cache.delete(lock_key)
+
+    def update(self, user, function):
+        """
+        Calls function(data) under the lock and stores the data if it returns True.
+        """
+        token = self.lock(user)
+        try:
+            data = self.get_data(user)
+            if function(data):
+                self.cache.set(self.get_key(user), data, None)
+            return data
+        finally:
+            self.unlock(user, token)
+
+    def make_config(self, user, index, config):
+        user_config = UserPasswordHistoryConfig(
+            user=user,
+            hasher=config['hasher'],
+            iterations=config['iterations'],
+            salt=config['salt'],
+            # The cached configurations of the older versions have None
+            key_id=config['key_id'] or '',
+            algorithm=config.get('algorithm')
+        )
+        user_config.index = index
+        return user_config
+
+    def prune(self, data):
+        """
+        Deletes the passwords out of range, returns True if the data changed.
+        """
+        passwords = data['passwords']
+        cutoff = self.validator.get_history_cutoff()
+        if cutoff is not None:
+            passwords = [password for password in passwords if password[2] >= cutoff.timestamp()]
+        if self.validator.last_passwords > 0:
+            passwords = sorted(passwords, key=lambda password: password[2])[-self.validator.last_passwords:]
+        if len(passwords) == len(data['passwords']):
+            return False
+        data['passwords'] = passwords
+        return True
+
+    def prune_passwords(self, user):
+        data = self.get_data(user)
+        # Only the writers take the lock
+        if self.prune(dict(data)):
+            self.update(user, self.prune)
+
+    delete_old_passwords = prune_passwords
+
+    def get_user_configs(self, user):
+        data = self.get_data(user)
+        cutoff = self.validator.get_history_cutoff()
+        passwords = {}
+        last_password_dates = {}
+        for index, password_hash, timestamp in data['passwords']:
+            if cutoff is not None and timestamp < cutoff.timestamp():
+                continue
+            passwords.setdefault(index, set()).add(password_hash)
+            last_password_dates[index] = max(last_password_dates.get(index, timestamp), timestamp)
+        user_configs = []
+        for index in sorted(
+                last_password_dates,
+                key=lambda index: (-last_password_dates[index], data['configs'][index]['iterations'], -index)):
+            user_config = self.make_config(user, index, data['configs'][index])
+            user_config.password_hashes = passwords[index]
+            user_configs.append(user_config)
+        if self.validator.max_configs > 0:
+            user_configs = user_configs[:self.validator.max_configs]
+        return user_configs
+
+    def find_config(self, data, user):
+        """
+        Returns (index, config) of the current hasher of the user in data, None if it is not there.
+        """
+        hasher_path, hasher, key_id = self.get_current_hasher(user)
+        default_hasher = hasher_path == get_password_hasher_path()
+        for index, config in enumerate(data['configs']):
+            if (config['hasher'] == hasher_path or (default_hasher and config['hasher'] is None)) \
+                    and config['iterations'] == hasher.iterations and (config['key_id'] or '') == key_id:
+                return index, config
+        return None
+
+    def find_current_user_config(self, user):
+        found = self.find_config(self.get_data(user), user)
+        return self.make_config(user, *found) if found else None
+
+    def get_current_user_config(self, user):
+        hasher_path = self.get_current_hasher(user)[0]
+        found = []
+
+        def add_config(data):
+            config = self.find_config(data, user)
+            if config:
+                found.append(config)
+                return False
+            user_config = UserPasswordHistoryConfig(user=user, hasher=hasher_path)
+            user_config.set_defaults()
+            config = {
+                'hasher': user_config.hasher,
+                'iterations': user_config.iterations,
+                'salt': user_config.salt,
+                'key_id': user_config.key_id,
+                'algorithm': user_config.algorithm,
+            }
+            data['configs'].append(config)
+            found.append((len(data['configs']) - 1, config))
+            return True
+
+        self.update(user, add_config)
+        return self.make_config(user, *found[0])
+
+    def password_in_history(self, user_config, password_hash):
+        password_hashes = getattr(user_config, 'password_hashes', None)
+        if password_hashes is None:
+            cutoff = self.validator.get_history_cutoff()
+            password_hashes = {
+                password[1] for password in self.get_data(user_config.user)['passwords']
+                if password[0] == user_config.index and (cutoff is None or password[2] >= cutoff.timestamp())
+            }
+        return password_hash in password_hashes
+
+    def store_password(self, user, user_config, password_hash):
+        def append(data):
+            # The password used again gets the new timestamp
+            data['passwords'] = [
+                password for password in data['passwords']
+                if password[0] != user_config.index or password[1] != password_hash
+            ]
+            data['passwords'].append([user_config.index, password_hash, time.time()])
+            self.prune(data)
+            return True
+
+        self.update(user, append)
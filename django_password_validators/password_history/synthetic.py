@@ -0,0 +1,376 @@
+"""
+Synthetic password history for profiling and capacity testing.
+
+Hashing real passwords with the history hashers is deliberately slow,
+the synthetic history has placeholder hashes in the format of the
+configured hasher, which never match any password.
+"""
+import base64
+from datetime import timedelta
+import math
+import os
+import random as random_module
+import string
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.db import connections, router, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from django_password_validators.password_history import packed
+from django_password_validators.password_history.hashers import HistoryScryptHasher
+from django_password_validators.password_history.models import (
+    PasswordHistory,
+    UserPasswordHistoryConfig,
+)
+from django_password_validators.settings import (
+    HISTORY_LAYOUT_PACKED,
+    get_history_hmac_key_id,
+    get_user_password_hasher_path,
+)
+
+
+SAMPLE_PASSWORD = 'synthetic password'
+SAMPLE_SALT = 'syntheticsalt'
+
+
+def get_hash_format(user_config, cache=None):
+    """
+    Returns (the part of the hash before the salt, the part between the salt
+    and the digest, the digest size) of the configuration.
+
+    The format is taken from a real hash of its hasher, computed once for
+    each hasher, iterations and key id when the cache (a dict) is given.
+    """
+    key = (user_config.get_hasher_path(), user_config.iterations, user_config.key_id)
+    if cache is not None and key in cache:
+        return cache[key]
+    password_hash = UserPasswordHistoryConfig(
+        salt=SAMPLE_SALT,
+        hasher=key[0],
+        iterations=user_config.iterations,
+        key_id=user_config.key_id
+    ).make_password_hash(SAMPLE_PASSWORD)
+    prefix = password_hash[:password_hash.rindex('$') + 1]
+    salt_start = prefix.index('$%s$' % SAMPLE_SALT) + 1
+    hash_format = (
+        prefix[:salt_start],
+        prefix[salt_start + len(SAMPLE_SALT):],
+        len(packed.get_digest(password_hash)),
+    )
+    if cache is not None:
+        cache[key] = hash_format
+    return hash_format
+
+
+def make_placeholder_hash(user_config, random=os.urandom, hash_formats=None):
+    """
+    Returns a random hash in the storage format of the history hasher.
+
+    :param hash_formats: the cache of get_hash_format
+    """
+    before_salt, after_salt, digest_size = get_hash_format(user_config, hash_formats)
+    return '%s%s%s%s' % (
+        before_salt,
+        user_config.salt,
+        after_salt,
+        base64.b64encode(random(digest_size)).decode('ascii')
+    )
+
+
+def get_config_iterations(hasher, index):
+    """
+    Returns the iterations of the index-th configuration of the user with the hasher,
+    the first one has the iterations of the hasher, the next ones (older
+    configurations) have other valid work factors.
+    """
+    if not index:
+        return hasher.iterations
+    if issubclass(hasher, HistoryScryptHasher):
+        # N must be a power of 2, the older configurations have a lower one
+        iterations = hasher.iterations >> index
+        if iterations < 2:
+            raise ValueError('%s has no work factor for %d configurations.' % (hasher.__name__, index + 1))
+        return iterations
+    # More PBKDF2 iterations, the keyed hashers ignore them
+    return hasher.iterations + index
+
+
+def create_synthetic_user(username):
+    """
+    Creates a user without a usable password (no password history).
+    """
+    UserModel = get_user_model()
+    user = UserModel(**{UserModel.USERNAME_FIELD: username})
+    user.set_unusable_password()
+    user.save()
+    return user
+
+
+def create_synthetic_configs(user, count):
+    """
+    Creates count configurations of the user, the first one is the configuration
+    of the current hasher of the user, the next ones have more iterations (other hashers).
+    """
+    hasher_path = get_user_password_hasher_path(user)
+    hasher = import_string(hasher_path)
+    configs = []
+    for i in range(count):
+        user_config = UserPasswordHistoryConfig(
+            user=user,
+            hasher=hasher_path,
+            iterations=get_config_iterations(hasher, i)
+        )
+        user_config.save()
+        configs.append(user_config)
+    return configs
+
+
+def set_history_dates(history, dates):
+    """
+    Sets the dates of the history rows created by bulk_create
+    (auto_now_add ignores the given dates).
+    """
+    for password_history, date in zip(history, dates):
+        password_history.date = date
+    if all(password_history.pk is not None for password_history in history):
+        PasswordHistory.objects.bulk_update(history, ['date'])
+    else:
+        # The database does not return the primary keys from bulk_create
+        for password_history in history:
+            PasswordHistory.objects.filter(
+                user_config=password_history.user_config,
+                password=password_history.password
+            ).update(date=password_history.date)
+
+
+def create_synthetic_history(user_config, depth, interval=None, now=None, random=os.urandom):
+    """
+    Creates depth passwords of the configuration, from the newest one,
+    each one interval older than the previous one.
+
+    :return: the list of created PasswordHistory objects
+    """
+    interval = interval or timedelta(days=30)
+    now = now or timezone.now()
+    hash_formats = {}
+    history = PasswordHistory.objects.bulk_create([
+        PasswordHistory(user_config=user_config, password=make_placeholder_hash(user_config, random, hash_formats))
+        for _ in range(depth)
+    ])
+    set_history_dates(history, [now - interval * i for i in range(depth)])
+    return history
+
+
+def parse_distribution(spec):
+    """
+    Returns the sampler (a function of random.Random) of the distribution:
+
+    * constant:N
+    * uniform:A:B - integers from A to B
+    * geometric:MEAN - integers from 1, e.g. the history depth
+    * poisson:MEAN
+    * exponential:MEAN - floats, e.g. the days between the password changes
+    * choice:VALUE=WEIGHT,... - e.g. choice:1=0.85,2=0.12,3=0.03
+    """
+    name, _, arguments = spec.partition(':')
+    try:
+        if name == 'constant':
+            value = float(arguments)
+            return lambda rng: value
+        if name == 'uniform':
+            low, high = (int(argument) for argument in arguments.split(':'))
+            return lambda rng: rng.randint(low, high)
+        if name == 'geometric':
+            mean = float(arguments)
+            if mean <= 1:
+                return lambda rng: 1
+            log_failure = math.log(1 - 1 / mean)
+            return lambda rng: 1 + int(math.log(1 - rng.random()) / log_failure)
+        if name == 'poisson':
+            limit = math.exp(-float(arguments))
+
+            def poisson(rng):
+                count, product = 0, rng.random()
+                while product > limit:
+                    count += 1
+                    product *= rng.random()
+                return count
+            return poisson
+        if name == 'exponential':
+            rate = 1 / float(arguments)
+            return lambda rng: rng.expovariate(rate)
+        if name == 'choice':
+            values, weights = [], []
+            for item in arguments.split(','):
+                value, weight = item.split('=')
+                values.append(float(value))
+                weights.append(float(weight))
+            return lambda rng: rng.choices(values, weights)[0]
+    except (ValueError, ZeroDivisionError):
+        pass
+    raise ValueError('Invalid distribution %r.' % spec)
+
+
+def raw_insert(model, objs, fields):
+    """
+    Inserts the objects in batches with plain INSERT statements, without
+    calling pre_save(), so that the given dates of the auto_now_add fields are kept.
+    """
+    connection = connections[router.db_for_write(model)]
+    fields = [model._meta.get_field(name) for name in fields]
+    quote_name = connection.ops.quote_name
+    sql = 'INSERT INTO %s (%s) ' % (
+        quote_name(model._meta.db_table),
+        ', '.join(quote_name(field.column) for field in fields)
+    )
+    batch_size = max(connection.ops.bulk_batch_size(fields, objs), 1)
+    with connection.cursor() as cursor:
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+            cursor.execute(
+                sql + connection.ops.bulk_insert_sql(fields, [['%s'] * len(fields)] * len(batch)),
+                [
+                    field.get_db_prep_save(getattr(obj, field.attname), connection)
+                    for obj in batch for field in fields
+                ]
+            )
+
+
+def make_random_bytes(rng):
+    return lambda size: rng.getrandbits(size * 8).to_bytes(size, 'big')
+
+
+class HistoryGenerator(object):
+    """
+    Generates users with the password history straight in the database,
+    for checking the indexes, the pruning and the query plans at scale.
+
+    The users are named prefix + number and generated in chunks, each chunk
+    in a transaction. The data of each user depends only on the seed and
+    its number, an interrupted run continues from the first missing user.
+    """
+
+    def __init__(self, prefix, seed, depth, configs, interval, layout=None, now=None):
+        """
+        :param depth: the sampler of the number of passwords of the user
+        :param configs: the sampler of the number of configurations (hashers) of the user
+        :param interval: the sampler of the days between the password changes
+        :param layout: DPV_HISTORY_LAYOUT, the passwords of the packed layout
+            are stored in the configurations
+        """
+        self.prefix = prefix
+        self.seed = seed
+        self.depth = depth
+        self.configs = configs
+        self.interval = interval
+        self.layout = layout
+        self.now = now or timezone.now()
+        self.UserModel = get_user_model()
+        self.hash_formats = {}
+
+    def get_username(self, number):
+        return '%s%09d' % (self.prefix, number)
+
+    def count_existing(self):
+        return self.UserModel._default_manager.filter(**{
+            '%s__startswith' % self.UserModel.USERNAME_FIELD: self.prefix
+        }).count()
+
+    def make_user(self, number, rng):
+        user = self.UserModel(**{self.UserModel.USERNAME_FIELD: self.get_username(number)})
+        user.password = UNUSABLE_PASSWORD_PREFIX + ''.join(rng.choices(string.ascii_letters, k=40))
+        return user
+
+    def make_history(self, user, rng):
+        """
+        Returns [(configuration, [dates of the passwords, the newest first])],
+        the newest passwords are in the first configuration (of the current hasher),
+        the older ones in the configurations of the previous hashers.
+        """
+        hasher_path = get_user_password_hasher_path(user)
+        hasher = import_string(hasher_path)
+        key_id = get_history_hmac_key_id() if getattr(hasher, 'keyed', False) else ''
+        depth = max(int(self.depth(rng)), 0)
+        dates = []
+        date = self.now
+        for _ in range(depth):
+            date -= timedelta(days=self.interval(rng))
+            dates.append(date)
+        config_count = max(int(self.configs(rng)), 1)
+        cuts = sorted(rng.randint(0, depth) for _ in range(config_count - 1))
+        history = []
+        for index, (start, end) in enumerate(zip([0] + cuts, cuts + [depth])):
+            config_dates = dates[start:end]
+            user_config = UserPasswordHistoryConfig(
+                user=user,
+                date=config_dates[-1] if config_dates else self.now,
+                salt=''.join(rng.choices(string.ascii_letters + string.digits, k=120)),
+                hasher=hasher_path,
+                iterations=get_config_iterations(hasher, index),
+                algorithm=hasher.algorithm,
+                key_id=key_id
+            )
+            history.append((user_config, config_dates))
+        return history
+
+    def generate_chunk(self, numbers):
+        """
+        :return: the number of the generated passwords
+        """
+        rngs = {number: random_module.Random('%s:%d' % (self.seed, number)) for number in numbers}
+        with transaction.atomic():
+            self.UserModel._default_manager.bulk_create([self.make_user(number, rngs[number]) for number in numbers])
+            users = self.UserModel._default_manager.in_bulk(
+                [self.get_username(number) for number in numbers],
+                field_name=self.UserModel.USERNAME_FIELD
+            )
+            histories = [
+                self.make_history(users[self.get_username(number)], rngs[number])
+                for number in numbers
+            ]
+            config_fields = ['user', 'date', 'salt', 'iterations', 'next_slot', 'hasher', 'algorithm', 'key_id']
+            if self.layout == HISTORY_LAYOUT_PACKED:
+                config_fields.append('packed_history')
+                for number, history in zip(numbers, histories):
+                    random_bytes = make_random_bytes(rngs[number])
+                    for user_config, dates in history:
+                        digest_size = get_hash_format(user_config, self.hash_formats)[2]
+                        user_config.packed_history = packed.pack([
+                            (packed.to_microseconds(date), random_bytes(digest_size)) for date in reversed(dates)
+                        ])
+            configs = [user_config for history in histories for user_config, _ in history]
+            raw_insert(UserPasswordHistoryConfig, configs, config_fields)
+            if self.layout == HISTORY_LAYOUT_PACKED:
+                return sum(len(dates) for history in histories for _, dates in history)
+
+            config_ids = {
+                (user_id, iterations): pk
+                for pk, user_id, iterations in UserPasswordHistoryConfig.objects.
+                filter(user__in=[user.pk for user in users.values()]).
+                values_list('pk', 'user', 'iterations')
+            }
+            passwords = []
+            for number, history in zip(numbers, histories):
+                random_bytes = make_random_bytes(rngs[number])
+                for user_config, dates in history:
+                    user_config.pk = config_ids[(user_config.user.pk, user_config.iterations)]
+                    for date in dates:
+                        passwords.append(PasswordHistory(
+                            user_config=user_config,
+                            password=make_placeholder_hash(user_config, random_bytes, self.hash_formats),
+                            date=date
+                        ))
+            raw_insert(PasswordHistory, passwords, ['user_config', 'password', 'date'])
+            return len(passwords)
+
+    def generate(self, count, chunk_size=1000):
+        """
+        Generates the users up to count, yields (generated users, generated passwords)
+        after each chunk.
+        """
+        start = self.count_existing()
+        for chunk_start in range(start, count, chunk_size):
+            numbers = list(range(chunk_start, min(chunk_start + chunk_size, count)))
+            yield len(numbers), self.generate_chunk(numbers)
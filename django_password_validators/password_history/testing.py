@@ -0,0 +1,60 @@
+"""
+Helpers for the test suites of projects using the password history.
+
+Usage::
+
+    from django_password_validators.password_history.testing import (
+        create_password_history,
+        fast_password_history,
+    )
+
+    @fast_password_history
+    class MyTestCase(TestCase):
+        ...
+"""
+from django.test import override_settings
+
+
+FAST_PASSWORD_HISTORY_SETTINGS = {
+    'DPV_DEFAULT_HISTORY_HASHER': 'django_password_validators.password_history.hashers.HistoryTestHasher',
+    'DPV_HASH_SERVER_SOCKET': None,
+}
+
+# Decorator (or context manager) for test cases and test methods,
+# the password history is hashed with HistoryTestHasher.
+fast_password_history = override_settings(**FAST_PASSWORD_HISTORY_SETTINGS)
+
+
+def create_password_history(user, passwords, dates=None):
+    """
+    Preloads the password history of the user with a single bulk insert.
+
+    The passwords are hashed with the configured history hasher,
+    use it together with fast_password_history.
+
+    :param user: saved user model
+    :param passwords: the passwords, from the oldest
+    :param dates: optional dates of the passwords (the same order as passwords)
+    :return: the list of created PasswordHistory objects
+    """
+    from django_password_validators.password_history.models import PasswordHistory
+    from django_password_validators.password_history.password_validation import UniquePasswordsValidator
+
+    user_config = UniquePasswordsValidator().get_current_user_config(user)
+
+    history = PasswordHistory.objects.bulk_create([
+        PasswordHistory(
+            user_config=user_config,
+            password=user_config.make_password_hash(password),
+        )
+        for password in passwords
+    ])
+    if dates is not None:
+        # auto_now_add ignores the given dates
+        for password_history, date in zip(history, dates):
+            PasswordHistory.objects.filter(
+                user_config=user_config,
+                password=password_history.password
+            ).update(date=date)
+            password_history.date = date
+    return history
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from django_password_validators.password_history import views
+
+urlpatterns = [
+    path('password-prehash/', views.prehash, name='dpv_password_prehash'),
+]
@@ -0,0 +1,39 @@
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
+from django.views.decorators.http import require_POST
+
+from django_password_validators.password_history.password_validation import (
+    get_default_unique_passwords_validator,
+)
+from django_password_validators.password_history.prehash import (
+    MAX_PASSWORD_LENGTH,
+    prehash_password,
+)
+
+
+@require_POST
+def prehash(request):
+    """
+    Hashes the new password ("password" of the POST data) of the logged in user
+    in advance, see password_history.prehash.
+
+    Responses: 204 - done (or nothing to do), 400 - no password,
+    403 - not logged in or UniquePasswordsValidator has no rate limit,
+    429 - the rate limit of UniquePasswordsValidator.
+    """
+    if not request.user.is_authenticated:
+        return HttpResponseForbidden()
+    password = request.POST.get('password', '')
+    if not password or len(password) > MAX_PASSWORD_LENGTH:
+        return HttpResponseBadRequest()
+    validator = get_default_unique_passwords_validator()
+    if validator is None or not request.session.session_key:
+        return HttpResponse(status=204)
+    # The hashing counts as a check of the password, without the rate limit
+    # the view would hash any number of passwords on request
+    rate_limiter = validator.get_rate_limiter()
+    if rate_limiter is None:
+        return HttpResponseForbidden()
+    if not rate_limiter.allow(request.user):
+        return HttpResponse(status=429)
+    prehash_password(validator, request.user, password, request.session.session_key)
+    return HttpResponse(status=204)
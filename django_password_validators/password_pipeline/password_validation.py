@@ -0,0 +1,155 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import time
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.utils.module_loading import import_string
+
+
+# Estimated cost (in milliseconds) of validators that do not declare one.
+DEFAULT_VALIDATOR_COST = 1
+
+
+class PipelineValidator(object):
+    """
+    Runs the wrapped validators ordered by their cost, cheapest first.
+
+    The cost of a validator is taken from the 'COST' key of its
+    configuration, the ``cost`` attribute of the validator or, when
+    measure_cost is enabled, from the measured average run time.
+    Costs are expressed in milliseconds.
+    """
+
+    def __init__(
+            self,
+            validators=(),
+            skip_expensive_on_failure=True,
+            expensive_cost=100,
+            max_workers=1,
+            measure_cost=False
+    ):
+        """
+
+        :param validators:
+            list of validators configured the same way as AUTH_PASSWORD_VALIDATORS,
+            each entry can additionally declare its 'COST'
+        :param skip_expensive_on_failure:
+            do not run expensive validators if one of the cheap ones has failed
+        :param expensive_cost:
+            validators with the cost greater or equal to this are expensive
+        :param max_workers:
+            * max_workers > 1 - expensive validators are run at the same time,
+              the validators using the database (uses_database = True) stay
+              in the calling thread, in its transaction
+            * max_workers <= 1 - all validators are run one after another
+        :param measure_cost:
+            order validators by their measured average run time
+        """
+        self.validators = []
+        self.declared_costs = []
+        for validator in validators:
+            try:
+                klass = import_string(validator['NAME'])
+            except ImportError:
+                raise ImproperlyConfigured(
+                    "The module in NAME could not be imported: %s. Check your "
+                    "PipelineValidator validators setting." % validator['NAME']
+                )
+            instance = klass(**validator.get('OPTIONS', {}))
+            self.validators.append(instance)
+            self.declared_costs.append(validator.get(
+                'COST',
+                getattr(instance, 'cost', DEFAULT_VALIDATOR_COST)
+            ))
+        self.skip_expensive_on_failure = skip_expensive_on_failure
+        self.expensive_cost = expensive_cost
+        self.max_workers = int(max_workers)
+        self.measure_cost = measure_cost
+        self.measured_costs = {}
+
+    def get_cost(self, index):
+        if self.measure_cost and index in self.measured_costs:
+            return self.measured_costs[index]
+        return self.declared_costs[index]
+
+    def _run_validator(self, index, password, user):
+        """
+        Runs a single validator, returns the raised ValidationError or None.
+        """
+        start = time.perf_counter()
+        try:
+            self.validators[index].validate(password, user)
+        except ValidationError as error:
+            return error
+        finally:
+            if self.measure_cost:
+                elapsed = (time.perf_counter() - start) * 1000
+                previous = self.measured_costs.get(index)
+                # Exponential moving average, so that the single
+                # slow run does not change the order.
+                self.measured_costs[index] = (
+                    elapsed if previous is None else previous * 0.8 + elapsed * 0.2
+                )
+
+    def _run_validator_in_thread(self, index, password, user):
+        from django.db import connections
+
+        try:
+            return self._run_validator(index, password, user)
+        finally:
+            # Database connections are per thread, we do not leave them open.
+            connections.close_all()
+
+    def validate(self, password, user=None):
+        order = sorted(range(len(self.validators)), key=self.get_cost)
+        cheap = [i for i in order if self.get_cost(i) < self.expensive_cost]
+        expensive = [i for i in order if self.get_cost(i) >= self.expensive_cost]
+
+        errors = []
+        for index in cheap:
+            error = self._run_validator(index, password, user)
+            if error is not None:
+                errors.append(error)
+
+        if not (errors and self.skip_expensive_on_failure):
+            if self.max_workers > 1 and len(expensive) > 1:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    # The validators see the context variables of the caller
+                    # (e.g. the rate limit client key), each one in its own copy.
+                    futures = {
+                        index: executor.submit(
+                            contextvars.copy_context().run,
+                            self._run_validator_in_thread, index, password, user
+                        )
+                        for index in expensive
+                        if not getattr(self.validators[index], 'uses_database', False)
+                    }
+                    # The connection of another thread would not see the uncommitted
+                    # rows of the caller's transaction (e.g. ATOMIC_REQUESTS).
+                    local_results = {
+                        index: self._run_validator(index, password, user)
+                        for index in expensive
+                        if index not in futures
+                    }
+                    results = [
+                        futures[index].result() if index in futures else local_results[index]
+                        for index in expensive
+                    ]
+            else:
+                results = [self._run_validator(index, password, user) for index in expensive]
+            errors.extend(error for error in results if error is not None)
+
+        if errors:
+            raise ValidationError(errors)
+
+    def password_changed(self, password, user=None):
+        for validator in self.validators:
+            password_changed = getattr(validator, 'password_changed', lambda *a: None)
+            password_changed(password, user)
+
+    def get_help_text(self):
+        return ' '.join(
+            validator.get_help_text()
+            for validator in self.validators
+            if hasattr(validator, 'get_help_text')
+        )
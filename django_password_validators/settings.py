@@ -1,11 +1,181 @@
-from django.conf import settings
-from django.utils.module_loading import import_string
+# django.conf is imported by the functions, so that importing validators
+# does not load the settings machinery (see test_imports).
 
+# Layouts of the password history
+# A row is inserted for each password, old rows are deleted.
+HISTORY_LAYOUT_ROWS = 'rows'
+# Each configuration has a fixed number of slots, the oldest one is overwritten.
+HISTORY_LAYOUT_RING = 'ring'
+# The passwords of each configuration are packed in one binary column (see password_history.packed).
+HISTORY_LAYOUT_PACKED = 'packed'
 
-def get_password_hasher():
-    history_hasher = getattr(
-        settings,
+
+def get_setting(name, default):
+    from django.conf import settings
+
+    return getattr(settings, name, default)
+
+
+def get_password_hasher_path():
+    return get_setting(
         'DPV_DEFAULT_HISTORY_HASHER',
         'django_password_validators.password_history.hashers.HistoryHasher'
     )
-    return import_string(history_hasher)
+
+
+def get_password_hasher():
+    from django.utils.module_loading import import_string
+
+    return import_string(get_password_hasher_path())
+
+
+def get_user_password_hasher_path(user):
+    """
+    Returns the history hasher of the user chosen by DPV_HISTORY_HASHER_POLICY,
+    a callable (or its path) taking the user and returning the path of the hasher
+    or None for the default one.
+    """
+    from django.utils.module_loading import import_string
+
+    policy = get_setting('DPV_HISTORY_HASHER_POLICY', None)
+    if policy is not None:
+        if isinstance(policy, str):
+            policy = import_string(policy)
+        hasher_path = policy(user)
+        if hasher_path:
+            return hasher_path
+    return get_password_hasher_path()
+
+
+def _read_hmac_key_file(path):
+    """
+    One key per line: "key id:secret", empty lines and lines starting with # are ignored.
+    """
+    keys = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            key_id, separator, secret = line.partition(':')
+            if not separator or not key_id or not secret:
+                from django.core.exceptions import ImproperlyConfigured
+
+                raise ImproperlyConfigured('Invalid line in the key file %s' % path)
+            keys[key_id] = secret
+    return keys
+
+
+# {path: (modification time, size, keys)}, the key file is parsed again when it changes
+_hmac_key_files = {}
+
+
+def _get_hmac_key_file_keys(path):
+    import os
+
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _hmac_key_files.get(path)
+    if cached is None or cached[0] != version:
+        cached = _hmac_key_files[path] = (version, _read_hmac_key_file(path))
+    return cached[1]
+
+
+def get_history_hmac_keys():
+    """
+    Returns the keys of the HMAC history hasher {key id: secret} from
+    DPV_HISTORY_HMAC_KEYS and the file DPV_HISTORY_HMAC_KEY_FILE.
+    """
+    keys = dict(get_setting('DPV_HISTORY_HMAC_KEYS', {}))
+    key_file = get_setting('DPV_HISTORY_HMAC_KEY_FILE', None)
+    if key_file:
+        keys.update(_get_hmac_key_file_keys(key_file))
+    return keys
+
+
+def get_history_hmac_key_id():
+    """
+    Returns the id of the key used for the new configurations,
+    DPV_HISTORY_HMAC_KEY_ID or the last configured key.
+    """
+    from django.core.exceptions import ImproperlyConfigured
+
+    keys = get_history_hmac_keys()
+    key_id = get_setting('DPV_HISTORY_HMAC_KEY_ID', None)
+    if key_id is None and keys:
+        key_id = list(keys)[-1]
+    if key_id not in keys:
+        raise ImproperlyConfigured(
+            'The HMAC history hasher requires the key %r '
+            '(DPV_HISTORY_HMAC_KEYS, DPV_HISTORY_HMAC_KEY_FILE).' % key_id
+        )
+    return key_id
+
+
+def get_hash_server_socket():
+    """
+    Path to the Unix socket of the history hashing server (dpv_hash_server),
+    None - passwords are hashed in the process.
+    """
+    return get_setting('DPV_HASH_SERVER_SOCKET', None)
+
+
+def get_hash_server_timeout():
+    return get_setting('DPV_HASH_SERVER_TIMEOUT', 30)
+
+
+def get_hash_server_connect_timeout():
+    """
+    Timeout of the connection to the hashing server in seconds,
+    after it the passwords are hashed in the process.
+    """
+    return get_setting('DPV_HASH_SERVER_CONNECT_TIMEOUT', 0.5)
+
+
+def get_hash_server_hashers():
+    """
+    The paths of the hashers the hashing server accepts: the history hashers,
+    DPV_DEFAULT_HISTORY_HASHER, PASSWORD_HASHERS and DPV_HASH_SERVER_HASHERS
+    (e.g. the hashers of DPV_HISTORY_HASHER_POLICY).
+    """
+    from django_password_validators.password_history.hashers import HISTORY_HASHERS
+
+    hashers = set(HISTORY_HASHERS.values())
+    hashers.add('django_password_validators.password_history.hashers.HistoryVeryStrongHasher')
+    hashers.add(get_password_hasher_path())
+    hashers.update(get_setting('PASSWORD_HASHERS', []))
+    hashers.update(get_setting('DPV_HASH_SERVER_HASHERS', []))
+    return hashers
+
+
+def get_history_layout():
+    return get_setting('DPV_HISTORY_LAYOUT', HISTORY_LAYOUT_ROWS)
+
+
+def get_password_rules_max_age():
+    """
+    Cache-Control max-age of the password rules view, in seconds.
+    """
+    return get_setting('DPV_PASSWORD_RULES_MAX_AGE', 24 * 3600)
+
+
+def get_history_storage_path():
+    return get_setting(
+        'DPV_HISTORY_STORAGE',
+        'django_password_validators.password_history.storage.ModelHistoryStorage'
+    )
+
+
+def get_history_cache_alias():
+    return get_setting('DPV_HISTORY_CACHE_ALIAS', 'default')
+
+
+def get_prehash_cache_alias():
+    return get_setting('DPV_PREHASH_CACHE_ALIAS', 'default')
+
+
+def get_prehash_timeout():
+    """
+    How long the passwords hashed in advance are kept, in seconds.
+    """
+    return get_setting('DPV_PREHASH_TIMEOUT', 10)
@@ -0,0 +1,18 @@
+"""
+Translation functions importing the translation machinery on the first call.
+
+Validators are imported by Django at startup (AUTH_PASSWORD_VALIDATORS),
+the modules with validators should not import more than they need.
+"""
+
+
+def gettext(message):
+    from django.utils.translation import gettext
+
+    return gettext(message)
+
+
+def ngettext(singular, plural, number):
+    from django.utils.translation import ngettext
+
+    return ngettext(singular, plural, number)
@@ -72,6 +72,7 @@ setup(
     tests_require=TESTS_REQUIRE,
     extras_require={
         'test': TESTS_REQUIRE,
+        'numpy': ['numpy'],
     },
     cmdclass={'test': Tox},
 )
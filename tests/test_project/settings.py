@@ -90,4 +90,14 @@ AUTH_PASSWORD_VALIDATORS = [
 INSTALLED_APPS += [
     # Required by: UniquePasswordsValidator
     'django_password_validators.password_history',
+    # Required by: dpv_build_breached_passwords
+    'django_password_validators.password_breached',
+    # Required by: dpv_build_common_passwords
+    'django_password_validators.password_common',
+]
+
+# Fast hashing of the password history in tests
+DPV_DEFAULT_HISTORY_HASHER = 'django_password_validators.password_history.hashers.HistoryTestHasher'
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.MD5PasswordHasher',
 ]
@@ -1,6 +1,21 @@
+import json
+from unittest import mock, skipUnless
+
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-from django_password_validators.password_character_requirements.password_validation import PasswordCharacterValidator
+from django_password_validators.password_character_requirements import password_validation
+from django_password_validators.password_character_requirements.password_validation import (
+    FAILURE_DIGIT,
+    FAILURE_LOWER,
+    FAILURE_SPECIAL,
+    FAILURE_UPPER,
+    PasswordCharacterValidator,
+    PasswordSequenceValidator,
+)
+from django_password_validators.password_character_requirements.rules import get_password_rules_json
 
 from .base import PasswordsTestCase
 
@@ -82,3 +97,200 @@ class UniquePasswordsValidatorTestCase(PasswordsTestCase):
             special_characters="!@#$%[]"
         )
         pv.validate('12ab[]AB')
+
+
+
+class ValidateManyTestCase(TestCase):
+
+    PASSWORDS = ['12ab[]AB', 'abcdef', '', 'ŻÓŁW12[]ab', '١٢ab[]AB', 'AB[]ab']
+
+    def setUp(self):
+        self.pv = PasswordCharacterValidator(
+            min_length_digit=2,
+            min_length_alpha=4,
+            min_length_special=2,
+            min_length_lower=2,
+            min_length_upper=2,
+            special_characters="!@#$%[]"
+        )
+
+    def test_masks(self):
+        masks = self.pv.validate_many(self.PASSWORDS, use_numpy=False)
+        self.assertEqual(masks, [
+            0,
+            FAILURE_DIGIT | FAILURE_UPPER | FAILURE_SPECIAL,
+            31,
+            0,
+            # Python's str.isdigit() accepts the Arabic-Indic digits
+            0,
+            FAILURE_DIGIT,
+        ])
+        # The same results as validate()
+        for password, mask in zip(self.PASSWORDS, masks):
+            try:
+                self.pv.validate(password)
+            except ValidationError as e:
+                self.assertEqual([error.code for error in e.error_list], self.pv.get_failure_codes(mask))
+            else:
+                self.assertEqual(mask, 0)
+        self.assertEqual(self.pv.get_failure_codes(FAILURE_DIGIT | FAILURE_LOWER), [
+            'min_length_digit', 'min_length_lower_characters'
+        ])
+        errors = self.pv.get_errors(FAILURE_DIGIT)
+        self.assertEqual(errors[0].messages, ['This password must contain at least 2 digits.'])
+
+    def test_no_checks(self):
+        pv = PasswordCharacterValidator(0, 0, 0, 0, 0)
+        self.assertEqual(pv.validate_many(['', 'a']), [0, 0])
+
+    def test_numpy_missing(self):
+        with mock.patch.object(password_validation, '_get_numpy', return_value=None):
+            self.assertEqual(self.pv.validate_many(self.PASSWORDS[:1]), [0])
+            with self.assertRaises(ImportError):
+                self.pv.validate_many(self.PASSWORDS, use_numpy=True)
+
+    @skipUnless(password_validation._get_numpy(), 'NumPy is not installed')
+    def test_numpy(self):
+        passwords = self.PASSWORDS * 3
+        self.assertEqual(
+            self.pv.validate_many(passwords, use_numpy=True, batch_size=4),
+            self.pv.validate_many(passwords, use_numpy=False)
+        )
+
+class PasswordSequenceValidatorTestCase(PasswordsTestCase):
+
+    def assert_codes(self, pv, password, codes):
+        with self.assertRaises(ValidationError) as cm:
+            pv.validate(password)
+        self.assertEqual([e.code for e in cm.exception.error_list], codes)
+
+    def test_repeat(self):
+        pv = PasswordSequenceValidator(max_repeat=3, max_sequence=0, max_keyboard_walk=0)
+        pv.validate('Aaa1!aaa')
+        self.assert_codes(pv, 'Aaaa1!', ['max_repeat'])
+        self.assert_codes(pv, 'x1!!!!', ['max_repeat'])
+
+    def test_sequence(self):
+        pv = PasswordSequenceValidator(max_repeat=0, max_sequence=3, max_keyboard_walk=0)
+        pv.validate('abc1xyz!cba')
+        pv.validate('abcba')
+        pv.validate('9012')
+        self.assert_codes(pv, 'Abcdef1!', ['max_sequence'])
+        self.assert_codes(pv, 'x4321', ['max_sequence'])
+        self.assert_codes(pv, 'xZYXW', ['max_sequence'])
+
+    def test_keyboard_walk(self):
+        pv = PasswordSequenceValidator(max_repeat=0, max_sequence=0, max_keyboard_walk=3)
+        pv.validate('qweasdzxc')
+        pv.validate('poiqwe')
+        self.assert_codes(pv, 'Qwerty1!', ['max_keyboard_walk'])
+        self.assert_codes(pv, '1;lkjh', ['max_keyboard_walk'])
+
+    def test_keyboard_rows(self):
+        pv = PasswordSequenceValidator(
+            max_repeat=0,
+            max_sequence=0,
+            max_keyboard_walk=3,
+            keyboard_rows=('azertyuiop', 'qsdfghjklm', 'wxcvbn')
+        )
+        pv.validate('qwer')
+        self.assert_codes(pv, 'azer', ['max_keyboard_walk'])
+
+    def test_all(self):
+        pv = PasswordSequenceValidator()
+        pv.validate('Tr0ub4dor&3')
+        self.assert_codes(pv, 'aaaaabcdefqwerty', ['max_repeat', 'max_sequence', 'max_keyboard_walk'])
+        self.assertEqual(pv.get_longest_runs(''), (0, 0, 0))
+        self.assertEqual(pv.get_longest_runs('aaaabcde'), (4, 5, 1))
+
+    def test_help_text(self):
+        self.assertIn('longer than 3 characters', PasswordSequenceValidator().get_help_text())
+        self.assertEqual(
+            PasswordSequenceValidator(max_repeat=0, max_sequence=0, max_keyboard_walk=0).get_help_text(),
+            ''
+        )
+
+
+PASSWORD_RULES_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+        'OPTIONS': {'min_length': 10},
+    },
+    {
+        'NAME': 'django_password_validators.password_character_requirements.password_validation.PasswordCharacterValidator',
+        'OPTIONS': {'min_length_alpha': 0, 'min_length_lower': 0, 'special_characters': '!?'},
+    },
+    {
+        'NAME': 'django_password_validators.password_character_requirements.password_validation.PasswordSequenceValidator',
+        'OPTIONS': {'max_sequence': 0, 'keyboard_rows': ['qwerty']},
+    },
+    {
+        'NAME': 'django_password_validators.password_history.password_validation.UniquePasswordsValidator',
+    },
+]
+
+
+@override_settings(AUTH_PASSWORD_VALIDATORS=PASSWORD_RULES_VALIDATORS)
+class PasswordRulesTestCase(TestCase):
+
+    def test_rules(self):
+        rules = json.loads(get_password_rules_json(settings.AUTH_PASSWORD_VALIDATORS))
+        self.assertEqual(rules['version'], 1)
+        self.assertEqual(
+            [(validator['name'], validator['rules']) for validator in rules['validators']],
+            [
+                ('MinimumLengthValidator', [
+                    {'type': 'min_length', 'code': 'password_too_short', 'min_length': 10},
+                ]),
+                ('PasswordCharacterValidator', [
+                    {'type': 'min_count', 'code': 'min_length_digit', 'character_class': 'digit', 'min_length': 1},
+                    {'type': 'min_count', 'code': 'min_length_upper_characters', 'character_class': 'upper',
+                     'min_length': 1},
+                    {'type': 'min_count', 'code': 'min_length_special_characters', 'character_class': 'special',
+                     'min_length': 1, 'characters': '!?'},
+                ]),
+                ('PasswordSequenceValidator', [
+                    {'type': 'max_repeat', 'code': 'max_repeat', 'max_length': 3},
+                    {'type': 'max_sequence', 'code': 'max_keyboard_walk', 'max_length': 3, 'sequences': ['qwerty']},
+                ]),
+            ]
+        )
+        self.assertIn('special character', rules['validators'][1]['help_text'])
+
+    def test_pipeline(self):
+        config = [{
+            'NAME': 'django_password_validators.password_pipeline.password_validation.PipelineValidator',
+            'OPTIONS': {'validators': PASSWORD_RULES_VALIDATORS[:2]},
+        }]
+        rules = json.loads(get_password_rules_json(config))
+        self.assertEqual(
+            [validator['name'] for validator in rules['validators']],
+            ['MinimumLengthValidator', 'PasswordCharacterValidator']
+        )
+
+    def test_view(self):
+        url = reverse('dpv_password_rules')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()['version'], 1)
+        self.assertIn('max-age=86400', response['Cache-Control'])
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Accept-Language', response['Vary'])
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # The revalidated response is cached the same way
+        self.assertIn('max-age=86400', response['Cache-Control'])
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Accept-Language', response['Vary'])
+        self.assertEqual(self.client.post(url).status_code, 405)
+
+        with self.settings(
+                AUTH_PASSWORD_VALIDATORS=PASSWORD_RULES_VALIDATORS[:1],
+                DPV_PASSWORD_RULES_MAX_AGE=60):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            self.assertIn('max-age=60', response['Cache-Control'])
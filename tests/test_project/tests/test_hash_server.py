@@ -0,0 +1,151 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+import stat
+import tempfile
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase, override_settings
+
+from django_password_validators.password_history import hash_server
+
+from django_password_validators.password_history.hash_server import (
+    HashServer,
+    HashServerBusy,
+    HashServerError,
+    hash_password,
+    make_password_hashes,
+    request_hashes,
+)
+from django_password_validators.password_history.models import UserPasswordHistoryConfig
+from django_password_validators.password_history.password_validation import UniquePasswordsValidator
+from django_password_validators.settings import get_hash_server_hashers
+
+from .base import PasswordsTestCase
+
+HASHER = 'django.contrib.auth.hashers.PBKDF2PasswordHasher'
+
+
+class HashServerTestCase(SimpleTestCase):
+
+    def setUp(self):
+        super(HashServerTestCase, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.tmp_dir, 'dpv.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(HashServerTestCase, self).tearDown()
+
+    def start_server(self, **kwargs):
+        kwargs.setdefault('hashers', [HASHER])
+        server = HashServer(self.socket_path, workers=1, **kwargs)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            thread.join()
+            server.server_close()
+
+        self.addCleanup(stop)
+        return server
+
+    def test_request_hashes(self):
+        self.start_server()
+        jobs = [[HASHER, 'password1', 'salt', 10], [HASHER, 'password2', 'salt', 20]]
+        self.assertEqual(
+            request_hashes(self.socket_path, jobs, timeout=10),
+            [hash_password(*job) for job in jobs]
+        )
+
+    def test_socket_mode(self):
+        self.start_server()
+        self.assertEqual(stat.S_IMODE(os.stat(self.socket_path).st_mode), 0o600)
+
+    def test_hasher_not_allowed(self):
+        self.start_server()
+        for hasher in ('os.system', 'django_password_validators.settings.get_setting', 'no.such.Hasher'):
+            with self.assertRaises(HashServerError):
+                request_hashes(self.socket_path, [[hasher, 'password', 'salt', 10]], timeout=10)
+        self.assertIn(settings.DPV_DEFAULT_HISTORY_HASHER, get_hash_server_hashers())
+
+    def test_timeout_keeps_slots(self):
+        server = self.start_server(timeout=0.01)
+        release = threading.Event()
+
+        def slow_hash_job(job):
+            release.wait(10)
+            return 'hash'
+
+        with mock.patch.object(hash_server, '_hash_job', slow_hash_job), \
+                mock.patch.object(server, 'executor', ThreadPoolExecutor(max_workers=1)):
+            with self.assertRaises(HashServerError):
+                request_hashes(self.socket_path, [[HASHER, 'password', 'salt', 10]], timeout=10)
+            # The job is still running, its slot is not free
+            self.assertEqual(server.pending, 1)
+            release.set()
+            server.executor.shutdown(wait=True)
+        self.assertEqual(server.pending, 0)
+
+    def test_busy(self):
+        self.start_server(max_pending=1)
+        jobs = [[HASHER, 'password1', 'salt', 10], [HASHER, 'password2', 'salt', 20]]
+        with self.assertRaises(HashServerBusy):
+            request_hashes(self.socket_path, jobs, timeout=10)
+
+    def test_make_password_hashes__server(self):
+        self.start_server()
+        with override_settings(DPV_HASH_SERVER_SOCKET=self.socket_path):
+            self.assertEqual(
+                make_password_hashes([(HASHER, 'password', 'salt', 10)]),
+                [hash_password(HASHER, 'password', 'salt', 10)]
+            )
+
+    def test_make_password_hashes__fallback(self):
+        # There is no server listening on the socket
+        with override_settings(DPV_HASH_SERVER_SOCKET=self.socket_path):
+            with self.assertLogs('django_password_validators.password_history.hash_server', 'WARNING'):
+                self.assertEqual(
+                    make_password_hashes([(HASHER, 'password', 'salt', 10)]),
+                    [hash_password(HASHER, 'password', 'salt', 10)]
+                )
+
+    def test_make_password_hashes__connect_timeout(self):
+        with override_settings(DPV_HASH_SERVER_SOCKET=self.socket_path, DPV_HASH_SERVER_CONNECT_TIMEOUT=0.2):
+            with mock.patch.object(hash_server, 'request_hashes', wraps=request_hashes) as mocked_request_hashes:
+                with self.assertLogs('django_password_validators.password_history.hash_server', 'WARNING'):
+                    make_password_hashes([(HASHER, 'password', 'salt', 10)])
+        self.assertEqual(mocked_request_hashes.call_args[0][3], 0.2)
+
+    def test_make_password_hashes__busy_fallback(self):
+        self.start_server(max_pending=0)
+        with override_settings(DPV_HASH_SERVER_SOCKET=self.socket_path):
+            with self.assertLogs('django_password_validators.password_history.hash_server', 'WARNING'):
+                self.assertEqual(
+                    make_password_hashes([(HASHER, 'password', 'salt', 10)]),
+                    [hash_password(HASHER, 'password', 'salt', 10)]
+                )
+
+
+def fake_request_hashes(socket_path, jobs, timeout, connect_timeout=None):
+    return [hash_password(*job) for job in jobs]
+
+
+@override_settings(DPV_HASH_SERVER_SOCKET='/nonexistent/dpv.sock')
+class HashServerBatchTestCase(PasswordsTestCase):
+
+    def test_validate_batch(self):
+        user1 = self.create_user(1)
+        UserPasswordHistoryConfig.objects.filter(user=user1).update(hasher=HASHER)
+        self.user_change_password(user_number=1, password_number=2)
+        self.assertEqual(UserPasswordHistoryConfig.objects.filter(user=user1).count(), 2)
+        with mock.patch.object(hash_server, 'request_hashes', side_effect=fake_request_hashes) as mocked:
+            with self.assertRaises(ValidationError):
+                UniquePasswordsValidator().validate(self.PASSWORD_TEMPLATE % 1, user1)
+        # One request for both configurations
+        self.assertEqual(mocked.call_count, 1)
+        self.assertEqual(len(mocked.call_args[0][1]), 2)
@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+
+from django.test import SimpleTestCase
+
+import django_password_validators
+
+VALIDATION_MODULES = [
+    'django_password_validators.password_history.password_validation',
+    'django_password_validators.password_character_requirements.password_validation',
+    'django_password_validators.password_pipeline.password_validation',
+    'django_password_validators.password_breached.password_validation',
+    'django_password_validators.password_common.password_validation',
+]
+
+# Modules that must not be imported together with the validators
+HEAVY_MODULES = [
+    'django.conf',
+    'django.db',
+    'django.db.models',
+    'django.utils.translation',
+    'django.contrib.auth',
+    'django_password_validators.password_history.models',
+    'django_password_validators.external_sort',
+    'numpy',
+]
+
+# Cumulative import time of the validators (microseconds). Generous,
+# the test should catch an accidental import of the ORM, not measure noise.
+IMPORT_TIME_BUDGET = 200000
+
+
+class ImportTimeTestCase(SimpleTestCase):
+
+    def import_modules(self, modules):
+        """
+        Imports the modules in a fresh interpreter,
+        returns {module: cumulative import time in microseconds}.
+        """
+        env = dict(os.environ)
+        env.pop('DJANGO_SETTINGS_MODULE', None)
+        env['PYTHONPATH'] = os.pathsep.join(
+            [os.path.dirname(os.path.dirname(django_password_validators.__file__))]
+            + [p for p in sys.path if p]
+        )
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import ' + ', '.join(modules)],
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        )
+        times = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or '|' not in line:
+                continue
+            self_time, cumulative, module = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                times[module.strip()] = int(cumulative)
+        return times
+
+    def test_no_heavy_imports(self):
+        times = self.import_modules(VALIDATION_MODULES)
+        for module in VALIDATION_MODULES:
+            self.assertIn(module, times)
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, times, msg='%s is imported by the validators' % module)
+
+    def test_import_time_budget(self):
+        times = self.import_modules(VALIDATION_MODULES)
+        self.assertLess(sum(times[module] for module in VALIDATION_MODULES), IMPORT_TIME_BUDGET)
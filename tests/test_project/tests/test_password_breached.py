@@ -0,0 +1,155 @@
+import hashlib
+from io import StringIO
+import os
+import shutil
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, override_settings
+
+from django_password_validators.external_sort import iter_sorted_unique
+from django_password_validators.password_breached.hash_file import (
+    HashFile,
+    build_hash_file,
+    parse_sha1_line,
+    password_digest,
+)
+from django_password_validators.password_breached.password_validation import BreachedPasswordValidator
+
+PASSWORDS = ['password%d' % i for i in range(500)] + ['qwerty', 'zaq1@WSX', 'password1']
+
+
+class BreachedPasswordsTestCase(SimpleTestCase):
+
+    def setUp(self):
+        super(BreachedPasswordsTestCase, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'breached.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(BreachedPasswordsTestCase, self).tearDown()
+
+    def build(self, **kwargs):
+        kwargs.setdefault('chunk_size', 64)
+        return build_hash_file(['%s\n' % p for p in PASSWORDS], self.path, tmp_dir=self.tmp_dir, **kwargs)
+
+    def test_build_hash_file(self):
+        # Duplicates are removed
+        self.assertEqual(self.build(), 502)
+        hash_file = HashFile(self.path)
+        self.assertEqual(hash_file.count, 502)
+        self.assertEqual(
+            os.path.getsize(self.path),
+            hash_file.records_offset + 502 * 20
+        )
+        records = [
+            hash_file._mmap[hash_file.records_offset + i * 20:hash_file.records_offset + (i + 1) * 20]
+            for i in range(hash_file.count)
+        ]
+        self.assertEqual(records, sorted(set(password_digest(p) for p in PASSWORDS)))
+        hash_file.close()
+
+    def test_rebuild_keeps_open_file(self):
+        self.build()
+        hash_file = HashFile(self.path)
+        build_hash_file(['qwerty\n'], self.path, tmp_dir=self.tmp_dir)
+        # The open file is replaced, not truncated
+        self.assertEqual(hash_file.count, 502)
+        self.assertIn(password_digest('password499'), hash_file)
+        hash_file.close()
+        new_hash_file = HashFile(self.path)
+        self.assertEqual(new_hash_file.count, 1)
+        new_hash_file.close()
+        self.assertEqual(os.listdir(self.tmp_dir), ['breached.bin'])
+
+    def test_failed_build_keeps_file(self):
+        self.build()
+
+        def lines():
+            yield 'qwerty\n'
+            raise RuntimeError()
+
+        with self.assertRaises(RuntimeError):
+            build_hash_file(lines(), self.path, tmp_dir=self.tmp_dir)
+        hash_file = HashFile(self.path)
+        self.assertEqual(hash_file.count, 502)
+        hash_file.close()
+        self.assertEqual(os.listdir(self.tmp_dir), ['breached.bin'])
+
+    def test_multi_pass_merge(self):
+        items = [str(i % 300).encode() for i in range(1000)]
+        self.assertEqual(
+            list(iter_sorted_unique(items, chunk_size=7, tmp_dir=self.tmp_dir, max_fan_in=3)),
+            sorted(set(items))
+        )
+        with self.assertRaises(ValueError):
+            list(iter_sorted_unique(items, max_fan_in=1))
+
+    def test_contains(self):
+        for prefix_index in (True, False):
+            self.build(prefix_index=prefix_index)
+            hash_file = HashFile(self.path)
+            self.assertEqual(hash_file.has_prefix_index, prefix_index)
+            for password in PASSWORDS:
+                self.assertIn(password_digest(password), hash_file)
+                self.assertTrue(hash_file.contains(password_digest(password), use_prefix_index=False))
+            for password in ('password500', 'Password1', ''):
+                self.assertNotIn(password_digest(password), hash_file)
+            hash_file.close()
+
+    def test_digest_size(self):
+        self.build(digest_size=6)
+        hash_file = HashFile(self.path)
+        self.assertEqual(hash_file.digest_size, 6)
+        self.assertIn(password_digest('qwerty'), hash_file)
+        self.assertNotIn(password_digest('qwerty1'), hash_file)
+        hash_file.close()
+        with self.assertRaises(ValueError):
+            self.build(digest_size=21)
+
+    def test_sha1_format(self):
+        lines = ['%s:%d\n' % (hashlib.sha1(p.encode()).hexdigest().upper(), 3) for p in PASSWORDS]
+        build_hash_file(lines, self.path, parse_line=parse_sha1_line)
+        hash_file = HashFile(self.path)
+        self.assertIn(password_digest('zaq1@WSX'), hash_file)
+        self.assertNotIn(password_digest('zaq1@WSX!'), hash_file)
+        hash_file.close()
+
+    def test_validator(self):
+        self.build()
+        validator = BreachedPasswordValidator(hash_file=self.path)
+        validator.validate('Unknown password 1!')
+        with self.assertRaises(ValidationError) as cm:
+            validator.validate('qwerty')
+        self.assertEqual(cm.exception.error_list[0].code, 'password_breached')
+        with override_settings(DPV_BREACHED_PASSWORDS_FILE=self.path):
+            with self.assertRaises(ValidationError):
+                BreachedPasswordValidator(use_prefix_index=False).validate('qwerty')
+        with self.assertRaises(ImproperlyConfigured):
+            BreachedPasswordValidator()
+
+    def test_validator_reloads_rebuilt_file(self):
+        self.build()
+        validator = BreachedPasswordValidator(hash_file=self.path)
+        with self.assertRaises(ValidationError):
+            validator.validate('qwerty')
+        build_hash_file(['Rebuilt password 1!\n'], self.path, tmp_dir=self.tmp_dir)
+        validator.validate('qwerty')
+        with self.assertRaises(ValidationError):
+            validator.validate('Rebuilt password 1!')
+
+    def test_command(self):
+        dump = os.path.join(self.tmp_dir, 'dump.txt')
+        with open(dump, 'w') as f:
+            f.write('\n'.join(PASSWORDS))
+        out = StringIO()
+        call_command('dpv_build_breached_passwords', dump, self.path, digest_size=10, chunk_size=100, stdout=out)
+        self.assertIn('Written 502 hashes', out.getvalue())
+        hash_file = HashFile(self.path)
+        self.assertIn(password_digest('password1'), hash_file)
+        hash_file.close()
+        with self.assertRaises(CommandError):
+            call_command('dpv_build_breached_passwords', dump, self.path, digest_size=1, stdout=out)
@@ -0,0 +1,119 @@
+from io import StringIO
+import os
+import shutil
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from django_password_validators.password_common.dictionary_file import (
+    FLAG_CASE_INSENSITIVE,
+    FLAG_LEETSPEAK,
+    DictionaryFile,
+    build_dictionary_file,
+)
+from django_password_validators.password_common.password_validation import CommonPasswordDictionaryValidator
+
+WORDS = ['password', 'password1', 'password12', 'passw', 'qwerty', 'Dragon', 'zaq12wsx', 'żółw'] + \
+        ['word%03d' % i for i in range(100)]
+
+
+class CommonPasswordsTestCase(SimpleTestCase):
+
+    def setUp(self):
+        super(CommonPasswordsTestCase, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'common.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        super(CommonPasswordsTestCase, self).tearDown()
+
+    def test_contains(self):
+        for block_size in (1, 3, 16, 1000):
+            count = build_dictionary_file(
+                WORDS + ['qwerty\n', ''], self.path, block_size=block_size, chunk_size=10, tmp_dir=self.tmp_dir
+            )
+            self.assertEqual(count, len(WORDS))
+            dictionary = DictionaryFile(self.path)
+            self.assertEqual(dictionary.count, len(WORDS))
+            for word in WORDS:
+                self.assertIn(word, dictionary)
+            for word in ('', 'a', 'pass', 'password2', 'dragon', 'zzzz', 'word100', 'żółw1'):
+                self.assertNotIn(word, dictionary)
+            dictionary.close()
+
+    def test_compression(self):
+        words = ['password%04d' % i for i in range(1000)]
+        build_dictionary_file(words, self.path, block_size=16)
+        self.assertLess(os.path.getsize(self.path), sum(len(w) for w in words) / 2)
+
+    def test_long_words(self):
+        long_word = 'x' * 0x10000
+        count = build_dictionary_file(WORDS + [long_word, 'x' * 0xffff], self.path, chunk_size=10)
+        self.assertEqual(count, len(WORDS) + 1)
+        dictionary = DictionaryFile(self.path)
+        self.assertIn('x' * 0xffff, dictionary)
+        self.assertNotIn(long_word, dictionary)
+        dictionary.close()
+
+    def test_rebuild_keeps_open_file(self):
+        build_dictionary_file(WORDS, self.path, tmp_dir=self.tmp_dir)
+        dictionary = DictionaryFile(self.path)
+        build_dictionary_file(['qwerty'], self.path, tmp_dir=self.tmp_dir)
+        # The open file is replaced, not rewritten
+        self.assertEqual(dictionary.count, len(WORDS))
+        self.assertIn('zaq12wsx', dictionary)
+        dictionary.close()
+        new_dictionary = DictionaryFile(self.path)
+        self.assertEqual(new_dictionary.count, 1)
+        self.assertNotIn('zaq12wsx', new_dictionary)
+        new_dictionary.close()
+        self.assertEqual(os.listdir(self.tmp_dir), ['common.bin'])
+
+    def test_validator_reloads_rebuilt_file(self):
+        build_dictionary_file(WORDS, self.path, tmp_dir=self.tmp_dir)
+        validator = CommonPasswordDictionaryValidator(dictionary_file=self.path)
+        with self.assertRaises(ValidationError):
+            validator.validate('zaq12wsx')
+        build_dictionary_file(['Rebuilt password'], self.path, tmp_dir=self.tmp_dir)
+        validator.validate('zaq12wsx')
+        with self.assertRaises(ValidationError):
+            validator.validate('Rebuilt password')
+
+    def test_empty(self):
+        build_dictionary_file([], self.path)
+        dictionary = DictionaryFile(self.path)
+        self.assertNotIn('password', dictionary)
+        dictionary.close()
+
+    def test_normalization(self):
+        build_dictionary_file(WORDS, self.path, flags=FLAG_CASE_INSENSITIVE | FLAG_LEETSPEAK)
+        dictionary = DictionaryFile(self.path)
+        self.assertIn('PaSsWoRd', dictionary)
+        self.assertIn('p4$$w0rd', dictionary)
+        self.assertIn('dragon', dictionary)
+        self.assertIn('DR4G0N', dictionary)
+        self.assertNotIn('password3', dictionary)
+        dictionary.close()
+
+    def test_validator(self):
+        build_dictionary_file(WORDS, self.path, flags=FLAG_CASE_INSENSITIVE)
+        validator = CommonPasswordDictionaryValidator(dictionary_file=self.path)
+        validator.validate('Not a common password')
+        with self.assertRaises(ValidationError) as cm:
+            validator.validate('QWERTY')
+        self.assertEqual(cm.exception.error_list[0].code, 'password_too_common')
+        with self.assertRaises(ImproperlyConfigured):
+            CommonPasswordDictionaryValidator()
+
+    def test_command(self):
+        out = StringIO()
+        # The list of Django's CommonPasswordValidator
+        call_command('dpv_build_common_passwords', self.path, case_insensitive=True, leetspeak=True, stdout=out)
+        self.assertIn('Written', out.getvalue())
+        dictionary = DictionaryFile(self.path)
+        self.assertEqual(dictionary.flags, FLAG_CASE_INSENSITIVE | FLAG_LEETSPEAK)
+        self.assertIn('P@ssw0rd', dictionary)
+        dictionary.close()
@@ -1,17 +1,59 @@
+from datetime import timedelta
+from io import StringIO
+from importlib import import_module
+import json
+import os
+import random
+import tempfile
+from unittest import mock
+
+from django.apps import apps
 from django.contrib.auth import get_user_model
-from django.contrib.auth.password_validation import validate_password
-from django.core.exceptions import ValidationError
-from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
 
 from django_password_validators.password_history.password_validation import UniquePasswordsValidator
+from django_password_validators.password_pipeline.password_validation import PipelineValidator
 from django_password_validators.password_history.hashers import (
+    HistoryHMACHasher,
+    HistoryScryptHasher,
     HistoryVeryStrongHasher,
-    HistoryHasher
+    HistoryTestHasher
 )
 from django_password_validators.password_history.models import (
     UserPasswordHistoryConfig,
-    PasswordHistory
+    PasswordHistory,
+    make_password_hashes,
+)
+from django_password_validators.password_history.policies import (
+    STRONG_HASHER,
+    staff_strong_hasher_policy,
+)
+from django_password_validators.password_history.bulk import seed_password_history
+from django_password_validators.password_history import packed
+from django_password_validators.password_history.prehash import (
+    PreHashMiddleware,
+    get_cache_key as get_prehash_cache_key,
 )
+from django_password_validators.password_history.rate_limit import (
+    RateLimitClientMiddleware,
+    get_client_key,
+    rate_limit_client,
+    take_token,
+)
+from django_password_validators.password_history.storage import (
+    CacheHistoryStorage,
+    HistoryStorageLockError,
+)
+from django_password_validators.password_history.synthetic import parse_distribution
+from django_password_validators import settings as settings_module
+from django_password_validators.settings import get_history_hmac_keys
 
 from .base import PasswordsTestCase
 
@@ -92,7 +134,7 @@ class UniquePasswordsValidatorTestCase(PasswordsTestCase):
 
             self.assertEqual(
                 PasswordHistory.objects.filter(
-                    user_config__iterations=HistoryHasher.iterations).count(),
+                    user_config__iterations=HistoryTestHasher.iterations).count(),
                 2,
             )
             self.assertEqual(
@@ -476,3 +518,1131 @@ class UniquePasswordsValidatorTestCase(PasswordsTestCase):
             msg='Only the oldest password can be deleted = ph1'
         )
         PasswordHistory.objects.all().delete()
+
+    @override_settings(AUTH_PASSWORD_VALIDATORS=[{
+        'NAME': 'django_password_validators.password_history.password_validation.UniquePasswordsValidator',
+        'OPTIONS': {
+            'max_age': 30
+        }
+    }])
+    def test_max_age(self):
+        user1 = self.create_user(1)
+        self.user_change_password(user_number=1, password_number=2)
+        PasswordHistory.objects.filter(user_config__user=user1).update(
+            date=timezone.now() - timedelta(days=31)
+        )
+        self.user_change_password(user_number=1, password_number=3)
+
+        # Passwords out of the time range. We interpret them as if they had never been entered.
+        self.assert_password_validation_True(user_number=1, password_number=1)
+        self.assert_password_validation_True(user_number=1, password_number=2)
+        # Passwords known in the scope we are checking
+        self.assert_password_validation_False(user_number=1, password_number=3)
+
+        self.assertEqual(PasswordHistory.objects.filter(user_config__user=user1).count(), 1)
+
+    def test_max_age__password_used_again(self):
+        user1 = self.create_user(1)
+        password = self.PASSWORD_TEMPLATE % 2
+        for layout in ('rows', 'ring', 'packed'):
+            with self.settings(DPV_HISTORY_LAYOUT=layout):
+                upv = UniquePasswordsValidator(last_passwords=5, max_age=30)
+                with mock.patch('django.utils.timezone.now', return_value=timezone.now() - timedelta(days=31)):
+                    upv.password_changed(password, user1)
+                # The password is set again without the validation
+                upv.password_changed(password, user1)
+                with self.assertRaises(ValidationError, msg=layout):
+                    upv.validate(password, user1)
+            PasswordHistory.objects.all().delete()
+            UserPasswordHistoryConfig.objects.update(packed_history=None)
+
+    def test_max_age__with_last_passwords(self):
+        user1 = self.create_user(1)
+        user1_uphc1 = UserPasswordHistoryConfig.objects.filter(user=user1)[0]
+        PasswordHistory.objects.all().delete()
+        ph1 = PasswordHistory.objects.create(user_config=user1_uphc1, password='1 user1 hash1')  # to delete
+        ph2 = PasswordHistory.objects.create(user_config=user1_uphc1, password='2 user1 hash2')  # to delete
+        ph3 = PasswordHistory.objects.create(user_config=user1_uphc1, password='3 user1 hash3')
+        ph4 = PasswordHistory.objects.create(user_config=user1_uphc1, password='4 user1 hash4')
+        PasswordHistory.objects.filter(pk=ph1.pk).update(date=timezone.now() - timedelta(days=20))
+        PasswordHistory.objects.filter(pk=ph2.pk).update(date=timezone.now() - timedelta(days=11))
+
+        upv = UniquePasswordsValidator(last_passwords=3, max_age=10)
+        upv.delete_old_passwords(user1)
+        current_passwords = list(
+            PasswordHistory.objects.filter(user_config__user=user1).values_list('pk', flat=True).order_by('pk'))
+        self.assertEqual(
+            current_passwords,
+            [ph3.pk, ph4.pk],
+        )
+
+    def test_purge_expired_passwords(self):
+        user1 = self.create_user(1)
+        user2 = self.create_user(2)
+        self.user_change_password(user_number=1, password_number=2)
+        PasswordHistory.objects.filter(user_config__user=user1).update(
+            date=timezone.now() - timedelta(days=400)
+        )
+        self.user_change_password(user_number=1, password_number=3)
+
+        self.assertEqual(UniquePasswordsValidator().purge_expired_passwords(), 0)
+        upv = UniquePasswordsValidator(max_age=365)
+        self.assertEqual(upv.purge_expired_passwords(batch_size=1), 2)
+        self.assertEqual(PasswordHistory.objects.filter(user_config__user=user1).count(), 1)
+        self.assertEqual(PasswordHistory.objects.filter(user_config__user=user2).count(), 1)
+
+    def test_purge_history_command(self):
+        user1 = self.create_user(1)
+        PasswordHistory.objects.filter(user_config__user=user1).update(
+            date=timezone.now() - timedelta(days=400)
+        )
+        with self.assertRaises(CommandError):
+            call_command('dpv_purge_history', stdout=StringIO())
+
+        out = StringIO()
+        call_command('dpv_purge_history', max_age=365, stdout=out)
+        self.assertIn('Deleted 1 passwords.', out.getvalue())
+        self.assertEqual(PasswordHistory.objects.count(), 0)
+
+    def test_profile_command(self):
+        user1 = self.create_user(1)
+        profile_output = tempfile.NamedTemporaryFile(delete=False)
+        profile_output.close()
+        self.addCleanup(os.unlink, profile_output.name)
+        out = StringIO()
+        call_command(
+            'dpv_profile',
+            users=2,
+            history_depth=3,
+            configs=2,
+            rounds=2,
+            last_passwords=2,
+            profile_output=profile_output.name,
+            stdout=out
+        )
+        output = out.getvalue()
+        for phase in ('config lookup', 'hashing', 'membership query', 'pruning', 'insert', 'validate'):
+            self.assertIn(phase, output)
+        self.assertGreater(os.path.getsize(profile_output.name), 0)
+        # Temporary users are deleted
+        self.assertEqual(list(self.UserModel.objects.all()), [user1])
+        self.assertEqual(UserPasswordHistoryConfig.objects.count(), 1)
+
+    def test_profile_command_layouts(self):
+        options = dict(users=2, history_depth=3, configs=3, rounds=1, last_passwords=2, stdout=StringIO())
+        with self.settings(DPV_DEFAULT_HISTORY_HASHER='%s.FastScryptHasher' % __name__):
+            for layout in ('packed', 'ring'):
+                with self.settings(DPV_HISTORY_LAYOUT=layout), \
+                        mock.patch(
+                            'django_password_validators.password_history.management.commands.'
+                            'dpv_profile.pack_config_history',
+                            wraps=packed.pack_config_history
+                        ) as pack_config_history:
+                    call_command('dpv_profile', **options)
+                    # The synthetic history is in the layout being profiled
+                    self.assertEqual(pack_config_history.call_count, 6 if layout == 'packed' else 0)
+            # FastScryptHasher has no valid work factor for 10 configurations
+            with self.assertRaises(CommandError):
+                call_command('dpv_profile', **dict(options, configs=10))
+        self.assertEqual(UserPasswordHistoryConfig.objects.count(), 0)
+
+    def test_unique_configs(self):
+        user1 = self.create_user(1)
+        user_config = UserPasswordHistoryConfig.objects.get(user=user1)
+        self.assertEqual(user_config.key_id, '')
+        # The configuration without the key can not be created twice
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            UserPasswordHistoryConfig.objects.create(
+                user=user1, hasher=user_config.hasher, iterations=user_config.iterations
+            )
+        self.assertEqual(UserPasswordHistoryConfig.objects.filter(user=user1).count(), 1)
+
+    def test_user_configs_order(self):
+        user1 = self.create_user(1)
+        config_1 = UserPasswordHistoryConfig.objects.get(user=user1)
+        config_2 = UserPasswordHistoryConfig.objects.create(user=user1, iterations=5)
+        config_3 = UserPasswordHistoryConfig.objects.create(user=user1, iterations=3)
+        # Without passwords
+        UserPasswordHistoryConfig.objects.create(user=user1, iterations=4)
+        now = timezone.now()
+        for user_config, password, days in (
+                (config_2, 'password 2', 10),
+                (config_3, 'password 3', 10),
+                (config_1, 'password 4', 5)):
+            PasswordHistory.objects.create(user_config=user_config, password=password)
+            PasswordHistory.objects.filter(password=password).update(date=now - timedelta(days=days))
+        PasswordHistory.objects.filter(user_config=config_1).exclude(password='password 4').update(
+            date=now - timedelta(days=400)
+        )
+
+        upv = UniquePasswordsValidator()
+        # The most recently used first, then the cheaper one
+        self.assertEqual(list(upv.get_user_configs(user1)), [config_1, config_3, config_2])
+        self.assertEqual(list(UniquePasswordsValidator(max_configs=2).get_user_configs(user1)), [config_1, config_3])
+        PasswordHistory.objects.filter(password='password 4').delete()
+        # The configurations without passwords in the range are not checked
+        self.assertEqual(list(UniquePasswordsValidator(max_age=365).get_user_configs(user1)), [config_3, config_2])
+
+    def test_max_configs(self):
+        self.create_user(1)
+        with self.settings(DPV_DEFAULT_HISTORY_HASHER='test_project.tests.test_password_history.StaffTestHasher'):
+            self.user_change_password(user_number=1, password_number=2)
+        upv = UniquePasswordsValidator(max_configs=1)
+        user1 = self.UserModel.objects.get(username='test1')
+        with self.assertRaises(ValidationError):
+            upv.validate(self.PASSWORD_TEMPLATE % 2, user1)
+        # Only the most recently used configuration is checked
+        upv.validate(self.PASSWORD_TEMPLATE % 1, user1)
+        with self.assertRaises(ValidationError):
+            UniquePasswordsValidator(max_configs=2).validate(self.PASSWORD_TEMPLATE % 1, user1)
+
+    def test_history_stats_command(self):
+        user1 = self.create_user(1)
+        self.create_user(2)
+        for password_number in (2, 3, 4):
+            self.user_change_password(user_number=1, password_number=password_number)
+        UserPasswordHistoryConfig.objects.create(user=user1, iterations=5)
+        PasswordHistory.objects.filter(user_config__user=user1).exclude(
+            password__in=PasswordHistory.objects.order_by('-date', '-pk').values('password')[:1]
+        ).update(date=timezone.now() - timedelta(days=100))
+
+        out = StringIO()
+        # +1 batch of the packed histories
+        with self.assertNumQueries(11):
+            call_command('dpv_history_stats', last_passwords=2, max_age=90, format='json', stdout=out)
+        stats = json.loads(out.getvalue())
+        self.assertEqual(stats['tables']['history']['rows'], 5)
+        self.assertEqual(stats['tables']['configs']['rows'], 3)
+        self.assertGreater(stats['tables']['history']['row_bytes'], 0)
+        self.assertIn('unique user_config,password', stats['tables']['history']['index_entry_bytes'])
+        self.assertEqual(
+            stats['history_length_per_user'],
+            {'count': 2, 'p50': 1, 'p90': 4, 'p95': 4, 'p99': 4, 'max': 4, 'mean': 2.5}
+        )
+        self.assertEqual(stats['configs_per_user']['max'], 2)
+        self.assertEqual(stats['top_users_by_configs'], [{'user': user1.pk, 'configs': 2, 'passwords': 4}])
+        self.assertEqual(
+            stats['history_age'],
+            {'up to 30 days': 2, 'up to 90 days': 0, 'up to 365 days': 3, 'up to 730 days': 0, 'older': 0}
+        )
+        self.assertEqual(stats['outside_window'], {'last_passwords': 2, 'max_age': 3})
+
+        out = StringIO()
+        call_command('dpv_history_stats', stdout=out)
+        self.assertIn('History length per user:', out.getvalue())
+
+    def test_delete_for_users(self):
+        user1 = self.create_user(1)
+        self.create_user(2)
+        user3 = self.create_user(3)
+        for password_number in (2, 3, 4):
+            self.user_change_password(user_number=1, password_number=password_number)
+        UserPasswordHistoryConfig.objects.create(user=user1, iterations=5)
+
+        users = self.UserModel.objects.filter(pk__in=[user1.pk, user3.pk])
+        # One batch of configurations and the last empty one
+        with self.assertNumQueries(1 + 3 + 1):
+            self.assertEqual(UserPasswordHistoryConfig.objects.delete_for_users(users), (3, 5))
+        self.assertEqual(list(UserPasswordHistoryConfig.objects.values_list('user__username', flat=True)), ['test2'])
+        self.assertEqual(PasswordHistory.objects.count(), 1)
+        self.assertEqual(UserPasswordHistoryConfig.objects.delete_for_users([user1.pk]), (0, 0))
+
+    def test_delete_users_history_command(self):
+        user1 = self.create_user(1)
+        self.create_user(2)
+        self.create_user(3)
+        self.user_change_password(user_number=1, password_number=2)
+        self.UserModel.objects.filter(username__in=['test1', 'test2']).update(is_active=False)
+
+        with self.assertRaises(CommandError):
+            call_command('dpv_delete_users_history', stdout=StringIO())
+        out = StringIO()
+        call_command('dpv_delete_users_history', str(user1.pk), stdout=out)
+        self.assertEqual(out.getvalue(), 'Deleted 1 configurations and 2 passwords.\n')
+
+        out = StringIO()
+        call_command('dpv_delete_users_history', inactive=True, delete_users=True, batch_size=1, stdout=out)
+        self.assertEqual(out.getvalue(), 'Deleted 1 configurations and 1 passwords.\nDeleted 2 users.\n')
+        self.assertEqual(list(self.UserModel.objects.values_list('username', flat=True)), ['test3'])
+        self.assertEqual(PasswordHistory.objects.count(), 1)
+
+    def test_help_text__max_age(self):
+        upv = UniquePasswordsValidator(last_passwords=5, max_age=365)
+        self.assertIn('365 days', upv.get_help_text())
+
+
+class StaffTestHasher(HistoryTestHasher):
+    iterations = 2
+
+
+STAFF_HASHER = '%s.StaffTestHasher' % __name__
+
+
+def staff_hasher_policy(user):
+    return STAFF_HASHER if user.is_staff else None
+
+
+@override_settings(DPV_HISTORY_HASHER_POLICY=staff_hasher_policy)
+class HasherPolicyTestCase(PasswordsTestCase):
+
+    def test_staff_hasher(self):
+        user1 = self.create_user(1)
+        staff = self.create_user(2)
+        staff.is_staff = True
+        staff.save()
+        self.user_change_password(user_number=2, password_number=2)
+
+        user_config_1 = UserPasswordHistoryConfig.objects.get(user=user1)
+        self.assertEqual(user_config_1.hasher, 'django_password_validators.password_history.hashers.HistoryTestHasher')
+        self.assertEqual(user_config_1.iterations, HistoryTestHasher.iterations)
+        # The configuration of the default hasher was created before the user became a staff member
+        self.assertEqual(
+            list(UserPasswordHistoryConfig.objects.filter(user=staff).order_by('iterations').values_list(
+                'hasher', 'iterations')),
+            [
+                ('django_password_validators.password_history.hashers.HistoryTestHasher', HistoryTestHasher.iterations),
+                (STAFF_HASHER, StaffTestHasher.iterations),
+            ]
+        )
+        self.assertEqual(PasswordHistory.objects.filter(user_config__hasher=STAFF_HASHER).count(), 1)
+        self.assertTrue(
+            PasswordHistory.objects.get(user_config__hasher=STAFF_HASHER).password.startswith(
+                '%s$%d$' % (StaffTestHasher.algorithm, StaffTestHasher.iterations))
+        )
+
+        # Passwords of both configurations are checked
+        self.assert_password_validation_False(user_number=2, password_number=1)
+        self.assert_password_validation_False(user_number=2, password_number=2)
+        self.assert_password_validation_True(user_number=2, password_number=3)
+
+    def test_legacy_config(self):
+        user1 = self.create_user(1)
+        # The configuration created before the hasher was recorded
+        UserPasswordHistoryConfig.objects.filter(user=user1).update(hasher=None)
+        user_config = UniquePasswordsValidator().get_current_user_config(user1)
+        self.assertEqual(UserPasswordHistoryConfig.objects.filter(user=user1).count(), 1)
+        self.assertIsNone(user_config.hasher)
+        self.assertEqual(user_config.get_hasher(), HistoryTestHasher)
+
+    def test_policy_path(self):
+        user1 = self.create_user(1)
+        user1.is_staff = True
+        with self.settings(
+                DPV_HISTORY_HASHER_POLICY='%s.staff_hasher_policy' % __name__):
+            self.assertEqual(UniquePasswordsValidator().get_current_user_config(user1).hasher, STAFF_HASHER)
+
+    def test_staff_strong_hasher_policy(self):
+        user1 = self.create_user(1)
+        self.assertIsNone(staff_strong_hasher_policy(user1))
+        user1.is_superuser = True
+        self.assertEqual(staff_strong_hasher_policy(user1), STRONG_HASHER)
+
+
+@override_settings(
+    DPV_HISTORY_STORAGE='django_password_validators.password_history.storage.CacheHistoryStorage',
+    AUTH_PASSWORD_VALIDATORS=[{
+        'NAME': 'django_password_validators.password_history.password_validation.UniquePasswordsValidator',
+        'OPTIONS': {
+            'last_passwords': 2
+        }
+    }]
+)
+class CacheHistoryStorageTestCase(PasswordsTestCase):
+
+    def setUp(self):
+        super(CacheHistoryStorageTestCase, self).setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def get_data(self, user):
+        return cache.get('dpv:history:%s' % user.pk)
+
+    def test_last_passwords(self):
+        user1 = self.create_user(1)
+        user2 = self.create_user(2)
+        for password_number in (2, 3, 3):
+            self.user_change_password(user_number=1, password_number=password_number)
+
+        # Nothing is stored in the database
+        self.assertEqual(UserPasswordHistoryConfig.objects.count(), 0)
+        self.assertEqual(PasswordHistory.objects.count(), 0)
+        data = self.get_data(user1)
+        self.assertEqual(len(data['configs']), 1)
+        self.assertEqual(data['configs'][0]['hasher'], 'django_password_validators.password_history.hashers.HistoryTestHasher')
+        self.assertEqual(len(data['passwords']), 2)
+        self.assertEqual(len(self.get_data(user2)['passwords']), 1)
+
+        self.assert_password_validation_True(user_number=1, password_number=1)
+        self.assert_password_validation_False(user_number=1, password_number=2)
+        self.assert_password_validation_False(user_number=1, password_number=3)
+        self.assert_password_validation_False(user_number=2, password_number=1)
+        self.assert_password_validation_True(user_number=2, password_number=2)
+
+    def test_max_age(self):
+        user1 = self.create_user(1)
+        self.user_change_password(user_number=1, password_number=2)
+        data = self.get_data(user1)
+        data['passwords'][0][2] -= 400 * 24 * 3600
+        cache.set('dpv:history:%s' % user1.pk, data, None)
+
+        upv = UniquePasswordsValidator(max_age=365)
+        # Only the passwords in the range are checked
+        self.assertEqual(len(upv.get_user_configs(user1)), 1)
+        upv.validate(self.PASSWORD_TEMPLATE % 1, user1)
+        with self.assertRaises(ValidationError):
+            upv.validate(self.PASSWORD_TEMPLATE % 2, user1)
+        # The expired password is deleted
+        self.assertEqual(len(self.get_data(user1)['passwords']), 1)
+
+    def test_max_age__password_used_again(self):
+        user1 = self.create_user(1)
+        data = self.get_data(user1)
+        data['passwords'][0][2] -= 400 * 24 * 3600
+        cache.set('dpv:history:%s' % user1.pk, data, None)
+
+        upv = UniquePasswordsValidator(max_age=365)
+        upv.password_changed(self.PASSWORD_TEMPLATE % 1, user1)
+        self.assertEqual(len(self.get_data(user1)['passwords']), 1)
+        with self.assertRaises(ValidationError):
+            upv.validate(self.PASSWORD_TEMPLATE % 1, user1)
+
+    def test_multiple_configs(self):
+        user1 = self.create_user(1)
+        with self.settings(DPV_DEFAULT_HISTORY_HASHER='test_project.tests.test_password_history.StaffTestHasher'):
+            self.user_change_password(user_number=1, password_number=2)
+            user_configs = UniquePasswordsValidator().get_user_configs(user1)
+            self.assertEqual(
+                [user_config.iterations for user_config in user_configs],
+                [StaffTestHasher.iterations, HistoryTestHasher.iterations]
+            )
+            self.assert_password_validation_False(user_number=1, password_number=1)
+            self.assert_password_validation_False(user_number=1, password_number=2)
+            self.assertEqual(len(UniquePasswordsValidator(max_configs=1).get_user_configs(user1)), 1)
+
+    def test_lock(self):
+        user1 = self.create_user(1)
+        storage = UniquePasswordsValidator().get_storage()
+        token = storage.lock(user1)
+        with mock.patch.object(CacheHistoryStorage, 'lock_wait', 0):
+            with self.assertRaises(HistoryStorageLockError):
+                self.user_change_password(user_number=1, password_number=2)
+        storage.unlock(user1, token)
+        self.user_change_password(user_number=1, password_number=2)
+        self.assertEqual(len(self.get_data(user1)['passwords']), 2)
+
+
+
+class ThreadedUniquePasswordsValidator(UniquePasswordsValidator):
+    # Run in the worker thread of PipelineValidator
+    uses_database = False
+
+
+class RateLimitTestCase(PasswordsTestCase):
+
+    def setUp(self):
+        super(RateLimitTestCase, self).setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def assert_rate_limited(self, upv, password, user):
+        with self.assertRaises(ValidationError) as cm:
+            upv.validate(password, user)
+        self.assertEqual(cm.exception.error_list[0].code, 'password_history_rate_limited')
+
+    def test_take_token(self):
+        self.assertTrue(take_token(cache, 'bucket', 2, 60, now=1000))
+        self.assertTrue(take_token(cache, 'bucket', 2, 60, now=1000))
+        self.assertFalse(take_token(cache, 'bucket', 2, 60, now=1010))
+        # One token per 30 seconds
+        self.assertTrue(take_token(cache, 'bucket', 2, 60, now=1030))
+        self.assertFalse(take_token(cache, 'bucket', 2, 60, now=1031))
+
+    def test_user(self):
+        user1 = self.create_user(1)
+        user2 = self.create_user(2)
+        upv = UniquePasswordsValidator(rate_limit=2)
+        upv.validate(self.PASSWORD_TEMPLATE % 2, user1)
+        with self.assertRaises(ValidationError):
+            upv.validate(self.PASSWORD_TEMPLATE % 1, user1)
+        # The password is not hashed when the bucket is empty
+        with mock.patch.object(UserPasswordHistoryConfig, 'make_password_hash') as make_password_hash:
+            self.assert_rate_limited(upv, self.PASSWORD_TEMPLATE % 2, user1)
+        make_password_hash.assert_not_called()
+        # The buckets of the other users are independent
+        upv.validate(self.PASSWORD_TEMPLATE % 2, user2)
+        # Without the limit
+        UniquePasswordsValidator().validate(self.PASSWORD_TEMPLATE % 2, user1)
+
+    def test_client(self):
+        user1 = self.create_user(1)
+        user2 = self.create_user(2)
+        user3 = self.create_user(3)
+        upv = UniquePasswordsValidator(rate_limit=5, client_rate_limit=1)
+        with rate_limit_client('192.0.2.1'):
+            upv.validate(self.PASSWORD_TEMPLATE % 2, user1)
+            # The bucket of the client is empty
+            self.assert_rate_limited(upv, self.PASSWORD_TEMPLATE % 3, user2)
+        with rate_limit_client('192.0.2.2'):
+            upv.validate(self.PASSWORD_TEMPLATE % 2, user3)
+
+    def test_client_limit_is_separate(self):
+        user1 = self.create_user(1)
+        user2 = self.create_user(2)
+        # Without client_rate_limit, the users behind the same address are independent
+        upv = UniquePasswordsValidator(rate_limit=1)
+        with rate_limit_client('192.0.2.1'):
+            upv.validate(self.PASSWORD_TEMPLATE % 2, user1)
+            upv.validate(self.PASSWORD_TEMPLATE % 2, user2)
+            self.assert_rate_limited(upv, self.PASSWORD_TEMPLATE % 3, user1)
+        # Only the client bucket
+        upv = UniquePasswordsValidator(client_rate_limit=1)
+        upv.validate(self.PASSWORD_TEMPLATE % 3, user1)
+        upv.validate(self.PASSWORD_TEMPLATE % 3, user1)
+        with rate_limit_client('192.0.2.2'):
+            upv.validate(self.PASSWORD_TEMPLATE % 3, user1)
+            self.assert_rate_limited(upv, self.PASSWORD_TEMPLATE % 3, user2)
+
+    def test_threaded_pipeline(self):
+        user1 = self.create_user(1)
+        user2 = self.create_user(2)
+        pipeline = PipelineValidator(
+            validators=[
+                {
+                    'NAME': 'test_project.tests.test_password_history.ThreadedUniquePasswordsValidator',
+                    'OPTIONS': {'client_rate_limit': 1},
+                    'COST': 1000,
+                },
+                {
+                    'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+                    'COST': 1000,
+                },
+            ],
+            max_workers=2
+        )
+        with rate_limit_client('192.0.2.1'):
+            UniquePasswordsValidator(client_rate_limit=1).validate(self.PASSWORD_TEMPLATE % 2, user1)
+            # The validator in the worker thread sees the client key
+            with self.assertRaises(ValidationError) as cm:
+                pipeline.validate(self.PASSWORD_TEMPLATE % 3, user2)
+        self.assertEqual(
+            [error.code for error in cm.exception.error_list],
+            ['password_history_rate_limited']
+        )
+
+    def test_middleware(self):
+        user1 = self.create_user(1)
+        upv = UniquePasswordsValidator(rate_limit=2)
+
+        def view(request):
+            upv.validate(self.PASSWORD_TEMPLATE % 2, user1)
+            return get_client_key()
+
+        middleware = RateLimitClientMiddleware(view)
+        self.assertEqual(middleware(RequestFactory().get('/', REMOTE_ADDR='192.0.2.1')), '192.0.2.1')
+        self.assertIsNone(get_client_key())
+
+
+
+class LoadTestCommandTestCase(TransactionTestCase):
+
+    def test_load_test_command(self):
+        out = StringIO()
+        call_command(
+            'dpv_load_testing',
+            threads=3,
+            operations=10,
+            shared_users=1,
+            thread_users=1,
+            seed=1,
+            format='json',
+            stdout=out
+        )
+        result = json.loads(out.getvalue())
+        self.assertEqual(result['total']['calls'], 30)
+        self.assertEqual(
+            result['validate']['calls'] + result['password_changed']['calls'],
+            30
+        )
+        self.assertEqual(set(result['total']['latency_ms']), {'p50', 'p95', 'p99', 'max', 'mean'})
+        self.assertIn('lock_wait_ms', result)
+        # The temporary users are deleted
+        self.assertFalse(get_user_model().objects.exists())
+        self.assertFalse(UserPasswordHistoryConfig.objects.exists())
+
+        out = StringIO()
+        call_command('dpv_load_testing', threads=2, operations=2, stdout=out)
+        self.assertIn('password_changed', out.getvalue())
+        self.assertIn('Lock wait', out.getvalue())
+
+
+
+class PreHashTestCase(PasswordsTestCase):
+
+    def setUp(self):
+        super(PreHashTestCase, self).setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def call_in_session(self, function, *args):
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+
+        def view(request):
+            return function(*args)
+
+        return PreHashMiddleware(view)(request)
+
+    @override_settings(AUTH_PASSWORD_VALIDATORS=[{
+        'NAME': 'django_password_validators.password_history.password_validation.UniquePasswordsValidator',
+        'OPTIONS': {
+            'rate_limit': 10
+        }
+    }])
+    def test_prehash(self):
+        user1 = self.create_user(1)
+        url = reverse('dpv_password_prehash')
+        self.assertEqual(self.client.post(url, {'password': 'x'}).status_code, 403)
+        self.client.force_login(user1)
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        with mock.patch(
+                'django_password_validators.password_history.prehash.make_password_hashes',
+                wraps=make_password_hashes) as batch_hashes:
+            self.assertEqual(self.client.post(url, {'password': self.PASSWORD_TEMPLATE % 2}).status_code, 204)
+        # One batch for all configurations
+        self.assertEqual(batch_hashes.call_count, 1)
+
+        upv = UniquePasswordsValidator()
+        with mock.patch.object(UserPasswordHistoryConfig, 'make_password_hash') as make_password_hash:
+            self.call_in_session(upv.validate, self.PASSWORD_TEMPLATE % 2, user1)
+            self.call_in_session(upv.password_changed, self.PASSWORD_TEMPLATE % 2, user1)
+        # The hashes of the submitted password were computed in advance
+        make_password_hash.assert_not_called()
+        self.assert_password_validation_False(user_number=1, password_number=2)
+
+        # Other passwords, requests without the session
+        with mock.patch.object(
+                UserPasswordHistoryConfig, 'make_password_hash', autospec=True,
+                side_effect=UserPasswordHistoryConfig.make_password_hash) as make_password_hash:
+            self.call_in_session(upv.validate, self.PASSWORD_TEMPLATE % 3, user1)
+            self.assertEqual(make_password_hash.call_count, 1)
+            with self.assertRaises(ValidationError):
+                upv.validate(self.PASSWORD_TEMPLATE % 2, user1)
+            self.assertEqual(make_password_hash.call_count, 2)
+
+    def test_cache_key(self):
+        user1 = self.create_user(1)
+        user_config = UserPasswordHistoryConfig.objects.get(user=user1)
+        key = get_prehash_cache_key('session', user_config, 'password')
+        self.assertNotIn('password', key[len('dpv:prehash:'):])
+        self.assertNotEqual(key, get_prehash_cache_key('other session', user_config, 'password'))
+        self.assertNotEqual(key, get_prehash_cache_key('session', user_config, 'password2'))
+
+    @override_settings(AUTH_PASSWORD_VALIDATORS=[{
+        'NAME': 'django_password_validators.password_history.password_validation.UniquePasswordsValidator',
+        'OPTIONS': {
+            'rate_limit': 1
+        }
+    }])
+    def test_rate_limit(self):
+        user1 = self.create_user(1)
+        self.client.force_login(user1)
+        url = reverse('dpv_password_prehash')
+        self.assertEqual(self.client.post(url, {'password': self.PASSWORD_TEMPLATE % 2}).status_code, 204)
+        self.assertEqual(self.client.post(url, {'password': self.PASSWORD_TEMPLATE % 3}).status_code, 429)
+
+    def test_no_rate_limit(self):
+        user1 = self.create_user(1)
+        self.client.force_login(user1)
+        url = reverse('dpv_password_prehash')
+        with mock.patch('django_password_validators.password_history.views.prehash_password') as prehash_password:
+            self.assertEqual(self.client.post(url, {'password': self.PASSWORD_TEMPLATE % 2}).status_code, 403)
+        prehash_password.assert_not_called()
+
+    @override_settings(AUTH_PASSWORD_VALIDATORS=[{
+        'NAME': 'django_password_validators.password_history.password_validation.UniquePasswordsValidator',
+        'OPTIONS': {
+            'rate_limit': 10
+        }
+    }])
+    def test_no_new_configs(self):
+        user1 = self.create_user(1)
+        UserPasswordHistoryConfig.objects.filter(user=user1).delete()
+        self.client.force_login(user1)
+        url = reverse('dpv_password_prehash')
+        self.assertEqual(self.client.post(url, {'password': self.PASSWORD_TEMPLATE % 2}).status_code, 204)
+        # The configurations are only read
+        self.assertFalse(UserPasswordHistoryConfig.objects.filter(user=user1).exists())
+
+
+
+class GenerateHistoryTestCase(TestCase):
+
+    def get_history(self):
+        return list(
+            PasswordHistory.objects.
+            order_by('user_config__user__username', 'user_config__iterations', '-date').
+            values_list('user_config__user__username', 'user_config__salt', 'password', 'date')
+        )
+
+    def test_generate_history(self):
+        call_command(
+            'dpv_generate_history', users=5, seed=1, chunk_size=2,
+            depth='constant:3', configs='choice:1=1,2=1', interval='constant:10',
+            stdout=StringIO()
+        )
+        self.assertEqual(get_user_model().objects.filter(username__startswith='dpv_gen_').count(), 5)
+        self.assertEqual(PasswordHistory.objects.count(), 15)
+        # The dates are kept
+        user_config = UserPasswordHistoryConfig.objects.filter(passwordhistory__isnull=False).first()
+        dates = list(user_config.passwordhistory_set.order_by('-date').values_list('date', flat=True))
+        for newer, older in zip(dates, dates[1:]):
+            self.assertEqual(newer - older, timedelta(days=10))
+        self.assertTrue(PasswordHistory.objects.first().password.startswith('pbkdf2_sha256$'))
+        history = self.get_history()
+
+        # The same seed generates the same data, an interrupted run continues
+        UserPasswordHistoryConfig.objects.all().delete()
+        get_user_model().objects.all().delete()
+        call_command('dpv_generate_history', users=3, seed=1, depth='constant:3', configs='choice:1=1,2=1',
+                     interval='constant:10', stdout=StringIO())
+        out = StringIO()
+        call_command('dpv_generate_history', users=5, seed=1, depth='constant:3', configs='choice:1=1,2=1',
+                     interval='constant:10', stdout=out)
+        self.assertIn('Resuming after 3 existing users.', out.getvalue())
+        self.assertEqual(
+            [row[:3] for row in self.get_history()],
+            [row[:3] for row in history]
+        )
+
+        with self.assertRaises(CommandError):
+            call_command('dpv_generate_history', depth='normal:3', stdout=StringIO())
+
+    @override_settings(DPV_HISTORY_LAYOUT='packed')
+    def test_packed(self):
+        call_command('dpv_generate_history', users=2, seed=1, depth='constant:4', configs='constant:1',
+                     stdout=StringIO())
+        self.assertEqual(PasswordHistory.objects.count(), 0)
+        for user_config in UserPasswordHistoryConfig.objects.all():
+            self.assertEqual(len(packed.unpack(user_config.packed_history)), 4)
+
+    def test_scrypt(self):
+        with self.settings(DPV_DEFAULT_HISTORY_HASHER='%s.FastScryptHasher' % __name__):
+            call_command('dpv_generate_history', users=2, seed=1, depth='constant:4', configs='constant:3',
+                         stdout=StringIO())
+            # Valid work factors (powers of 2)
+            self.assertEqual(
+                sorted(set(UserPasswordHistoryConfig.objects.values_list('iterations', flat=True))),
+                [4, 8, 16]
+            )
+            hasher = FastScryptHasher()
+            password_hash = PasswordHistory.objects.first().password
+            decoded = hasher.decode(password_hash)
+            self.assertEqual((decoded['block_size'], decoded['parallelism']), (2, 1))
+            self.assertEqual(len(packed.get_digest(password_hash)), hasher.dklen)
+
+            UserPasswordHistoryConfig.objects.all().delete()
+            get_user_model().objects.all().delete()
+            with self.settings(DPV_HISTORY_LAYOUT='packed'):
+                call_command('dpv_generate_history', users=2, seed=1, depth='constant:4', configs='constant:3',
+                             stdout=StringIO())
+                user = get_user_model().objects.first()
+                validator = UniquePasswordsValidator()
+                # The digests have the size of the hasher, new passwords can be appended
+                validator.password_changed('new password', user)
+                with self.assertRaises(ValidationError):
+                    validator.validate('new password', user)
+
+    def test_distributions(self):
+        rng = random.Random(1)
+        self.assertEqual(parse_distribution('constant:3')(rng), 3)
+        self.assertTrue(1 <= parse_distribution('uniform:1:2')(rng) <= 2)
+        samples = [parse_distribution('geometric:8')(rng) for _ in range(2000)]
+        self.assertGreaterEqual(min(samples), 1)
+        self.assertAlmostEqual(sum(samples) / len(samples), 8, delta=1)
+        self.assertGreaterEqual(parse_distribution('poisson:2')(rng), 0)
+        self.assertEqual(parse_distribution('choice:2=1')(rng), 2)
+        with self.assertRaises(ValueError):
+            parse_distribution('uniform:1')
+
+
+SCRYPT_HASHER = 'django_password_validators.password_history.hashers.HistoryScryptHasher'
+
+
+class FastScryptHasher(HistoryScryptHasher):
+    iterations = 2 ** 4
+    block_size = 2
+
+
+class AlgorithmTestCase(PasswordsTestCase):
+
+    def test_scrypt_hasher(self):
+        hasher = FastScryptHasher()
+        encoded = hasher.encode('password', 'salt')
+        self.assertTrue(encoded.startswith('dpv_scrypt$16$2$1$salt$'))
+        self.assertTrue(hasher.verify('password', encoded))
+        self.assertFalse(hasher.verify('password 2', encoded))
+        self.assertNotEqual(hasher.encode('password', 'salt', 32), encoded)
+        self.assertEqual(hasher.safe_summary(encoded)['iterations'], 16)
+
+        with self.settings(DPV_DEFAULT_HISTORY_HASHER='%s.FastScryptHasher' % __name__):
+            user1 = self.create_user(1)
+            user_config = UserPasswordHistoryConfig.objects.get(user=user1)
+            self.assertEqual(user_config.algorithm, 'dpv_scrypt')
+            self.assertEqual(user_config.iterations, 16)
+            self.assert_password_validation_False(user_number=1, password_number=1)
+            self.assert_password_validation_True(user_number=1, password_number=2)
+
+    def test_legacy_config_of_other_algorithm(self):
+        user1 = self.create_user(1)
+        # The configuration created before the hasher was recorded
+        UserPasswordHistoryConfig.objects.filter(user=user1).update(hasher=None)
+        with self.settings(DPV_DEFAULT_HISTORY_HASHER='%s.FastScryptHasher' % __name__):
+            # The old passwords are hashed with the hasher of their algorithm
+            self.assert_password_validation_False(user_number=1, password_number=1)
+            self.user_change_password(user_number=1, password_number=2)
+            self.assertEqual(
+                sorted(UserPasswordHistoryConfig.objects.values_list('algorithm', flat=True)),
+                ['dpv_scrypt', 'pbkdf2_sha256']
+            )
+            self.assert_password_validation_False(user_number=1, password_number=1)
+            self.assert_password_validation_False(user_number=1, password_number=2)
+
+    def test_backfill_migration(self):
+        backfill_algorithm = import_module(
+            'django_password_validators.password_history.migrations.0008_userpasswordhistoryconfig_algorithm'
+        ).backfill_algorithm
+        user1 = self.create_user(1)
+        user2 = self.create_user(2)
+        config_3 = UserPasswordHistoryConfig.objects.create(user=user1, iterations=5)
+        UserPasswordHistoryConfig.objects.update(algorithm=None)
+        UserPasswordHistoryConfig.objects.filter(user=user2).update(hasher=None)
+        UserPasswordHistoryConfig.objects.filter(pk=config_3.pk).update(hasher=None)
+
+        backfill_algorithm(apps, mock.Mock(connection=connection))
+        self.assertEqual(
+            list(UserPasswordHistoryConfig.objects.order_by('pk').values_list('algorithm', flat=True)),
+            ['pbkdf2_sha256', 'pbkdf2_sha256', None]
+        )
+
+
+HMAC_HASHER = 'django_password_validators.password_history.hashers.HistoryHMACHasher'
+
+
+@override_settings(
+    DPV_DEFAULT_HISTORY_HASHER=HMAC_HASHER,
+    DPV_HISTORY_HMAC_KEYS={'k1': 'secret 1'},
+)
+class HMACHasherTestCase(PasswordsTestCase):
+
+    def test_hmac_hasher(self):
+        user1 = self.create_user(1)
+        user_config = UserPasswordHistoryConfig.objects.get(user=user1)
+        self.assertEqual(user_config.key_id, 'k1')
+        self.assertEqual(user_config.hasher, HMAC_HASHER)
+        password_hash = PasswordHistory.objects.get(user_config=user_config).password
+        self.assertTrue(password_hash.startswith('dpv_hmac_sha256$k1$%s$' % user_config.salt))
+        self.assertTrue(HistoryHMACHasher().verify(self.PASSWORD_TEMPLATE % 1, password_hash))
+        self.assertFalse(HistoryHMACHasher().verify(self.PASSWORD_TEMPLATE % 2, password_hash))
+
+        self.assert_password_validation_False(user_number=1, password_number=1)
+        self.assert_password_validation_True(user_number=1, password_number=2)
+
+    def test_key_rotation(self):
+        self.create_user(1)
+        with self.settings(DPV_DEFAULT_HISTORY_HASHER='django_password_validators.password_history.hashers.HistoryTestHasher'):
+            self.user_change_password(user_number=1, password_number=2)
+        with self.settings(DPV_HISTORY_HMAC_KEYS={'k1': 'secret 1', 'k2': 'secret 2'}):
+            self.user_change_password(user_number=1, password_number=3)
+            self.assertEqual(
+                list(UserPasswordHistoryConfig.objects.order_by('pk').values_list('key_id', flat=True)),
+                ['k1', '', 'k2']
+            )
+            # Passwords of the PBKDF2 configuration and of both keys are checked
+            for password_number in (1, 2, 3):
+                self.assert_password_validation_False(user_number=1, password_number=password_number)
+
+            # The current key can not be retired
+            with self.assertRaises(CommandError):
+                call_command('dpv_retire_history_keys', 'k2', stdout=StringIO())
+            out = StringIO()
+            call_command('dpv_retire_history_keys', stdout=out)
+            self.assertEqual(
+                out.getvalue(),
+                'k1: 1 users, 1 configurations, 1 passwords\nk2: 1 users, 1 configurations, 1 passwords\n'
+            )
+            out = StringIO()
+            call_command('dpv_retire_history_keys', 'k1', stdout=out)
+            self.assertEqual(out.getvalue(), 'Deleted 1 configurations and 1 passwords.\n')
+
+        with self.settings(DPV_HISTORY_HMAC_KEYS={'k2': 'secret 2'}):
+            self.assert_password_validation_True(user_number=1, password_number=1)
+            self.assert_password_validation_False(user_number=1, password_number=3)
+
+    def test_retire_packed_keys(self):
+        with self.settings(DPV_HISTORY_HMAC_KEYS={'k1': 'secret 1', 'k2': 'secret 2'}, DPV_HISTORY_LAYOUT='packed'):
+            self.create_user(1)
+            self.user_change_password(user_number=1, password_number=2)
+            out = StringIO()
+            call_command('dpv_retire_history_keys', stdout=out)
+            self.assertEqual(out.getvalue(), 'k2: 1 users, 1 configurations, 2 passwords\n')
+        with self.settings(DPV_HISTORY_HMAC_KEYS={'k1': 'secret 1'}):
+            out = StringIO()
+            call_command('dpv_retire_history_keys', 'k2', stdout=out)
+            self.assertEqual(out.getvalue(), 'Deleted 1 configurations and 2 passwords.\n')
+
+    def test_key_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.keys', delete=False) as f:
+            f.write('# retired soon\nk1:secret 1\n\nk2:secret 2\n')
+        try:
+            with self.settings(DPV_HISTORY_HMAC_KEYS={}, DPV_HISTORY_HMAC_KEY_FILE=f.name):
+                user1 = self.create_user(1)
+                self.assertEqual(UserPasswordHistoryConfig.objects.get(user=user1).key_id, 'k2')
+                with self.settings(DPV_HISTORY_HMAC_KEY_ID='k1'):
+                    self.user_change_password(user_number=1, password_number=2)
+                    self.assertEqual(UserPasswordHistoryConfig.objects.filter(user=user1).count(), 2)
+
+                # The file is parsed once, until it changes
+                with mock.patch('django_password_validators.settings._read_hmac_key_file',
+                                wraps=settings_module._read_hmac_key_file) as read_hmac_key_file:
+                    for _ in range(3):
+                        self.assertEqual(list(get_history_hmac_keys()), ['k1', 'k2'])
+                    self.assertEqual(read_hmac_key_file.call_count, 0)
+                    with open(f.name, 'a') as key_file:
+                        key_file.write('k3:secret 3\n')
+                    self.assertEqual(list(get_history_hmac_keys()), ['k1', 'k2', 'k3'])
+                    self.assertEqual(read_hmac_key_file.call_count, 1)
+        finally:
+            os.unlink(f.name)
+
+    def test_missing_key(self):
+        self.create_user(1)
+        with self.settings(DPV_HISTORY_HMAC_KEYS={'k2': 'secret 2'}):
+            with self.assertRaises(ImproperlyConfigured):
+                self.assert_password_validation_True(user_number=1, password_number=2)
+
+
+@override_settings(
+    DPV_HISTORY_LAYOUT='ring',
+    AUTH_PASSWORD_VALIDATORS=[{
+        'NAME': 'django_password_validators.password_history.password_validation.UniquePasswordsValidator',
+        'OPTIONS': {
+            'last_passwords': 2
+        }
+    }]
+)
+class RingLayoutTestCase(PasswordsTestCase):
+
+    def test_last_password(self):
+        user1 = self.create_user(1)
+        user2 = self.create_user(2)
+        user_config_1 = UserPasswordHistoryConfig.objects.get(user=user1)
+        self.user_change_password(user_number=1, password_number=2)
+        slots_ids = set(PasswordHistory.objects.filter(user_config=user_config_1).values_list('pk', flat=True))
+
+        self.user_change_password(user_number=1, password_number=3)
+        self.user_change_password(user_number=1, password_number=4)
+        # The same password does not take a slot
+        self.user_change_password(user_number=1, password_number=4)
+
+        # The ring is full, the slots are overwritten
+        self.assertEqual(
+            set(PasswordHistory.objects.filter(user_config=user_config_1).values_list('pk', flat=True)),
+            slots_ids
+        )
+        self.assertEqual(
+            sorted(PasswordHistory.objects.filter(user_config=user_config_1).values_list('slot', flat=True)),
+            [0, 1]
+        )
+        user_config_1.refresh_from_db()
+        self.assertEqual(user_config_1.next_slot, 4)
+
+        # Password out of scope. We interpret it as if it had never been entered.
+        self.assert_password_validation_True(user_number=1, password_number=1)
+        self.assert_password_validation_True(user_number=1, password_number=2)
+        # Passwords known in the scope we are checking
+        self.assert_password_validation_False(user_number=1, password_number=3)
+        self.assert_password_validation_False(user_number=1, password_number=4)
+
+        # We check for interaction with the other user
+        self.assertEqual(PasswordHistory.objects.filter(user_config__user=user2).count(), 1)
+        self.assert_password_validation_False(user_number=2, password_number=1)
+
+    def test_multiple_UserPasswordHistoryConfig(self):
+        user1 = self.create_user(1)
+        self.user_change_password(user_number=1, password_number=2)
+        with self.settings(DPV_DEFAULT_HISTORY_HASHER='django_password_validators.password_history.hashers.HistoryHasher'):
+            self.user_change_password(user_number=1, password_number=3)
+            self.assertEqual(PasswordHistory.objects.filter(user_config__user=user1).count(), 2)
+            self.assert_password_validation_True(user_number=1, password_number=1)
+            self.assert_password_validation_False(user_number=1, password_number=2)
+
+    def test_store_passwords(self):
+        user1 = self.create_user(1)
+        seed_password_history([(user1, self.PASSWORD_TEMPLATE % number) for number in (2, 3, 4)])
+        self.assertEqual(PasswordHistory.objects.filter(user_config__user=user1).count(), 2)
+        self.assert_password_validation_True(user_number=1, password_number=2)
+        self.assert_password_validation_False(user_number=1, password_number=3)
+        self.assert_password_validation_False(user_number=1, password_number=4)
+
+    def test_build_ring(self):
+        user1 = self.create_user(1)
+        user_config_1 = UserPasswordHistoryConfig.objects.get(user=user1)
+        with self.settings(DPV_HISTORY_LAYOUT='rows'):
+            self.user_change_password(user_number=1, password_number=2)
+            self.user_change_password(user_number=1, password_number=3)
+        # Without the limit of the validator, all passwords are kept
+        self.assertEqual(PasswordHistory.objects.filter(slot__isnull=False).count(), 0)
+
+        call_command('dpv_history_to_ring', stdout=StringIO())
+
+        self.assertEqual(
+            list(PasswordHistory.objects.filter(user_config=user_config_1).order_by('date').values_list('slot', flat=True)),
+            [0, 1]
+        )
+        user_config_1.refresh_from_db()
+        self.assertEqual(user_config_1.next_slot, 2)
+
+        # The oldest slot is overwritten
+        self.user_change_password(user_number=1, password_number=4)
+        self.assertEqual(
+            PasswordHistory.objects.get(user_config=user_config_1, slot=0).password,
+            user_config_1.make_password_hash(self.PASSWORD_TEMPLATE % 4)
+        )
+
+
+@override_settings(
+    DPV_HISTORY_LAYOUT='packed',
+    AUTH_PASSWORD_VALIDATORS=[{
+        'NAME': 'django_password_validators.password_history.password_validation.UniquePasswordsValidator',
+        'OPTIONS': {
+            'last_passwords': 2
+        }
+    }]
+)
+class PackedLayoutTestCase(PasswordsTestCase):
+
+    def get_entries(self, user_config):
+        user_config.refresh_from_db()
+        return packed.unpack(user_config.packed_history)
+
+    def test_format(self):
+        entries = [(1, b'a' * 32), (2, b'b' * 32)]
+        data = packed.pack(entries)
+        self.assertEqual(len(data), packed.HEADER.size + 2 * (8 + 32))
+        self.assertEqual(packed.unpack(data), entries)
+        self.assertEqual(packed.get_last_date(packed.append(data, 3, b'c' * 32)), 3)
+        self.assertTrue(packed.contains(data, b'a' * 32))
+        self.assertFalse(packed.contains(data, b'a' * 32, cutoff=2))
+        self.assertFalse(packed.contains(data, b'c' * 32))
+        self.assertIsNone(packed.pack([]))
+        with self.assertRaises(ValueError):
+            packed.append(data, 3, b'c' * 16)
+        now = timezone.now()
+        self.assertEqual(packed.from_microseconds(packed.to_microseconds(now)), now)
+
+    def test_last_password(self):
+        user1 = self.create_user(1)
+        user2 = self.create_user(2)
+        user_config_1 = UserPasswordHistoryConfig.objects.get(user=user1)
+        self.user_change_password(user_number=1, password_number=2)
+        self.user_change_password(user_number=1, password_number=3)
+        # The same password is stored once
+        self.user_change_password(user_number=1, password_number=3)
+
+        # No rows, the digests are in the configuration
+        self.assertEqual(PasswordHistory.objects.count(), 0)
+        entries = self.get_entries(user_config_1)
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[-1][1], packed.get_digest(user_config_1.make_password_hash(self.PASSWORD_TEMPLATE % 3)))
+
+        self.assert_password_validation_True(user_number=1, password_number=1)
+        self.assert_password_validation_False(user_number=1, password_number=2)
+        self.assert_password_validation_False(user_number=1, password_number=3)
+        self.assert_password_validation_False(user_number=2, password_number=1)
+        self.assert_password_validation_True(user_number=2, password_number=2)
+
+    def test_validate_queries(self):
+        user1 = self.create_user(1)
+        self.user_change_password(user_number=1, password_number=2)
+        upv = UniquePasswordsValidator(last_passwords=2)
+        # The configurations are read and unpacked once for the pruning and for the check
+        with self.assertNumQueries(1), \
+                mock.patch.object(packed, 'unpack', wraps=packed.unpack) as unpack:
+            with self.assertRaises(ValidationError):
+                upv.validate(self.PASSWORD_TEMPLATE % 2, user1)
+        self.assertEqual(unpack.call_count, 1)
+
+    def test_purge_and_stats(self):
+        user1 = self.create_user(1)
+        self.user_change_password(user_number=1, password_number=2)
+        user_config_1 = UserPasswordHistoryConfig.objects.get(user=user1)
+        entries = self.get_entries(user_config_1)
+        old_date = packed.to_microseconds(timezone.now() - timedelta(days=100))
+        UserPasswordHistoryConfig.objects.filter(pk=user_config_1.pk).update(
+            packed_history=packed.pack([(old_date, entries[0][1]), entries[1]])
+        )
+
+        out = StringIO()
+        call_command('dpv_history_stats', last_passwords=1, max_age=90, format='json', stdout=out)
+        stats = json.loads(out.getvalue())
+        self.assertEqual(stats['packed_history']['configs'], 1)
+        self.assertEqual(stats['packed_history']['passwords'], 2)
+        self.assertEqual(stats['history_length_per_user']['max'], 2)
+        self.assertEqual(stats['configs_per_hasher'][0]['passwords'], 2)
+        self.assertEqual(stats['history_age']['up to 30 days'], 1)
+        self.assertEqual(stats['history_age']['up to 365 days'], 1)
+        self.assertEqual(stats['outside_window'], {'last_passwords': 1, 'max_age': 1})
+        out = StringIO()
+        call_command('dpv_history_stats', stdout=out)
+        self.assertIn('Packed history:', out.getvalue())
+
+        out = StringIO()
+        call_command('dpv_purge_history', max_age=90, batch_size=1, stdout=out)
+        self.assertIn('Deleted 1 passwords.', out.getvalue())
+        self.assertEqual(self.get_entries(user_config_1), entries[1:])
+        self.assert_password_validation_True(user_number=1, password_number=1)
+
+    def test_max_age_and_configs(self):
+        user1 = self.create_user(1)
+        user_config_1 = UserPasswordHistoryConfig.objects.get(user=user1)
+        entries = self.get_entries(user_config_1)
+        old_date = packed.to_microseconds(timezone.now() - timedelta(days=400))
+        UserPasswordHistoryConfig.objects.filter(pk=user_config_1.pk).update(
+            packed_history=packed.pack([(old_date, entries[0][1])])
+        )
+        with self.settings(DPV_DEFAULT_HISTORY_HASHER='test_project.tests.test_password_history.StaffTestHasher'):
+            self.user_change_password(user_number=1, password_number=2)
+            user_configs = UniquePasswordsValidator().get_user_configs(user1)
+            self.assertEqual(
+                [user_config.iterations for user_config in user_configs],
+                [StaffTestHasher.iterations, HistoryTestHasher.iterations]
+            )
+            self.assertEqual(len(UniquePasswordsValidator(max_configs=1).get_user_configs(user1)), 1)
+
+            upv = UniquePasswordsValidator(max_age=365)
+            self.assertEqual(len(upv.get_user_configs(user1)), 1)
+            upv.validate(self.PASSWORD_TEMPLATE % 1, user1)
+            # The expired password is deleted
+            self.assertEqual(self.get_entries(user_config_1), [])
+
+    def test_history_to_packed(self):
+        with self.settings(DPV_HISTORY_LAYOUT='rows'):
+            user1 = self.create_user(1)
+            self.user_change_password(user_number=1, password_number=2)
+        self.assertEqual(PasswordHistory.objects.count(), 2)
+        dates = list(PasswordHistory.objects.order_by('date').values_list('date', flat=True))
+
+        out = StringIO()
+        call_command('dpv_history_to_packed', stdout=out)
+        self.assertIn('Packed 2 passwords of 1 configurations', out.getvalue())
+
+        self.assertEqual(PasswordHistory.objects.count(), 0)
+        user_config_1 = UserPasswordHistoryConfig.objects.get(user=user1)
+        self.assertEqual(
+            [packed.from_microseconds(date) for date, _ in self.get_entries(user_config_1)],
+            dates
+        )
+        self.assert_password_validation_False(user_number=1, password_number=1)
+        self.assert_password_validation_False(user_number=1, password_number=2)
+        self.assert_password_validation_True(user_number=1, password_number=3)
@@ -0,0 +1,149 @@
+import threading
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.test import TestCase
+
+from django_password_validators.password_pipeline.password_validation import PipelineValidator
+
+
+CALLS = []
+
+
+class RecordingValidator(object):
+
+    def __init__(self, name, calls, fail=False, cost=None, uses_database=False):
+        self.name = name
+        self.calls = calls
+        self.fail = fail
+        if cost is not None:
+            self.cost = cost
+        self.uses_database = uses_database
+
+    def validate(self, password, user=None):
+        self.calls.append((self.name, threading.current_thread().name))
+        if self.fail:
+            raise ValidationError('%s failed' % self.name, code=self.name)
+
+    def password_changed(self, password, user=None):
+        self.calls.append(('changed', self.name))
+
+    def get_help_text(self):
+        return '%s help.' % self.name
+
+
+def validator_config(name, fail=False, cost=None, declared_cost=None, uses_database=False):
+    config = {
+        'NAME': 'test_project.tests.test_pipeline.RecordingValidator',
+        # The list is passed by reference, the module can be imported twice
+        # (as tests.test_project... and test_project...).
+        'OPTIONS': {
+            'name': name, 'calls': CALLS, 'fail': fail, 'cost': declared_cost, 'uses_database': uses_database
+        },
+    }
+    if cost is not None:
+        config['COST'] = cost
+    return config
+
+
+class PipelineValidatorTestCase(TestCase):
+
+    def setUp(self):
+        del CALLS[:]
+        super(PipelineValidatorTestCase, self).setUp()
+
+    def called(self):
+        return [name for name, thread in CALLS]
+
+    def test_order_by_cost(self):
+        pv = PipelineValidator(validators=[
+            validator_config('expensive', cost=1000),
+            validator_config('default'),
+            validator_config('declared', declared_cost=0),
+        ])
+        pv.validate('password')
+        self.assertEqual(self.called(), ['declared', 'default', 'expensive'])
+
+    def test_skip_expensive_on_failure(self):
+        pv = PipelineValidator(validators=[
+            validator_config('expensive', cost=1000),
+            validator_config('cheap', fail=True, cost=0),
+        ])
+        with self.assertRaises(ValidationError) as cm:
+            pv.validate('password')
+        self.assertEqual(self.called(), ['cheap'])
+        self.assertEqual([e.code for e in cm.exception.error_list], ['cheap'])
+
+    def test_no_skip_expensive_on_failure(self):
+        pv = PipelineValidator(
+            validators=[
+                validator_config('expensive', fail=True, cost=1000),
+                validator_config('cheap', fail=True, cost=0),
+            ],
+            skip_expensive_on_failure=False
+        )
+        with self.assertRaises(ValidationError) as cm:
+            pv.validate('password')
+        self.assertEqual(self.called(), ['cheap', 'expensive'])
+        self.assertEqual([e.code for e in cm.exception.error_list], ['cheap', 'expensive'])
+
+    def test_expensive_concurrently(self):
+        pv = PipelineValidator(
+            validators=[
+                validator_config('expensive1', fail=True, cost=1000),
+                validator_config('expensive2', fail=True, cost=2000),
+                validator_config('cheap', cost=0),
+            ],
+            max_workers=2
+        )
+        with self.assertRaises(ValidationError) as cm:
+            pv.validate('password')
+        self.assertEqual(sorted(self.called()), ['cheap', 'expensive1', 'expensive2'])
+        # Errors keep the order of the costs
+        self.assertEqual([e.code for e in cm.exception.error_list], ['expensive1', 'expensive2'])
+        main_thread = threading.current_thread().name
+        self.assertTrue(all(
+            thread != main_thread for name, thread in CALLS if name.startswith('expensive')
+        ))
+
+    def test_database_validators_in_calling_thread(self):
+        pv = PipelineValidator(
+            validators=[
+                validator_config('database', fail=True, cost=1000, uses_database=True),
+                validator_config('expensive', fail=True, cost=2000),
+            ],
+            max_workers=2
+        )
+        with self.assertRaises(ValidationError) as cm:
+            pv.validate('password')
+        self.assertEqual([e.code for e in cm.exception.error_list], ['database', 'expensive'])
+        threads = dict(CALLS)
+        self.assertEqual(threads['database'], threading.current_thread().name)
+        self.assertNotEqual(threads['expensive'], threading.current_thread().name)
+
+    def test_measure_cost(self):
+        pv = PipelineValidator(
+            validators=[
+                validator_config('first', cost=1000),
+                validator_config('second', cost=0),
+            ],
+            measure_cost=True
+        )
+        pv.validate('password')
+        self.assertEqual(self.called(), ['second', 'first'])
+        pv.measured_costs = {0: 0.1, 1: 5}
+        del CALLS[:]
+        pv.validate('password')
+        self.assertEqual(self.called(), ['first', 'second'])
+
+    def test_password_changed_and_help_text(self):
+        pv = PipelineValidator(validators=[
+            validator_config('first'),
+            validator_config('second'),
+        ])
+        pv.password_changed('password')
+        self.assertEqual(CALLS, [('changed', 'first'), ('changed', 'second')])
+        self.assertEqual(pv.get_help_text(), 'first help. second help.')
+
+    def test_bad_validator_name(self):
+        with self.assertRaises(ImproperlyConfigured):
+            PipelineValidator(validators=[{'NAME': 'not.existing.Validator'}])
@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+from django.test import override_settings
+from django.utils import timezone
+
+from django_password_validators.password_history.hashers import (
+    HistoryHasher,
+    HistoryTestHasher,
+)
+from django_password_validators.password_history.models import (
+    PasswordHistory,
+    UserPasswordHistoryConfig,
+)
+from django_password_validators.password_history.testing import (
+    create_password_history,
+    fast_password_history,
+)
+
+from .base import PasswordsTestCase
+
+
+@override_settings(DPV_DEFAULT_HISTORY_HASHER='django_password_validators.password_history.hashers.HistoryHasher')
+class FastPasswordHistoryTestCase(PasswordsTestCase):
+
+    def test_storage_format(self):
+        self.assertEqual(HistoryTestHasher.algorithm, HistoryHasher.algorithm)
+        self.assertEqual(
+            HistoryTestHasher().encode('password', 'salt', 1),
+            HistoryHasher().encode('password', 'salt', 1),
+        )
+
+    @fast_password_history
+    def test_fast_password_history(self):
+        self.create_user(1)
+        self.assertEqual(
+            UserPasswordHistoryConfig.objects.get().iterations,
+            HistoryTestHasher.iterations
+        )
+
+    @fast_password_history
+    def test_create_password_history(self):
+        user1 = self.create_user(1)
+        date = timezone.now() - timedelta(days=10)
+        history = create_password_history(
+            user1,
+            [self.PASSWORD_TEMPLATE % 2, self.PASSWORD_TEMPLATE % 3],
+            dates=[date, date]
+        )
+        self.assertEqual(len(history), 2)
+        self.assertEqual(PasswordHistory.objects.filter(user_config__user=user1).count(), 3)
+        self.assertEqual(PasswordHistory.objects.filter(date=date).count(), 2)
+        self.assertEqual(UserPasswordHistoryConfig.objects.count(), 1)
+        self.assert_password_validation_False(user_number=1, password_number=2)
+        self.assert_password_validation_False(user_number=1, password_number=3)
+        self.assert_password_validation_True(user_number=1, password_number=4)
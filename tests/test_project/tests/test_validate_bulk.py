@@ -0,0 +1,125 @@
+from io import StringIO
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections
+from django.test import override_settings
+
+from django_password_validators.password_history import bulk
+from django_password_validators.password_history.models import PasswordHistory
+
+from .base import PasswordsTestCase
+
+CHARACTER_VALIDATOR = {
+    'NAME': 'django_password_validators.password_character_requirements.password_validation.PasswordCharacterValidator',
+    'OPTIONS': {
+        'min_length_digit': 1,
+        'min_length_special': 0,
+        'min_length_lower': 0,
+        'min_length_upper': 0,
+    },
+}
+
+
+class ValidateBulkTestCase(PasswordsTestCase):
+
+    def write_input(self, content, suffix):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.unlink, f.name)
+        return f.name
+
+    def validate_bulk(self, path, **options):
+        out = StringIO()
+        err = StringIO()
+        call_command('dpv_validate_bulk', path, stdout=out, stderr=err, **options)
+        return out.getvalue().splitlines(), err.getvalue()
+
+    @override_settings(AUTH_PASSWORD_VALIDATORS=[
+        {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
+        CHARACTER_VALIDATOR,
+        {'NAME': 'django_password_validators.password_history.password_validation.UniquePasswordsValidator'},
+    ])
+    def test_csv(self):
+        self.create_user(1)
+        path = self.write_input(
+            'username,email,password\n'
+            'test1,test1@example.com,%s\n'
+            'test1,test1@example.com,new password 1\n'
+            'test2,john.smith@example.com,john.smith@example1\n'
+            'test3,,no digits\n'
+            'test4,,\n' % (self.PASSWORD_TEMPLATE % 1),
+            '.csv'
+        )
+        report, summary = self.validate_bulk(path, chunk_size=2, seed_history=True)
+        self.assertEqual(report, [
+            'line,username,code,message',
+            '2,test1,password_used,'
+            'You can not use a password that was already used in this application in the past.',
+            '4,test2,password_too_similar,The password is too similar to the email address.',
+            '5,test3,min_length_digit,This password must contain at least 1 digit.',
+            '6,test4,invalid_row,The username or the password is missing.',
+        ])
+        self.assertIn('Validated 5 rows, 4 invalid, 1 passwords stored in the history', summary)
+        # Only the passwords of the existing users are stored
+        self.assertEqual(PasswordHistory.objects.filter(user_config__user__username='test1').count(), 2)
+        self.assertEqual(PasswordHistory.objects.count(), 2)
+
+    @override_settings(AUTH_PASSWORD_VALIDATORS=[CHARACTER_VALIDATOR])
+    def test_jsonl_report_file(self):
+        path = self.write_input(
+            '{"login": "test1", "secret": "password 1"}\n'
+            '\n'
+            'not json\n'
+            '{"login": "test2", "secret": "password"}\n',
+            '.jsonl'
+        )
+        report_path = self.write_input('', '.csv')
+        report, summary = self.validate_bulk(
+            path, username_field='login', password_field='secret', report=report_path
+        )
+        self.assertEqual(report, [])
+        with open(report_path) as f:
+            self.assertEqual(f.read().splitlines(), [
+                'line,username,code,message',
+                '3,,invalid_row,The username or the password is missing.',
+                '4,test2,min_length_digit,This password must contain at least 1 digit.',
+            ])
+        self.assertIn('Validated 3 rows, 2 invalid', summary)
+
+    @override_settings(AUTH_PASSWORD_VALIDATORS=[CHARACTER_VALIDATOR])
+    def test_workers(self):
+        path = self.write_input(
+            'username,password\n' + ''.join(
+                'user%d,password%s\n' % (i, i if i % 3 else '') for i in range(20)
+            ),
+            '.csv'
+        )
+        report, summary = self.validate_bulk(path, workers=2, chunk_size=3)
+        self.assertEqual(
+            [line.split(',')[:3] for line in report[1:]],
+            [[str(i + 2), 'user%d' % i, 'min_length_digit'] for i in range(0, 20, 3)]
+        )
+        self.assertIn('Validated 20 rows, 7 invalid', summary)
+
+    def test_init_forked_worker(self):
+        inherited = connections['default']
+        inherited.ensure_connection()
+        try:
+            bulk.init_worker()
+            # The worker gets its own connections, the inherited ones are not closed
+            self.assertIsNot(connections['default'], inherited)
+            self.assertIsNone(connections['default'].connection)
+            self.assertIsNotNone(inherited.connection)
+            self.assertIn(inherited, bulk._inherited_connections)
+        finally:
+            connections['default'] = inherited
+            del bulk._inherited_connections[:]
+
+    def test_seed_history_requires_validator(self):
+        path = self.write_input('username,password\n', '.csv')
+        with override_settings(AUTH_PASSWORD_VALIDATORS=[CHARACTER_VALIDATOR]):
+            with self.assertRaises(CommandError):
+                self.validate_bulk(path, seed_history=True)
@@ -21,7 +21,10 @@ else:
     from django.conf.urls import url
 
 from django.contrib import admin
+from django.urls import include
 
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
+    url(r'^dpv/', include('django_password_validators.password_character_requirements.urls')),
+    url(r'^dpv/', include('django_password_validators.password_history.urls')),
 ]